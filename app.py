@@ -1,89 +1,701 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from models import SimpleModel, CopilotModel, AdvancedModel, OllamaModel
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import BaseRoute, Match
+from pydantic import BaseModel, Field, StringConstraints, TypeAdapter, ValidationError
+from typing import Optional, List, Dict, Any, Literal
+from typing_extensions import Annotated, NotRequired, TypedDict
+from models import (SQLAnalyzerModel, SimpleModel, CopilotModel, AdvancedModel, OllamaModel, TieredModel,
+                    ModelRegistry, ScheduledModel, SchedulerBusyError)
+from models.prompts import load_templates
+from utils.http_client import close_sessions, aclose_async_clients
+from utils.result_cache import ResultCache
+from utils.fingerprint import fingerprint, fingerprint_hash
+from utils.statement_splitter import ScriptStatement, aiter_statements
+from utils.edit_session import EditSession, SessionStore, TextEdit, VersionConflict
+from utils.json_response import FastJSONResponse, dumps
+from utils.metrics import (REGISTRY, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, METRICS_ENABLED, CONTENT_TYPE,
+                           stage_timer)
+from utils.profiling import RequestProfiler
+from utils.catalog import get_catalog
+from utils.query_plan import get_plan_analyzer
+import asyncio
+import codecs
+import functools
+import hmac
 import json
 import os
+import time
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build every model once at startup and release them at shutdown"""
+    load_templates()
+    model_registry.startup()
+    yield
+    model_registry.shutdown()
+    close_sessions()
+    await aclose_async_clients()
+    result_cache.close()
 
 app = FastAPI(
     title="SQL Safety Checker API",
     description="API for analyzing SQL queries for safety and performance",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 class SQLAnalysisRequest(BaseModel):
     sql: str
     model: str = "simple"  # Default to simple model
 
-class AnalysisIssue(BaseModel):
-    type: str
-    severity: str
-    description: str
-    suggestion: str
+# Response schemas are TypedDicts: validated results stay plain dicts and are
+# serialized directly, without building and re-encoding model instances
+NonEmptyStr = Annotated[str, StringConstraints(min_length=1)]
+Score = Annotated[float, Field(ge=0, le=100)]
+
+class AnalysisIssue(TypedDict):
+    type: Literal["safety", "performance"]
+    severity: Literal["high", "medium", "low"]
+    description: NonEmptyStr
+    suggestion: NonEmptyStr
 
-class SQLAnalysisResponse(BaseModel):
-    safety_score: float
-    performance_score: float
+class SQLAnalysisResponse(TypedDict):
+    safety_score: Score
+    performance_score: Score
     issues: List[AnalysisIssue]
-    summary: str
+    summary: NonEmptyStr
+    tier: NotRequired[Optional[str]]  # Which tier answered, for the tiered model
+    partial: NotRequired[Optional[bool]]  # Set when the rule time budget cut the analysis short
+
+class SQLBatchAnalysisResponse(TypedDict):
+    count: int
+    results: List[SQLAnalysisResponse]
+
+class SQLBatchAnalysisRequest(BaseModel):
+    queries: List[str]
+    model: str = "simple"  # Default to simple model
+
+class SessionCreateRequest(BaseModel):
+    text: str = ""
+    model: str = "simple"  # Default to simple model
+
+class SessionEdit(BaseModel):
+    start: int = 0
+    end: Optional[int] = None  # None replaces up to the end of the script
+    text: str = ""
+
+class SessionEditRequest(BaseModel):
+    version: Optional[int] = None  # Version the edits were made against; None applies them unconditionally
+    edits: List[SessionEdit]
+
+class ProfilingSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None  # Fraction of requests profiled while enabled
 
 # Model mapping dictionary
 MODEL_MAP = {
     "simple": SimpleModel,
     "copilot": CopilotModel,
     "advanced": AdvancedModel,
-    "ollama": OllamaModel
+    "ollama": OllamaModel,
+    "tiered": TieredModel
 }
 
+# Shared model instances, reused across requests until shutdown
+model_registry = ModelRegistry(MODEL_MAP)
+
+# Analysis results keyed on (model, model version, normalized SQL); configured via RESULT_CACHE_* variables
+result_cache = ResultCache()
+
+# Open incremental analysis sessions; configured via SESSION_* variables
+session_store = SessionStore()
+
+# Upper bound on the number of statements accepted by the batch endpoint
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '50000'))
+
+# Points deducted from the performance score per suggestion, by impact
+IMPACT_PENALTIES = {"high": 30, "medium": 15, "low": 5}
+
+# Validators of API results, built once; see validate_analysis_result
+ANALYSIS_RESPONSE = TypeAdapter(SQLAnalysisResponse)
+ANALYSIS_RESPONSES = TypeAdapter(List[SQLAnalysisResponse])
+
+# Token for the /admin endpoints and for requesting a profile with X-Profile; unset disables both
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Captures cProfile traces of sampled or explicitly requested analyses; configured via PROFILE_* variables
+request_profiler = RequestProfiler()
+
+def get_model(model_name: str) -> SQLAnalyzerModel:
+    """Return the shared model instance by name, raising a 400 error for unknown models"""
+    if model_name not in model_registry:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported model type: {model_name}. Available options: {', '.join(model_registry.names())}"
+        )
+    return model_registry.get(model_name)
+
+def is_admin(token: Optional[str]) -> bool:
+    """True if the token matches ADMIN_TOKEN (always False when no admin token is configured)"""
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def cacheable(result: Dict[str, Any]) -> bool:
+    """Failed and partial analyses are retried on the next request rather than cached"""
+    return not result.get('error') and not result.get('partial')
+
+def cache_key(model_name: str, model: SQLAnalyzerModel, version: str, sql_query: str) -> str:
+    """Result cache key for a statement; models that allow it share entries per query shape"""
+    if model.cache_by_fingerprint:
+        sql_query = fingerprint(sql_query)
+    return ResultCache.make_key(model_name, version, sql_query)
+
+async def run_analysis(model_name: str, model: SQLAnalyzerModel, sql_query: str) -> Dict[str, Any]:
+    """Analyze one statement, serving repeated statements from the result cache"""
+    if not model.cache_results:
+        with stage_timer(model_name, "analyze").time():
+            return await model.aanalyze(sql_query)
+    
+    with stage_timer(model_name, "cache_lookup").time():
+        key = cache_key(model_name, model, model.cache_version(), sql_query)
+        result = result_cache.get(key)
+    if result is None:
+        with stage_timer(model_name, "analyze").time():
+            result = await model.aanalyze(sql_query)
+        if cacheable(result):
+            result_cache.set(key, result)
+    return result
+
+async def run_batch_analysis(model_name: str, model: SQLAnalyzerModel, sql_queries: List[str]) -> List[Dict[str, Any]]:
+    """Analyze a batch, sending only distinct uncached statements to the model
+    
+    Stages are timed once per batch (analyze_batch, cache_lookup_batch), not per statement.
+    """
+    if not model.cache_results:
+        with stage_timer(model_name, "analyze_batch").time():
+            return await model.aanalyze_batch(sql_queries)
+    
+    with stage_timer(model_name, "cache_lookup_batch").time():
+        version = model.cache_version()
+        keys = [cache_key(model_name, model, version, sql_query) for sql_query in sql_queries]
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, str] = {}
+        for key, sql_query in zip(keys, sql_queries):
+            if key in results or key in pending:
+                continue
+            cached = result_cache.get(key)
+            if cached is None:
+                pending[key] = sql_query
+            else:
+                results[key] = cached
+    
+    if pending:
+        with stage_timer(model_name, "analyze_batch").time():
+            analyzed = await model.aanalyze_batch(list(pending.values()))
+        for key, result in zip(pending, analyzed):
+            results[key] = result
+            if cacheable(result):
+                result_cache.set(key, result)
+    return [results[key] for key in keys]
+
+async def run_profiled_analysis(model_name: str, model: SQLAnalyzerModel, sql_query: str):
+    """Analyze one statement under cProfile on a worker thread, bypassing the result cache
+    
+    The synchronous path is profiled so the whole analysis runs on one
+    thread; returns the result and the stored profile's ID (None if another
+    profile was being captured).
+    """
+    info = {"model": model_name, "fingerprint": fingerprint(sql_query)[:500], "sql_length": len(sql_query)}
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(request_profiler.run, model.analyze, sql_query, info=info))
+
+def format_safety_issue(issue: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one model safety issue into an API issue"""
+    return {
+        "type": "safety",
+        "severity": str(issue.get('severity', '')).lower(),
+        "description": issue.get('issue', ''),
+        "suggestion": issue.get('recommendation', '')
+    }
+
+def format_performance_suggestion(suggestion: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one model performance suggestion into an API issue"""
+    return {
+        "type": "performance",
+        "severity": str(suggestion.get('impact', '')).lower(),
+        "description": suggestion.get('suggestion', ''),
+        "suggestion": suggestion.get('recommendation', '')
+    }
+
+def format_analysis_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a model analysis result into the API response structure
+    
+    Models report safety_issues, performance_suggestions and a risk_score;
+    the API exposes them as scored, typed issues with a summary.
+    """
+    issues = [format_safety_issue(issue) for issue in result.get('safety_issues', [])]
+    
+    performance_penalty = 0
+    for suggestion in result.get('performance_suggestions', []):
+        issue = format_performance_suggestion(suggestion)
+        performance_penalty += IMPACT_PENALTIES.get(issue["severity"], 0)
+        issues.append(issue)
+    
+    risk_score = result.get('risk_score', 0)
+    risk_level = result.get('risk_level') or SQLAnalyzerModel.get_risk_level(risk_score)
+    details = result.get('details', '')
+    formatted = {
+        "safety_score": float(100 - risk_score),
+        "performance_score": float(max(0, 100 - performance_penalty)),
+        "issues": issues,
+        "summary": f"Risk level: {risk_level}. {details}".strip()
+    }
+    if result.get('tier'):
+        formatted["tier"] = result['tier']
+    if result.get('partial'):
+        formatted["partial"] = True
+    return formatted
+
 def validate_analysis_result(result: Dict[str, Any]) -> Dict[str, Any]:
-    """Validate analysis result against the prompt template requirements"""
+    """Validate analysis result against the prompt template requirements
+    
+    Scores must lie in 0-100, issues need a known type and severity and a
+    non-empty description and suggestion, and the summary must not be
+    empty. Returns the result as a new dict holding only the response fields.
+    """
     try:
-        # Validate scores
-        if not (0 <= result.get('safety_score', 0) <= 100):
-            raise ValueError("Safety score must be between 0 and 100")
-        if not (0 <= result.get('performance_score', 0) <= 100):
-            raise ValueError("Performance score must be between 0 and 100")
-        
-        # Validate issues
-        for issue in result.get('issues', []):
-            if issue['type'] not in ['safety', 'performance']:
-                raise ValueError(f"Invalid issue type: {issue['type']}")
-            if issue['severity'] not in ['high', 'medium', 'low']:
-                raise ValueError(f"Invalid severity: {issue['severity']}")
-            if not issue.get('description') or not issue.get('suggestion'):
-                raise ValueError("Issue must have description and suggestion")
-        
-        # Validate summary
-        if not result.get('summary'):
-            raise ValueError("Analysis must include a summary")
-        
-        return result
-    except Exception as e:
+        return ANALYSIS_RESPONSE.validate_python(result)
+    except ValidationError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid analysis result format: {str(e)}")
+
+def validate_analysis_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate a list of analysis results in one pass; see validate_analysis_result"""
+    try:
+        return ANALYSIS_RESPONSES.validate_python(results)
+    except ValidationError as e:
         raise HTTPException(status_code=500, detail=f"Invalid analysis result format: {str(e)}")
 
-@app.post("/api/analyze")
-async def analyze_sql(request: SQLAnalysisRequest):
-    """Analyze SQL query for safety and performance"""
+def present_result(model_name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Format and validate one model result for the API, timed as the model's format stage
+    
+    Findings are turned into plain issue dicts here on purpose: the API issue
+    shape differs from the findings' own, every response is validated once,
+    and orjson encodes the validated dicts faster than a per-finding
+    serializer hook could write the findings themselves.
+    """
+    with stage_timer(model_name, "format").time():
+        return validate_analysis_result(format_analysis_result(result))
+
+@app.post("/api/analyze", response_model=SQLAnalysisResponse)
+async def analyze_sql(request: SQLAnalysisRequest, x_profile: Optional[str] = Header(None)):
+    """Analyze SQL query for safety and performance
+    
+    The analysis is profiled when the X-Profile header carries the admin
+    token, or when sampled while profiling is switched on; the stored
+    profile's ID is returned in the X-Profile-Id response header.
+    """
     try:
-        # Get the requested model class
-        model_class = MODEL_MAP.get(request.model.lower())
-        if not model_class:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported model type: {request.model}. Available options: simple, copilot, advanced, ollama"
-            )
+        # Get the shared instance of the requested model and analyze SQL
+        model = get_model(request.model)
+        model_name = request.model.lower()
+        headers = {}
+        if request_profiler.should_profile(requested=is_admin(x_profile)):
+            result, profile_id = await run_profiled_analysis(model_name, model, request.sql)
+            if profile_id is not None:
+                headers["X-Profile-Id"] = profile_id
+        else:
+            result = await run_analysis(model_name, model, request.sql)
         
-        # Instantiate model and analyze SQL
-        model = model_class()
-        result = model.analyze(request.sql)
+        # Validated once here; the response is encoded as is, not validated again by FastAPI
+        validated_result = present_result(model_name, result)
+        validated_result.setdefault("tier", None)
+        validated_result.setdefault("partial", None)
+        return FastJSONResponse(validated_result, headers=headers)
+    
+    except HTTPException:
+        raise
+    except SchedulerBusyError as e:
+        # Back-pressure from the LLM backend's scheduler
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/analyze/batch", response_model=SQLBatchAnalysisResponse)
+async def analyze_sql_batch(request: SQLBatchAnalysisRequest):
+    """Analyze a list of SQL queries in one request, returning results in input order"""
+    if len(request.queries) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.queries)} queries (maximum {MAX_BATCH_SIZE})"
+        )
+    
+    try:
+        model = get_model(request.model)
+        model_name = request.model.lower()
+        results = await run_batch_analysis(model_name, model, request.queries)
         
-        # Validate and return the result
-        validated_result = validate_analysis_result(result)
-        return SQLAnalysisResponse(**validated_result)
+        # Plain dicts are validated in one pass and encoded as is; building a
+        # response model per statement would dominate the cost of large rule-model batches
+        with stage_timer(model_name, "format_batch").time():
+            formatted = validate_analysis_results([format_analysis_result(result) for result in results])
+        return FastJSONResponse({
+            "count": len(results),
+            "results": formatted
+        })
     
+    except HTTPException:
+        raise
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class RequestStreamingResponse(StreamingResponse):
+    """Streaming response whose content is produced while the request body is still being read
+    
+    StreamingResponse watches for client disconnects by reading from the same
+    receive channel as request.stream(), which would swallow body chunks.
+    Here only the body reader receives; a disconnect surfaces there instead.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def decode_body(request: Request):
+    """Yield the request body as text, chunk by chunk, without buffering it whole"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for chunk in request.stream():
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def statement_record(statement: ScriptStatement, result: Dict[str, Any]) -> Dict[str, Any]:
+    """The formatted result of one statement of a script, with its position"""
+    record = {"index": statement.index, "line": statement.line}
+    try:
+        record.update(validate_analysis_result(format_analysis_result(result)))
+    except HTTPException as e:
+        record["error"] = e.detail
+    return record
+
+def script_result_line(statement: ScriptStatement, result: Dict[str, Any]) -> bytes:
+    """One NDJSON line for a statement of a script"""
+    return dumps(statement_record(statement, result)) + b"\n"
+
+@app.post("/api/analyze/script")
+async def analyze_sql_script(request: Request, model: str = "simple"):
+    """Analyze a multi-statement SQL script sent as the raw request body
+    
+    Statements are split off as the body arrives and analyzed independently;
+    one NDJSON line per statement is streamed back in script order, starting
+    before the whole script has been received. The first statements are
+    analyzed before the response starts, so a busy LLM backend is answered
+    with 429 and Retry-After; once streaming, later statements wait for the
+    backend instead.
+    """
+    analyzer = get_model(model)
+    model_name = model.lower()
+    groups = aiter_statements(decode_body(request)).__aiter__()
+    
+    async def analyze_group(statements: List[ScriptStatement], wait_when_busy: bool = True) -> List[bytes]:
+        while True:
+            try:
+                results = await run_batch_analysis(model_name, analyzer, [statement.sql for statement in statements])
+            except SchedulerBusyError as e:
+                if not wait_when_busy:
+                    raise
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception as e:
+                return [dumps({"index": statement.index, "line": statement.line, "error": str(e)}) + b"\n"
+                        for statement in statements]
+            return [script_result_line(statement, result) for statement, result in zip(statements, results)]
+    
+    first_lines: List[bytes] = []
+    async for statements in groups:
+        try:
+            first_lines = await analyze_group(statements, wait_when_busy=False)
+        except SchedulerBusyError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        break
+    
+    async def stream_results():
+        for line in first_lines:
+            yield line
+        async for statements in groups:
+            for line in await analyze_group(statements):
+                yield line
+    
+    return RequestStreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def get_session(session_id: str) -> EditSession:
+    """Return an open session by ID, raising a 404 error for unknown or expired sessions"""
+    try:
+        return session_store.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+
+async def session_records(session: EditSession, statements: List[ScriptStatement]) -> List[Dict[str, Any]]:
+    """Formatted results of statements of a session, analyzing only texts it has no result for
+    
+    Results that should not be cached (failed or partial analyses) are
+    returned but not kept, so they are retried the next time they are needed.
+    """
+    model = get_model(session.model_name)
+    pending = session.missing(statements)
+    analyzed: Dict[str, Dict[str, Any]] = {}
+    if pending:
+        try:
+            results = await run_batch_analysis(session.model_name, model, pending)
+        except SchedulerBusyError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        for sql_query, result in zip(pending, results):
+            analyzed[sql_query] = result
+            if cacheable(result):
+                session.results[sql_query] = result
+    
+    with stage_timer(session.model_name, "format_batch").time():
+        records = []
+        for statement in statements:
+            record = statement_record(statement, analyzed.get(statement.sql) or session.results[statement.sql])
+            record["offset"] = statement.offset
+            records.append(record)
+    return records
+
+def session_version(session: EditSession) -> Optional[str]:
+    """Version of the session model's results; None for models that never cache them"""
+    model = get_model(session.model_name)
+    return model.cache_version() if model.cache_results else None
+
+async def session_snapshot(session: EditSession) -> Dict[str, Any]:
+    session.reset_results(session_version(session))
+    return {
+        "session_id": session.id,
+        "model": session.model_name,
+        "version": session.version,
+        "statements": len(session.statements),
+        "results": await session_records(session, session.statements)
+    }
+
+@app.post("/api/sessions")
+async def create_session(request: SessionCreateRequest):
+    """Open an incremental analysis session on a script and analyze all of its statements"""
+    model_name = request.model.lower()
+    get_model(model_name)
+    try:
+        session = session_store.create(model_name, request.text)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    async with session.lock:
+        return FastJSONResponse(await session_snapshot(session))
+
+@app.get("/api/sessions/{session_id}")
+async def get_session_results(session_id: str):
+    """The session's current version and the results of all of its statements"""
+    session = get_session(session_id)
+    async with session.lock:
+        return FastJSONResponse(await session_snapshot(session))
+
+@app.post("/api/sessions/{session_id}/edits")
+async def edit_session(session_id: str, request: SessionEditRequest):
+    """Apply text edits to a session and return the results of the statements they changed
+    
+    Edits are character ranges of the text, applied in order, each against
+    the text left by the previous one. The response is a splice: statements
+    start to start + deleted of the previous version are replaced by those
+    in results, and later statements keep their results. A version other
+    than the session's is rejected with 409; the client then resends the
+    whole text as one edit without a version.
+    """
+    session = get_session(session_id)
+    async with session.lock:
+        try:
+            splice = session.apply([TextEdit(edit.start, edit.end, edit.text) for edit in request.edits],
+                                   request.version)
+        except VersionConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        start, deleted, inserted = splice
+        if session.reset_results(session_version(session)):
+            # The model's rules or schema changed: every statement's result may have too
+            start, deleted, inserted = 0, len(session.statements) - len(inserted) + deleted, session.statements
+        return FastJSONResponse({
+            "session_id": session.id,
+            "version": session.version,
+            "statements": len(session.statements),
+            "start": start,
+            "deleted": deleted,
+            "results": await session_records(session, inserted)
+        })
+
+@app.delete("/api/sessions/{session_id}")
+async def close_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown or expired session: {session_id}")
+    return {"deleted": session_id}
+
+def sse_event(event: str, data: Any) -> str:
+    """Encode one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/analyze/stream")
+async def analyze_sql_stream(request: SQLAnalysisRequest):
+    """Analyze SQL query, streaming progress as server-sent events
+    
+    Events: "token" (generated text as it arrives), "issue" (each issue as soon
+    as the model has completed it), then one final "result" with the full
+    response, or "error". Early issues are provisional; "result" is authoritative.
+    The delay until the first token is recorded as the model's first_token stage.
+    A stream from an LLM backend takes a place in its scheduler's queue; when
+    the queue is full the request is answered with 429 and Retry-After.
+    """
+    model = get_model(request.model)
+    model_name = request.model.lower()
+    
+    key = None
+    cached = None
+    if model.cache_results:
+        with stage_timer(model_name, "cache_lookup").time():
+            key = cache_key(model_name, model, model.cache_version(), request.sql)
+            cached = result_cache.get(key)
+    events = None
+    if cached is None:
+        try:
+            # LLM backends reserve their scheduler slot here, before the response starts
+            events = model.astream_analyze(request.sql)
+        except SchedulerBusyError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    async def stream_events():
+        try:
+            if cached is not None:
+                yield sse_event("result", present_result(model_name, cached))
+                return
+            
+            started = time.perf_counter()
+            first_token = True
+            async for event in events:
+                name, data = event["event"], event["data"]
+                if name == "token":
+                    if first_token:
+                        stage_timer(model_name, "first_token").observe(time.perf_counter() - started)
+                        first_token = False
+                    yield sse_event("token", {"text": data})
+                elif name == "safety_issue":
+                    yield sse_event("issue", format_safety_issue(data))
+                elif name == "performance_suggestion":
+                    yield sse_event("issue", format_performance_suggestion(data))
+                elif name == "result":
+                    if key is not None and cacheable(data):
+                        result_cache.set(key, data)
+                    yield sse_event("result", present_result(model_name, data))
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(stream_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/fingerprint")
+async def fingerprint_sql(request: SQLAnalysisRequest):
+    """Return the literal-free shape of a SQL statement and its stable hash"""
+    return {
+        "fingerprint": fingerprint(request.sql),
+        "hash": fingerprint_hash(request.sql)
+    }
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Result cache hit/miss counters and size"""
+    return result_cache.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, requests, cache and backend counters (disable with METRICS_ENABLED=false)"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling_settings():
+    """Current profiling toggle, sample rate and storage settings"""
+    return request_profiler.settings()
+
+@app.put("/admin/profiling", dependencies=[Depends(require_admin)])
+async def update_profiling_settings(settings: ProfilingSettings):
+    """Switch sampled profiling on or off and change its sample rate"""
+    try:
+        return request_profiler.configure(settings.enabled, settings.sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Stored profiles, newest first"""
+    return {"profiles": request_profiler.store.list()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 40):
+    """Text report of a stored profile's top functions"""
+    try:
+        return PlainTextResponse(request_profiler.store.report(profile_id, sort, limit))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/profiles/{profile_id}/raw", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """The stored profile in pstats format, for pstats, snakeviz and similar tools"""
+    try:
+        path = request_profiler.store.path(profile_id)
+    except KeyError:
+        path = None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.delete("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def delete_profile(profile_id: str):
+    """Remove a stored profile"""
+    if not request_profiler.store.valid_id(profile_id) or not request_profiler.store.delete(profile_id):
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return {"deleted": profile_id}
+
+@app.get("/admin/catalog", dependencies=[Depends(require_admin)])
+async def get_schema_catalog(tables: bool = False):
+    """Schema catalog summary, optionally with every table's columns, indexes and row count"""
+    catalog = get_catalog()
+    summary = catalog.summary()
+    if tables:
+        summary["table_list"] = [
+            {"name": table.name, "columns": list(table.columns), "row_count": table.row_count,
+             "indexes": [index._asdict() for index in table.indexes]}
+            for table in catalog.tables()
+        ]
+    return summary
+
+@app.post("/admin/catalog/refresh", dependencies=[Depends(require_admin)])
+async def refresh_schema_catalog(force: bool = False):
+    """Reload changed DDL files and database tables now (everything with force=true)"""
+    catalog = get_catalog()
+    loop = asyncio.get_running_loop()
+    reloaded = await loop.run_in_executor(None, functools.partial(catalog.refresh, force))
+    return dict(catalog.summary(), reloaded=reloaded)
+
 @app.get("/")
 async def root():
     """API root path, returns basic information"""
@@ -93,6 +705,92 @@ async def root():
         "description": "API for analyzing SQL queries for safety and performance"
     }
 
+def cache_metrics():
+    """Result and query plan cache counters, read from the caches at scrape time"""
+    stats = result_cache.stats()
+    plans = get_plan_analyzer().stats()
+    return [
+        ("sqlcheck_result_cache_hits_total", "counter", "Result cache hits", [({}, stats["hits"])]),
+        ("sqlcheck_result_cache_misses_total", "counter", "Result cache misses", [({}, stats["misses"])]),
+        ("sqlcheck_result_cache_disk_hits_total", "counter", "Result cache hits served from the persistent store",
+         [({}, stats["disk_hits"])]),
+        ("sqlcheck_result_cache_evictions_total", "counter", "Result cache entries evicted", [({}, stats["evictions"])]),
+        ("sqlcheck_result_cache_hit_ratio", "gauge", "Result cache hits per lookup since startup",
+         [({}, stats["hit_rate"])]),
+        ("sqlcheck_result_cache_entries", "gauge", "Entries in the result cache", [({}, stats["entries"])]),
+        ("sqlcheck_result_cache_bytes", "gauge", "Serialized size of the result cache", [({}, stats["bytes"])]),
+        ("sqlcheck_plan_cache_hits_total", "counter", "Query plans served from the plan cache", [({}, plans["hits"])]),
+        ("sqlcheck_plan_cache_misses_total", "counter", "Query plans requested from the database",
+         [({}, plans["misses"])]),
+    ]
+
+def scheduler_metrics():
+    """Queue depth and batching counters of every LLM backend's scheduler"""
+    schedulers = [(name, model.scheduler.stats()) for name, model in model_registry.instances().items()
+                  if isinstance(model, ScheduledModel)]
+    return [
+        ("sqlcheck_scheduler_queued", "gauge", "Statements waiting or running in a backend's scheduler",
+         [({"model": name}, stats["queued"]) for name, stats in schedulers]),
+        ("sqlcheck_scheduler_batches_total", "counter", "Batches sent to a backend by its scheduler",
+         [({"model": name}, stats["batches"]) for name, stats in schedulers]),
+        ("sqlcheck_scheduler_rejected_total", "counter", "Requests rejected because a backend's queue was full",
+         [({"model": name}, stats["rejected"]) for name, stats in schedulers]),
+        ("sqlcheck_scheduler_batch_latency_seconds", "gauge", "Moving average of a backend's batch latency",
+         [({"model": name}, stats["batch_latency"]) for name, stats in schedulers]),
+    ]
+
+REGISTRY.add_collector(cache_metrics)
+REGISTRY.add_collector(scheduler_metrics)
+
+class MetricsMiddleware:
+    """Counts requests in flight and times them per endpoint
+    
+    Plain ASGI rather than an HTTP middleware, so streamed responses (including
+    the script endpoint, which responds while still reading the body) pass
+    through untouched. Endpoints are labelled with the path template of their
+    route (e.g. /api/sessions/{session_id}), so parametrized paths share one
+    series; paths that match no route are counted as "other".
+    """
+    
+    def __init__(self, app, routes: List[BaseRoute]):
+        self.app = app
+        self.routes = routes
+    
+    def match_endpoint(self, scope) -> str:
+        """Path template of the route the request will be routed to, before routing"""
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                return getattr(route, "path", "other")
+        return "other"
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = "500"
+        
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+        
+        in_flight = REQUESTS_IN_FLIGHT.labels(self.match_endpoint(scope))
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            # The router records the route it dispatched to in the scope
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "other"
+            REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - started)
+
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
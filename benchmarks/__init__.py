@@ -0,0 +1 @@
+"""Performance benchmarks: generated SQL corpus, runner, mock LLM server and regression comparison"""
@@ -0,0 +1,172 @@
+"""
+Request throughput benchmark for the HTTP API.
+
+Drives the ASGI application in-process, without sockets or an HTTP client,
+so the numbers cover exactly the server's own work per request: middleware,
+routing, request parsing, analysis (from the model or the result cache),
+result validation and JSON encoding. For each model it reports requests and
+statements per second and p50/p99 latency on /api/analyze (one statement per
+request) and /api/analyze/batch (--batch-size statements per request):
+
+    python -m benchmarks.api --models simple,advanced --output benchmarks/results/api.json
+
+Requests cycle through the generated corpus (--corpus) with --concurrency
+callers. Results are keyed by (model, endpoint) in the "corpus" field, so two
+runs can be gated with benchmarks.compare like the model benchmarks.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from app import MODEL_MAP, app
+from benchmarks.corpus import SIZES, DEFAULT_SEED, generate_corpus
+from benchmarks.run import RESULTS_DIR, git_commit, percentile
+
+# Rule models answer without a backend; LLM models are measured by benchmarks.run
+RULE_MODELS = ("simple", "advanced")
+ENDPOINTS = ("analyze", "batch")
+
+
+async def post(path: str, body: bytes) -> int:
+    """Send one POST request through the ASGI application; returns the status code"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    received = False
+    status = 0
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal received
+        if received:
+            # Only asked again by disconnect watchers once the response is complete
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def request_bodies(model: str, endpoint: str, statements: List[str], batch_size: int) -> List[bytes]:
+    if endpoint == "analyze":
+        return [json.dumps({"sql": statement, "model": model}).encode() for statement in statements]
+    return [json.dumps({"queries": statements[i:i + batch_size], "model": model}).encode()
+            for i in range(0, len(statements), batch_size)]
+
+
+async def drive(path: str, bodies: List[bytes], requests: int, concurrency: int) -> Dict[str, Any]:
+    """Send requests POSTs (cycling through bodies) with a fixed number of concurrent callers"""
+    latencies: List[float] = []
+    next_request = 0
+
+    async def caller() -> None:
+        nonlocal next_request
+        while next_request < requests:
+            body = bodies[next_request % len(bodies)]
+            next_request += 1
+            before = time.perf_counter()
+            status = await post(path, body)
+            latencies.append(time.perf_counter() - before)
+            if status != 200:
+                raise RuntimeError(f"{path} answered {status}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 6),
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+async def run_api_benchmarks(models: List[str], endpoints: List[str], corpus_size: str = "100kb",
+                             seed: int = DEFAULT_SEED, requests: int = 2000, concurrency: int = 16,
+                             batch_size: int = 50, warmup: int = 200, log=print) -> Dict[str, Any]:
+    """Measure every model on every endpoint and return the results document"""
+    corpus = generate_corpus(SIZES[corpus_size], seed)
+    results = []
+    async with app.router.lifespan_context(app):
+        for model in models:
+            for endpoint in endpoints:
+                path = "/api/analyze" if endpoint == "analyze" else "/api/analyze/batch"
+                bodies = request_bodies(model, endpoint, corpus, batch_size)
+                # Builds the model and fills the caches a long-running server would have
+                await drive(path, bodies, min(warmup, len(bodies)), concurrency)
+                measured = await drive(path, bodies, requests, concurrency)
+                per_request = 1 if endpoint == "analyze" else batch_size
+                measured["statements_per_sec"] = round(measured["requests_per_sec"] * per_request, 2)
+                result = {"model": model, "corpus": f"api-{endpoint}"}
+                result.update(measured)
+                results.append(result)
+                log(f"{model:>9} {endpoint:>7}: {measured['requests']:>6} requests, "
+                    f"{measured['requests_per_sec']:>10.1f} req/s, p50 {measured['p50_ms']:.3f} ms, "
+                    f"p99 {measured['p99_ms']:.3f} ms")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "corpus": corpus_size,
+            "concurrency": concurrency,
+            "batch_size": batch_size
+        },
+        "results": results
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark API request throughput in-process")
+    parser.add_argument("--models", default=",".join(RULE_MODELS), help="comma-separated model names")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"comma-separated: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--corpus", default="100kb", help=f"corpus size the requests cycle through: {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per model and endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent callers")
+    parser.add_argument("--batch-size", type=int, default=50, help="statements per batch request")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/api-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    models = [name.strip().lower() for name in args.models.split(",") if name.strip()]
+    endpoints = [name.strip().lower() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in models if name not in MODEL_MAP] + \
+        [name for name in endpoints if name not in ENDPOINTS] + ([args.corpus] if args.corpus not in SIZES else [])
+    if unknown:
+        parser.error(f"unknown model, endpoint or corpus size: {', '.join(unknown)}")
+
+    document = asyncio.run(run_api_benchmarks(
+        models, endpoints, args.corpus, args.seed, max(1, args.requests), max(1, args.concurrency),
+        max(1, args.batch_size), log=lambda line: print(line, file=sys.stderr)))
+    output = args.output or os.path.join(RESULTS_DIR, f"api-{document['meta']['commit'] or 'latest'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Compare two benchmark result files and fail on regressions.
+
+    python -m benchmarks.compare benchmarks/results/main.json benchmarks/results/HEAD.json
+
+Each (model, corpus) measured in both files is compared on throughput,
+p99 latency and peak memory. The exit status is 1 when any of them is worse
+than its threshold allows, so the comparison can gate a merge.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Metric, whether higher is better, and the default allowed relative change
+METRICS: List[Tuple[str, bool, float]] = [
+    ("statements_per_sec", True, 0.10),
+    ("p99_ms", False, 0.25),
+    ("peak_memory_bytes", False, 0.20),
+]
+
+
+def load_results(path: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as file:
+        document = json.load(file)
+    return {(result["model"], result["corpus"]): result for result in document.get("results", [])}
+
+
+def compare(baseline: Dict[Tuple[str, str], Dict[str, Any]], current: Dict[Tuple[str, str], Dict[str, Any]],
+            thresholds: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """One row per metric of every (model, corpus) present in both; "regression" marks failures"""
+    thresholds = thresholds or {}
+    rows = []
+    for key in sorted(set(baseline) & set(current)):
+        for metric, higher_is_better, default_threshold in METRICS:
+            before = baseline[key].get(metric)
+            after = current[key].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            threshold = thresholds.get(metric, default_threshold)
+            worse = -change if higher_is_better else change
+            rows.append({
+                "model": key[0],
+                "corpus": key[1],
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change": change,
+                "regression": worse > threshold
+            })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare benchmark results and fail on regressions")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-slowdown", type=float, default=METRICS[0][2],
+                        help="allowed relative drop in statements/sec (default: %(default)s)")
+    parser.add_argument("--max-latency-increase", type=float, default=METRICS[1][2],
+                        help="allowed relative increase in p99 latency (default: %(default)s)")
+    parser.add_argument("--max-memory-increase", type=float, default=METRICS[2][2],
+                        help="allowed relative increase in peak memory (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    rows = compare(load_results(args.baseline), load_results(args.current), {
+        "statements_per_sec": args.max_slowdown,
+        "p99_ms": args.max_latency_increase,
+        "peak_memory_bytes": args.max_memory_increase,
+    })
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['model']:>9} {row['corpus']:>6} {row['metric']:<19} "
+              f"{row['baseline']:>14.4f} -> {row['current']:>14.4f} {row['change']:>+8.1%} {flag}")
+    regressions = [row for row in rows if row["regression"]]
+    if not rows:
+        print("No common (model, corpus) results to compare", file=sys.stderr)
+    elif regressions:
+        print(f"{len(regressions)} regression(s)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Reproducible SQL corpus for the benchmarks.
+
+A corpus is a list of statements of a given total size, generated from a
+seeded random source so every run (and every commit) measures exactly the
+same input. Statements are drawn from four kinds:
+
+- short: point lookups and single-row writes, the bulk of production traffic
+- long: wide projections, long IN lists and multi-row inserts
+- multi_join: joins across several tables with subqueries, grouping and ordering
+- pathological: input built to stress the lexical rules and the parser, such as
+  long runs of quotes, escapes, comment markers, whitespace and nesting
+"""
+
+import random
+from typing import Callable, Dict, List, Tuple
+
+# Corpus sizes, by name
+SIZES: Dict[str, int] = {
+    "1kb": 1024,
+    "100kb": 100 * 1024,
+    "1mb": 1024 * 1024,
+    "10mb": 10 * 1024 * 1024,
+}
+
+DEFAULT_SEED = 20240501
+
+TABLES = ["users", "orders", "order_items", "products", "payments", "sessions", "audit_log", "inventory"]
+COLUMNS = ["id", "user_id", "order_id", "product_id", "status", "amount", "created_at", "updated_at",
+           "name", "email", "price", "quantity", "token", "region"]
+
+
+def _table(rng: random.Random) -> str:
+    return rng.choice(TABLES)
+
+
+def _column(rng: random.Random) -> str:
+    return rng.choice(COLUMNS)
+
+
+def _literal(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return str(rng.randint(1, 10 ** 6))
+    return "'" + "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(rng.randint(3, 16))) + "'"
+
+
+def short_statement(rng: random.Random) -> str:
+    table, column = _table(rng), _column(rng)
+    templates = [
+        f"SELECT * FROM {table} WHERE id = {_literal(rng)}",
+        f"SELECT {column}, {_column(rng)} FROM {table} WHERE {column} = {_literal(rng)} LIMIT 10",
+        f"UPDATE {table} SET {column} = {_literal(rng)} WHERE id = {rng.randint(1, 10 ** 6)}",
+        f"DELETE FROM {table} WHERE id = {rng.randint(1, 10 ** 6)}",
+        f"INSERT INTO {table} ({column}, {_column(rng)}) VALUES ({_literal(rng)}, {_literal(rng)})",
+        f"SELECT COUNT(*) FROM {table}",
+        f"DELETE FROM {table}",
+        f"DROP TABLE {table}_tmp",
+    ]
+    return rng.choice(templates)
+
+
+def long_statement(rng: random.Random) -> str:
+    table = _table(rng)
+    kind = rng.randrange(3)
+    if kind == 0:
+        columns = ", ".join(f"{_column(rng)} AS c{i}" for i in range(rng.randint(50, 400)))
+        return f"SELECT {columns} FROM {table} WHERE status = 'active'"
+    if kind == 1:
+        values = ", ".join(str(rng.randint(1, 10 ** 7)) for _ in range(rng.randint(200, 3000)))
+        return f"SELECT id, name FROM {table} WHERE id IN ({values}) ORDER BY id"
+    rows = ", ".join(f"({_literal(rng)}, {_literal(rng)}, {_literal(rng)})" for _ in range(rng.randint(100, 1000)))
+    return f"INSERT INTO {table} (name, email, status) VALUES {rows}"
+
+
+def multi_join_statement(rng: random.Random) -> str:
+    tables = rng.sample(TABLES, rng.randint(3, len(TABLES)))
+    select = ", ".join(f"t{i}.{_column(rng)}" for i in range(len(tables)))
+    joins = []
+    for i, table in enumerate(tables[1:], 1):
+        join = rng.choice(["JOIN", "LEFT JOIN", "INNER JOIN"])
+        # Leave some joins without a condition, as real logs do
+        condition = f" ON t{i}.{_column(rng)} = t{i - 1}.id" if rng.random() < 0.9 else ""
+        joins.append(f"{join} {table} t{i}{condition}")
+    subquery = f"t0.id IN (SELECT user_id FROM {_table(rng)} WHERE amount > {rng.randint(1, 1000)})"
+    return (f"SELECT {select} FROM {tables[0]} t0 {' '.join(joins)} "
+            f"WHERE {subquery} AND t0.status = {_literal(rng)} "
+            f"GROUP BY t0.id HAVING COUNT(*) > {rng.randint(1, 10)} ORDER BY t0.created_at DESC LIMIT 100")
+
+
+def pathological_statement(rng: random.Random) -> str:
+    table = _table(rng)
+    length = rng.randint(1000, 20000)
+    kind = rng.randrange(7)
+    if kind == 0:
+        # Escaped quotes inside one long string literal
+        return f"SELECT * FROM {table} WHERE name = '" + "\\'" * (length // 2) + "'"
+    if kind == 1:
+        # Doubled single quotes, the standard escape
+        return f"SELECT * FROM {table} WHERE name = '" + "''" * (length // 2) + "'"
+    if kind == 2:
+        # Many comment markers, including an unterminated block comment
+        return f"SELECT * FROM {table} " + "-- x\n/* y */ " * (length // 12) + "/* unterminated"
+    if kind == 3:
+        # Long runs of whitespace between keywords
+        return "SELECT" + " " * length + "*" + "\t" * length + f"FROM {table}" + "\n" * 100 + "WHERE 1 = 1"
+    if kind == 4:
+        # Deeply nested parentheses
+        depth = rng.randint(50, 100)
+        return f"SELECT * FROM {table} WHERE id = " + "(" * depth + "1" + ")" * depth
+    if kind == 5:
+        # A long chain of OR conditions
+        return f"SELECT * FROM {table} WHERE " + " OR ".join(f"id = {i}" for i in range(length // 10))
+    # Keyword-like identifiers that almost match the rules
+    words = ["DROPS", "DELETED", "UPDATES", "WHERE_", "SELECTED", "UNIONS", "EXECUTE_", "GRANTED"]
+    return f"SELECT {', '.join(rng.choice(words) for _ in range(length // 8))} FROM {table}"
+
+
+# Generators and how often each kind is drawn
+KINDS: List[Tuple[str, Callable[[random.Random], str], float]] = [
+    ("short", short_statement, 0.70),
+    ("long", long_statement, 0.08),
+    ("multi_join", multi_join_statement, 0.17),
+    ("pathological", pathological_statement, 0.05),
+]
+
+
+def generate_corpus(size: int, seed: int = DEFAULT_SEED) -> List[str]:
+    """Generate statements totalling about size bytes (UTF-8), the same list for the same seed
+
+    One statement of each kind is tried first, so small corpora still cover
+    every kind that fits; statements larger than what is left of the budget
+    are skipped so the corpus does not overshoot.
+    """
+    rng = random.Random(seed)
+    generators = [generator for _, generator, _ in KINDS]
+    weights = [weight for _, _, weight in KINDS]
+    statements: List[str] = []
+    total = 0
+    draws = 0
+    misses = 0
+    while total < size and misses < 100:
+        if draws < len(generators):
+            generator = generators[draws]
+        else:
+            generator = rng.choices(generators, weights)[0]
+        draws += 1
+        statement = generator(rng)
+        length = len(statement.encode("utf-8"))
+        if total + length > size:
+            misses += 1
+            continue
+        statements.append(statement)
+        total += length
+        misses = 0
+    return statements
+
+
+def generate_corpora(sizes: List[str], seed: int = DEFAULT_SEED) -> Dict[str, List[str]]:
+    """Generate one corpus per named size"""
+    return {name: generate_corpus(SIZES[name], seed) for name in sizes}
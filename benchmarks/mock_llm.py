@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Ollama and Copilot APIs, with configurable latency.
+
+Answers every analysis prompt with a fixed, valid analysis after sleeping
+for the configured latency, so LLM-backed models can be benchmarked without
+a GPU or network access and the measurements show the analyzer's own
+overhead on top of a known backend latency.
+
+Endpoints:
+- POST /api/generate: Ollama, streamed as newline-delimited JSON
+- GET /copilot/token: Copilot token exchange
+- POST /copilot: Copilot completion (the analysis JSON as the body)
+
+    python -m benchmarks.mock_llm --port 11434 --latency-ms 200
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+# Batched prompts announce how many results they expect
+_BATCH_COUNT = re.compile(r"\((\d+) queries\)")
+
+ANALYSIS = {
+    "safety_issues": [{
+        "issue": "Query may expose sensitive columns",
+        "severity": "medium",
+        "recommendation": "Select only the columns you need",
+        "explanation": "Mocked response"
+    }],
+    "performance_suggestions": [{
+        "suggestion": "Add an index on the filtered column",
+        "impact": "low",
+        "recommendation": "CREATE INDEX ...",
+        "explanation": "Mocked response"
+    }],
+    "risk_score": 40
+}
+
+# Size of the pieces an Ollama response is streamed in
+STREAM_PIECE = 24
+
+
+def analysis_for(prompt: str) -> Dict[str, Any]:
+    """The response document for a prompt: one analysis, or one per query of a batch"""
+    match = _BATCH_COUNT.search(prompt)
+    if match:
+        return {"results": [dict(ANALYSIS, index=index) for index in range(int(match.group(1)))]}
+    return ANALYSIS
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering like Ollama and Copilot after latency (+/- jitter) seconds"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self) -> None:
+        self.requests += 1
+        latency = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if latency > 0:
+            time.sleep(latency)
+
+    def start(self) -> "MockLLMServer":
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, as the models' pooled sessions expect
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self) -> None:
+        if self.path.startswith("/copilot/token"):
+            self._send(json.dumps({"token": "mock-copilot-token", "expires_in": 3600}).encode())
+            return
+        self.send_error(404)
+
+    def do_POST(self) -> None:
+        payload = self._read_json()
+        prompt = str(payload.get("prompt", ""))
+        self.server.delay()
+        text = json.dumps(analysis_for(prompt))
+        if self.path.startswith("/api/generate"):
+            pieces = [text[i:i + STREAM_PIECE] for i in range(0, len(text), STREAM_PIECE)]
+            lines = [json.dumps({"response": piece, "done": False}) for piece in pieces]
+            lines.append(json.dumps({"response": "", "done": True}))
+            self._send(("\n".join(lines) + "\n").encode(), "application/x-ndjson")
+        elif self.path.startswith("/copilot"):
+            self._send(text.encode())
+        else:
+            self.send_error(404)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock Ollama/Copilot server with configurable latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    server = MockLLMServer(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000)
+    print(f"Mock LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark runner: measure every model of the API on the generated corpus.
+
+For each model and corpus size it reports statements per second, p50/p99
+latency per statement and peak traced memory, and saves the results with
+the commit they were measured on, for benchmarks.compare:
+
+    python -m benchmarks.run --sizes 1kb,100kb,1mb --output benchmarks/results/main.json
+
+Rule models analyze the whole corpus one statement at a time. LLM-backed
+models are pointed at a local mock server that answers after
+--llm-latency-ms and are driven through their asynchronous path with
+--llm-concurrency callers, on the first --llm-limit statements of each
+corpus. The result cache is not involved; the numbers are the models' own.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from app import MODEL_MAP
+from models import ModelRegistry
+from benchmarks.corpus import SIZES, DEFAULT_SEED, generate_corpus
+from benchmarks.mock_llm import MockLLMServer
+from utils.sql_parser import clear_cache as clear_parse_cache
+
+# Models that call an LLM backend (directly or by escalation)
+LLM_MODELS = ("copilot", "ollama", "tiered")
+
+DEFAULT_SIZES = "1kb,100kb,1mb"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], elapsed: float, statements: List[str]) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "statements": len(statements),
+        "bytes": sum(len(statement.encode("utf-8")) for statement in statements),
+        "seconds": round(elapsed, 6),
+        "statements_per_sec": round(len(statements) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+def reset_caches() -> None:
+    """Start every measurement cold: the corpora share statements and would hit the parse cache"""
+    clear_parse_cache()
+
+
+def run_sync(model, statements: List[str]) -> Dict[str, Any]:
+    """Analyze statements one after another on this thread"""
+    analyze = model.analyze
+    latencies = []
+    clock = time.perf_counter
+    started = clock()
+    for statement in statements:
+        before = clock()
+        analyze(statement)
+        latencies.append(clock() - before)
+    return summarize(latencies, clock() - started, statements)
+
+
+def run_async(model, statements: List[str], concurrency: int) -> Dict[str, Any]:
+    """Analyze statements through aanalyze with a fixed number of concurrent callers"""
+    latencies: List[float] = []
+
+    async def caller(queue: "asyncio.Queue[str]") -> None:
+        while True:
+            try:
+                statement = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            before = time.perf_counter()
+            await model.aanalyze(statement)
+            latencies.append(time.perf_counter() - before)
+
+    async def drive() -> float:
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        for statement in statements:
+            queue.put_nowait(statement)
+        started = time.perf_counter()
+        await asyncio.gather(*(caller(queue) for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(drive())
+    return summarize(latencies, elapsed, statements)
+
+
+def peak_memory(model, statements: List[str], llm: bool, concurrency: int) -> int:
+    """Peak memory traced while analyzing the statements again, in bytes"""
+    reset_caches()
+    tracemalloc.start()
+    try:
+        if llm:
+            run_async(model, statements, concurrency)
+        else:
+            for statement in statements:
+                model.analyze(statement)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(RESULTS_DIR)).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(models: List[str], sizes: List[str], seed: int = DEFAULT_SEED,
+                   llm_latency: float = 0.05, llm_concurrency: int = 8, llm_limit: int = 200,
+                   memory: bool = True, log=print) -> Dict[str, Any]:
+    """Run every model on every corpus size and return the results document"""
+    server = MockLLMServer(latency=llm_latency).start()
+    # LLM models read their endpoints from the environment when they are built
+    os.environ["OLLAMA_API_URL"] = server.url
+    os.environ["COPILOT_API_URL"] = f"{server.url}/copilot"
+    os.environ["COPILOT_AUTH_URL"] = f"{server.url}/copilot/token"
+    os.environ.setdefault("GITHUB_TOKEN", "mock-github-token")
+
+    registry = ModelRegistry(MODEL_MAP)
+
+    results = []
+    try:
+        for size in sizes:
+            corpus = generate_corpus(SIZES[size], seed)
+            for name in models:
+                model = registry.get(name)
+                llm = name in LLM_MODELS
+                statements = corpus[:llm_limit] if llm else corpus
+                reset_caches()
+                if llm:
+                    measured = run_async(model, statements, llm_concurrency)
+                else:
+                    measured = run_sync(model, statements)
+                measured["peak_memory_bytes"] = peak_memory(model, statements, llm, llm_concurrency) if memory else None
+                result = {"model": name, "corpus": size}
+                result.update(measured)
+                results.append(result)
+                log(f"{name:>9} {size:>6}: {result['statements']:>6} statements, "
+                    f"{result['statements_per_sec']:>10.1f} stmt/s, p50 {result['p50_ms']:.3f} ms, "
+                    f"p99 {result['p99_ms']:.3f} ms")
+    finally:
+        registry.shutdown()
+        server.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "llm_latency_ms": llm_latency * 1000,
+            "llm_concurrency": llm_concurrency,
+            "llm_limit": llm_limit
+        },
+        "results": results
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the SQL analysis models on a generated corpus")
+    parser.add_argument("--models", default=",".join(MODEL_MAP), help="comma-separated model names (default: all)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma-separated corpus sizes: {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="latency of the mock LLM server")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="concurrent callers for LLM models")
+    parser.add_argument("--llm-limit", type=int, default=200, help="statements per corpus for LLM models")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    models = [name.strip().lower() for name in args.models.split(",") if name.strip()]
+    sizes = [size.strip().lower() for size in args.sizes.split(",") if size.strip()]
+    unknown = [name for name in models if name not in MODEL_MAP] + [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown model or size: {', '.join(unknown)}")
+
+    document = run_benchmarks(models, sizes, args.seed, args.llm_latency_ms / 1000, max(1, args.llm_concurrency),
+                              max(1, args.llm_limit), not args.no_memory, log=lambda line: print(line, file=sys.stderr))
+    output = args.output or os.path.join(RESULTS_DIR, f"{document['meta']['commit'] or 'latest'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Command-line auditor for SQL scripts and query logs.
+
+Runs any model of the API over files, directories, stdin or MySQL/PostgreSQL
+slow-query logs without starting the server, and writes one result per
+statement (JSONL or CSV) plus a per-fingerprint summary. Input is streamed
+and analyzed in windows of --batch-size statements, so memory stays bounded
+however large the logs are.
+
+    python cli.py /var/log/mysql/slow.log --model advanced --workers 32 \\
+        --output results.jsonl --summary summary.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, IO, Iterator, List, Optional, Sequence, Tuple
+
+from app import MODEL_MAP, run_batch_analysis, format_analysis_result
+from models import ModelRegistry, RuleProcessPool, ScheduledModel, SQLAnalyzerModel
+from utils.fingerprint import fingerprint, fingerprint_hash
+from utils.query_log import FORMATS, DEFAULT_PATTERNS, LoggedStatement, iter_sources
+
+OUTPUT_FORMATS = ("jsonl", "csv")
+
+RESULT_FIELDS = ["source", "line", "fingerprint", "query_time", "risk_score", "risk_level",
+                 "safety_score", "performance_score", "issue_count", "issues", "sql", "error"]
+SUMMARY_FIELDS = ["fingerprint", "count", "max_risk_score", "avg_risk_score", "risk_level",
+                  "total_query_time", "max_query_time", "issues", "example", "query"]
+
+# Summary bucket for statements whose fingerprint arrived after --max-fingerprints distinct ones
+OTHER_FINGERPRINT = "*"
+
+# Longest query text and number of distinct issues kept per fingerprint
+MAX_SUMMARY_QUERY = 1000
+MAX_SUMMARY_ISSUES = 10
+
+
+class FingerprintSummary:
+    """Aggregates results per statement fingerprint, holding at most max_fingerprints entries"""
+
+    def __init__(self, max_fingerprints: int):
+        self.max_fingerprints = max_fingerprints
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, statement: LoggedStatement, digest: str, record: Dict[str, Any]) -> None:
+        entry = self.entries.get(digest)
+        if entry is None:
+            if len(self.entries) >= self.max_fingerprints:
+                digest = OTHER_FINGERPRINT
+                entry = self.entries.get(digest)
+            if entry is None:
+                entry = self.entries[digest] = {
+                    "fingerprint": digest,
+                    "count": 0,
+                    "risk_total": 0,
+                    "max_risk_score": 0,
+                    "total_query_time": 0.0,
+                    "max_query_time": None,
+                    "issues": [],
+                    "example": f"{statement.source}:{statement.line}",
+                    "query": fingerprint(statement.sql)[:MAX_SUMMARY_QUERY] if digest != OTHER_FINGERPRINT else ""
+                }
+        entry["count"] += 1
+        risk_score = record.get("risk_score") or 0
+        entry["risk_total"] += risk_score
+        entry["max_risk_score"] = max(entry["max_risk_score"], risk_score)
+        if statement.query_time is not None:
+            entry["total_query_time"] += statement.query_time
+            entry["max_query_time"] = max(entry["max_query_time"] or 0.0, statement.query_time)
+        issues = entry["issues"]
+        for issue in record.get("issues", []):
+            description = issue.get("description")
+            if description and description not in issues and len(issues) < MAX_SUMMARY_ISSUES:
+                issues.append(description)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Summary rows, riskiest first, then by total time spent and by count"""
+        rows = []
+        for entry in self.entries.values():
+            rows.append({
+                "fingerprint": entry["fingerprint"],
+                "count": entry["count"],
+                "max_risk_score": entry["max_risk_score"],
+                "avg_risk_score": round(entry["risk_total"] / entry["count"], 1),
+                "risk_level": SQLAnalyzerModel.get_risk_level(entry["max_risk_score"]),
+                "total_query_time": round(entry["total_query_time"], 6),
+                "max_query_time": entry["max_query_time"],
+                "issues": entry["issues"],
+                "example": entry["example"],
+                "query": entry["query"]
+            })
+        rows.sort(key=lambda row: (-row["max_risk_score"], -row["total_query_time"], -row["count"]))
+        return rows
+
+
+class RecordWriter:
+    """Writes records as JSON lines or CSV rows; list fields become " | "-joined cells in CSV"""
+
+    def __init__(self, file: IO[str], output_format: str, fields: List[str]):
+        self.file = file
+        self.output_format = output_format
+        self.fields = fields
+        self._csv: Optional[csv.DictWriter] = None
+        if output_format == "csv":
+            self._csv = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+            self._csv.writeheader()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._csv is None:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        row = {}
+        for field in self.fields:
+            value = record.get(field)
+            if isinstance(value, list):
+                value = " | ".join(
+                    f"{item['severity']}: {item['description']}" if isinstance(item, dict) else str(item)
+                    for item in value
+                )
+            row[field] = value
+        self._csv.writerow(row)
+
+
+def result_record(statement: LoggedStatement, digest: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """One output record: where the statement came from and its analysis in API form"""
+    risk_score = result.get("risk_score", 0)
+    record = {
+        "source": statement.source,
+        "line": statement.line,
+        "fingerprint": digest,
+        "query_time": statement.query_time,
+        "risk_score": risk_score,
+        "risk_level": result.get("risk_level") or SQLAnalyzerModel.get_risk_level(risk_score)
+    }
+    record.update(format_analysis_result(result))
+    record["issue_count"] = len(record["issues"])
+    record["sql"] = statement.sql
+    if result.get("error"):
+        record["error"] = record["summary"]
+    return record
+
+
+def windows(statements: Iterator[LoggedStatement], size: int) -> Iterator[List[LoggedStatement]]:
+    """Group the statement stream into lists of at most size statements"""
+    while True:
+        window = list(islice(statements, size))
+        if not window:
+            return
+        yield window
+
+
+def build_model(registry: ModelRegistry, model_name: str, workers: int) -> SQLAnalyzerModel:
+    """Get the model from the registry, with LLM backends allowed `workers` concurrent calls"""
+    model = registry.get(model_name)
+    if isinstance(model, ScheduledModel):
+        model.scheduler.max_concurrency = workers
+    return model
+
+
+async def audit(statements: Iterator[LoggedStatement], model_name: str, model: SQLAnalyzerModel,
+                writer: RecordWriter, summary: FingerprintSummary,
+                batch_size: int, in_flight: int) -> Tuple[int, int]:
+    """Analyze the stream window by window, writing results in input order
+
+    Up to in_flight windows are analyzed concurrently while the next one is
+    read. Returns the number of statements and of failed analyses.
+    """
+    pending: Deque[Tuple[List[LoggedStatement], "asyncio.Task[List[Dict[str, Any]]]"]] = deque()
+    count = 0
+    errors = 0
+
+    async def drain_one() -> None:
+        nonlocal count, errors
+        window, task = pending.popleft()
+        try:
+            results = await task
+        except Exception as e:
+            results = [{"error": True, "details": str(e)}] * len(window)
+        for statement, result in zip(window, results):
+            digest = fingerprint_hash(statement.sql)
+            if result.get("error") and "risk_score" not in result:
+                record = {"source": statement.source, "line": statement.line, "fingerprint": digest,
+                          "query_time": statement.query_time, "sql": statement.sql,
+                          "error": result.get("details", "analysis failed")}
+            else:
+                record = result_record(statement, digest, result)
+                summary.add(statement, digest, record)
+            if record.get("error"):
+                errors += 1
+            writer.write(record)
+        count += len(window)
+
+    for window in windows(statements, batch_size):
+        task = asyncio.ensure_future(run_batch_analysis(model_name, model, [statement.sql for statement in window]))
+        pending.append((window, task))
+        if len(pending) >= in_flight:
+            await drain_one()
+        # Let the tasks start before the next window is read
+        await asyncio.sleep(0)
+    while pending:
+        await drain_one()
+    return count, errors
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Audit SQL files, directories, stdin or slow-query logs with a SQL analysis model"
+    )
+    parser.add_argument("paths", nargs="*", default=["-"],
+                        help='files or directories to read; "-" (default) reads stdin')
+    parser.add_argument("-m", "--model", default=os.getenv("DEFAULT_MODEL", "simple").split()[0],
+                        help=f"model to run ({', '.join(MODEL_MAP)})")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for rule models, concurrent calls for LLM models (default: CPU count)")
+    parser.add_argument("-f", "--input-format", choices=FORMATS, default="auto",
+                        help="input format (default: detected per file)")
+    parser.add_argument("--pattern", action="append",
+                        help=f"file name pattern when reading directories (default: {' '.join(DEFAULT_PATTERNS)})")
+    parser.add_argument("-o", "--output", default="-", help='per-statement results file (default: "-", stdout)')
+    parser.add_argument("--summary", help="per-fingerprint summary file")
+    parser.add_argument("-F", "--output-format", choices=OUTPUT_FORMATS,
+                        help="jsonl or csv (default: from the file extension, else jsonl)")
+    parser.add_argument("--batch-size", type=int, default=2048, help="statements analyzed per window")
+    parser.add_argument("--max-fingerprints", type=int, default=100000,
+                        help=f'distinct fingerprints kept in the summary; later ones are counted under "{OTHER_FINGERPRINT}"')
+    args = parser.parse_args(argv)
+    if args.model.lower() not in MODEL_MAP:
+        parser.error(f"unsupported model type: {args.model}. Available options: {', '.join(MODEL_MAP)}")
+    args.workers = max(1, args.workers)
+    args.batch_size = max(1, args.batch_size)
+    return args
+
+
+def output_format_for(path: str, requested: Optional[str]) -> str:
+    if requested:
+        return requested
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def open_output(path: str) -> IO[str]:
+    if path == "-":
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    model_name = args.model.lower()
+    # Rule models run in a process pool with one worker per --workers; one worker needs no pool
+    registry = ModelRegistry(
+        MODEL_MAP,
+        rule_executor="process" if args.workers > 1 else "thread",
+        rule_pool=RuleProcessPool(max_workers=args.workers) if args.workers > 1 else None
+    )
+    output = open_output(args.output)
+    started = time.perf_counter()
+    try:
+        model = build_model(registry, model_name, args.workers)
+        writer = RecordWriter(output, output_format_for(args.output, args.output_format), RESULT_FIELDS)
+        summary = FingerprintSummary(args.max_fingerprints)
+        statements = iter_sources(args.paths, args.input_format, args.pattern or DEFAULT_PATTERNS)
+        count, errors = asyncio.run(audit(statements, model_name, model, writer, summary,
+                                          args.batch_size, in_flight=2))
+        output.flush()
+
+        if args.summary:
+            summary_file = open_output(args.summary)
+            try:
+                summary_writer = RecordWriter(summary_file, output_format_for(args.summary, args.output_format),
+                                              SUMMARY_FIELDS)
+                for row in summary.rows():
+                    summary_writer.write(row)
+            finally:
+                if summary_file is not sys.stdout:
+                    summary_file.close()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        registry.shutdown()
+
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"Analyzed {count} statements ({len(summary.entries)} fingerprints, {errors} errors) "
+          f"with model {model_name} in {elapsed:.2f}s ({rate:.0f} statements/s)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,5 +3,10 @@ from .simple_model import SimpleModel
 from .copilot_model import CopilotModel
 from .advanced_model import AdvancedModel
 from .ollama_model import OllamaModel
+from .tiered_model import TieredModel
+from .scheduler import BatchScheduler, ScheduledModel, SchedulerBusyError
+from .process_pool import RuleProcessPool, PooledModel
+from .registry import ModelRegistry
 
-__all__ = ['SQLAnalyzerModel', 'SimpleModel', 'CopilotModel', 'AdvancedModel', 'OllamaModel']
\ No newline at end of file
+__all__ = ['SQLAnalyzerModel', 'SimpleModel', 'CopilotModel', 'AdvancedModel', 'OllamaModel', 'TieredModel',
+           'BatchScheduler', 'ScheduledModel', 'SchedulerBusyError', 'RuleProcessPool', 'PooledModel', 'ModelRegistry']
\ No newline at end of file
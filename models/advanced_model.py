@@ -1,185 +1,370 @@
-from typing import Dict, Any, List
-import re
+import os
+from typing import Dict, Any, List, FrozenSet, Optional, Tuple
 from .base_model import SQLAnalyzerModel
+from .ast_rules import extract_features
+from .rule_engine import RuleBudget, scan
+from .schema_rules import SchemaFindings, check_schema
+from utils.catalog import Catalog, get_catalog
+from utils.findings import Finding, define_rule
+from utils.query_plan import PlanAnalyzer, PlanFinding, get_plan_analyzer
+
+# Dangerous operations reported as safety issues, in reporting order
+DANGEROUS_OPERATIONS = (
+    ("drop", "high"),
+    ("truncate", "high"),
+    ("delete", "medium"),
+    ("update", "medium"),
+    ("grant", "high"),
+    ("revoke", "high"),
+    ("alter", "medium"),
+)
+
+# Data modification risk points; only the first matching operation counts
+DATA_MODIFICATION_RISK = (
+    ("drop", 30),
+    ("truncate", 25),
+    ("delete", 20),
+    ("update", 15),
+    ("insert", 10),
+)
+
+INJECTION_ISSUE = define_rule(
+    "advanced.injection", "safety", "Potential SQL injection risk", "high",
+    "Use parameterized queries instead of string concatenation",
+    "The query contains quote characters which may indicate string concatenation. This could lead to SQL injection if user input is not properly sanitized."
+)
+
+DANGEROUS_OPERATION_ISSUES = {
+    operation: define_rule(
+        f"advanced.dangerous_{operation}", "safety", f"Dangerous operation: {operation.upper()}", severity,
+        f"Ensure {operation.upper()} operation is necessary and properly authorized",
+        f"The {operation.upper()} operation can potentially cause data loss or security issues if not properly controlled."
+    )
+    for operation, severity in DANGEROUS_OPERATIONS
+}
+
+SELECT_STAR_ISSUE = define_rule(
+    "advanced.select_star_exposure", "safety", "Use of SELECT *", "low",
+    "Specify only the columns you need instead of using SELECT *",
+    "Using SELECT * can expose sensitive data and may impact performance by retrieving unnecessary columns."
+)
+
+COMMENT_ISSUE = define_rule(
+    "advanced.comment", "safety", "SQL comments detected", "medium",
+    "Review comments for potential SQL injection vectors",
+    "SQL comments can sometimes be used to modify query behavior in SQL injection attacks."
+)
+
+SELECT_STAR_SUGGESTION = define_rule(
+    "advanced.select_star", "performance", "Avoid using SELECT *", "medium",
+    "Specify only the columns you need",
+    "Using SELECT * retrieves all columns, which can increase I/O, memory usage, and network traffic, especially for tables with many columns or large data types."
+)
+
+MISSING_WHERE_SUGGESTION = define_rule(
+    "advanced.missing_where", "performance", "Missing WHERE clause", "high",
+    "Add a WHERE clause to filter the results",
+    "Queries without a WHERE clause can result in full table scans and return large result sets, causing performance issues."
+)
+
+CARTESIAN_PRODUCT_SUGGESTION = define_rule(
+    "advanced.cartesian_product", "performance", "Potential Cartesian product", "high",
+    "Add proper JOIN conditions using ON or USING clauses",
+    "Joins without conditions can result in Cartesian products, which multiply the number of rows and cause severe performance issues."
+)
+
+ORDER_WITHOUT_LIMIT_SUGGESTION = define_rule(
+    "advanced.order_without_limit", "performance", "ORDER BY without LIMIT", "medium",
+    "Add a LIMIT clause when using ORDER BY",
+    "Sorting large result sets without limiting the number of rows can consume significant memory and processing resources."
+)
+
+WHERE_FUNCTION_SUGGESTION = define_rule(
+    "advanced.where_function", "performance", "Function applied to column in WHERE clause", "medium",
+    "Avoid using functions on columns in WHERE clauses",
+    "Applying functions to columns in WHERE clauses can prevent the use of indexes, resulting in full table scans."
+)
+
+# Schema and plan rules; {0}, {1}, ... are filled with the tables, columns and row notes found
+INDEXED_FUNCTION_SUGGESTION = define_rule(
+    "advanced.indexed_function", "performance", "Function applied to indexed column {0}.{1} in WHERE clause",
+    "medium", "Compare {1} directly, or create an index on the expression",
+    "Wrapping {0}.{1} in a function prevents the use of index {2}, resulting in a full table scan."
+)
+
+UNINDEXED_FILTER_SUGGESTION = define_rule(
+    "advanced.unindexed_filter", "performance", "No index on the filtered columns of {0}", "medium",
+    "Create an index on {0}({1}), or filter on an indexed column",
+    "None of the columns used to filter {0} ({2}) is the first column of an index, so the filter reads the whole table{3}."
+)
+
+UNINDEXED_JOIN_KEY_SUGGESTION = define_rule(
+    "advanced.unindexed_join_key", "performance", "Unindexed join key {0}.{1}", "high",
+    "Create an index on {0}({1})",
+    "{0} is joined on {1}, which is not the first column of any index, so every joined row searches the whole table{2} or forces a hash join over it."
+)
+
+PLAN_FULL_SCAN_SUGGESTION = define_rule(
+    "advanced.plan_full_scan", "performance", "Full table scan of {0} in the query plan", "medium",
+    "Add an index matching the filter on {0}, or filter on an indexed column",
+    "The database plans to read every row of {0}{1} instead of using an index."
+)
+
+PLAN_NESTED_LOOP_SUGGESTION = define_rule(
+    "advanced.plan_nested_loop", "performance", "Nested loop scans {0} for every row of {1}", "high",
+    "Index the join column of {0}",
+    "The plan joins {0} in a nested loop without an index, so the whole table is read once per row of {1}{2} and the cost grows with the product of both tables."
+)
+
+PLAN_TEMP_STRUCTURE_SUGGESTION = define_rule(
+    "advanced.plan_temp_structure", "performance", "Temporary structure for {0}{1} in the query plan", "low",
+    "Create an index whose column order matches the ORDER BY, GROUP BY or join columns",
+    "The database builds a temporary {0} structure{2} on every execution because no index provides the rows in the required order or lookup form."
+)
+
+
+def _row_note(row_count: Optional[int]) -> str:
+    return f" ({row_count} rows)" if row_count is not None else ""
+
+
+def indexed_function_suggestion(table: str, column: str, index: str) -> Finding:
+    return Finding(INDEXED_FUNCTION_SUGGESTION, (table, column, index))
+
+
+def unindexed_filter_suggestion(table: str, columns: Tuple[str, ...], row_count: Optional[int]) -> Finding:
+    return Finding(UNINDEXED_FILTER_SUGGESTION, (table, columns[0], ", ".join(columns), _row_note(row_count)))
+
+
+def unindexed_join_key_suggestion(table: str, column: str, row_count: Optional[int]) -> Finding:
+    return Finding(UNINDEXED_JOIN_KEY_SUGGESTION, (table, column, _row_note(row_count)))
+
+
+def plan_suggestion(finding: PlanFinding) -> Finding:
+    rows = _row_note(finding.rows)
+    if finding.kind == "full_scan":
+        return Finding(PLAN_FULL_SCAN_SUGGESTION, (finding.table, rows))
+    if finding.kind == "nested_loop":
+        return Finding(PLAN_NESTED_LOOP_SUGGESTION, (finding.table, finding.detail, rows))
+    target = f" on {finding.table}" if finding.table else ""
+    return Finding(PLAN_TEMP_STRUCTURE_SUGGESTION, (finding.detail, target, rows))
+
 
 class AdvancedModel(SQLAnalyzerModel):
-    """Advanced model implementation for SQL analysis using rule-based approach"""
-    
+    """Advanced model implementation for SQL analysis using rule-based approach
+
+    Each statement is parsed once into a cached syntax tree and its features
+    are collected by visitors over that tree (or, with use_ast disabled, by
+    the compiled lexical scan); the safety issues, performance suggestions and
+    risk score are all derived from the resulting feature set.
+
+    Each statement gets time_budget seconds (env RULE_TIME_BUDGET_MS, default
+    250 ms; 0 disables it). When rule evaluation runs out of time, the rules
+    are applied to the features found so far and the result is marked
+    "partial"; partial results are not cached.
+
+    With a schema catalog (by default the one configured by the SCHEMA_*
+    variables), syntax-tree analysis also checks predicates and join keys
+    against the real indexes: functions on unindexed columns are no longer
+    reported, and filters and joins that no index serves are.
+
+    With a plan analyzer (by default the one configured by the PLAN_*
+    variables), single SELECT statements are also EXPLAINed on the target
+    database, and full scans, temporary sort structures and nested-loop
+    scans in the plan are reported as performance suggestions.
+    """
+
+    version = "2"
+
+    # Pure CPU rule analysis, can be spread over worker processes
+    cpu_bound = True
+
+    def __init__(self, use_ast: Optional[bool] = None, time_budget: Optional[float] = None,
+                 catalog: Optional[Catalog] = None, planner: Optional[PlanAnalyzer] = None):
+        self.use_ast = use_ast if use_ast is not None else os.getenv('ADVANCED_MODEL_USE_AST', 'true').lower() == 'true'
+        self.time_budget = time_budget if time_budget is not None else float(os.getenv('RULE_TIME_BUDGET_MS', '250')) / 1000
+        self.catalog = catalog if catalog is not None else get_catalog()
+        self.planner = planner if planner is not None else get_plan_analyzer()
+        # The lexical scan is cheaper than a cache lookup; a full parse is not
+        self.cache_results = self.use_ast
+
+    def cache_version(self) -> str:
+        """Results differ between the syntax-tree and lexical rule paths, and with the schema"""
+        version = f"{super().cache_version()}:{'ast' if self.use_ast else 'scan'}"
+        if self.use_ast and len(self.catalog):
+            version += f":schema-{self.catalog.version}"
+        if self.planner.enabled:
+            version += ":plan"
+        return version
+
+    def features(self, sql_query: str, budget: Optional[RuleBudget] = None) -> FrozenSet[str]:
+        """Return the rule features of a SQL statement, within the model's time budget unless one is given"""
+        if budget is None:
+            budget = RuleBudget(self.time_budget)
+        return extract_features(sql_query, budget) if self.use_ast else scan(sql_query, budget)
+
+    def schema_findings(self, sql_query: str, budget: Optional[RuleBudget] = None) -> Optional[SchemaFindings]:
+        """Check a SQL statement against the catalog; None without syntax trees or schema"""
+        if not self.use_ast:
+            return None
+        # Before the emptiness check, so a catalog whose sources are filled in later picks them up
+        self.catalog.refresh_if_due()
+        if not len(self.catalog):
+            return None
+        return check_schema(sql_query, self.catalog, budget)
+
+    def plan_findings(self, sql_query: str) -> Optional[Tuple[PlanFinding, ...]]:
+        """Problems in the statement's query plan; None when there is no plan analyzer or no plan"""
+        if not self.planner.enabled:
+            return None
+        return self.planner.plan(sql_query)
+
     def analyze(self, sql_query: str) -> Dict[str, Any]:
         """Analyze SQL query and return analysis results"""
-        safety_issues = self.get_safety_issues(sql_query)
-        performance_suggestions = self.get_performance_suggestions(sql_query)
-        risk_score = self.calculate_risk_score(sql_query)
-        
-        return {
-            "safety_issues": safety_issues,
-            "performance_suggestions": performance_suggestions,
+        budget = RuleBudget(self.time_budget)
+        features = self.features(sql_query, budget)
+        schema = self.schema_findings(sql_query, budget)
+        # The plan is I/O on another database, not rule evaluation, and is not skipped by the budget
+        plan = self.plan_findings(sql_query)
+        risk_score = self._risk_score(features, schema)
+
+        result = {
+            "safety_issues": self._safety_issues(features),
+            "performance_suggestions": self._performance_suggestions(features, schema, plan),
             "risk_score": risk_score,
             "risk_level": self.get_risk_level(risk_score),
             "details": "Generated by rule-based analysis"
         }
-    
+        if budget.exhausted:
+            result["partial"] = True
+            result["details"] += f" (partial: rule time budget of {budget.seconds * 1000:g} ms exhausted)"
+        return result
+
     def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
         """Analyze SQL query for safety issues"""
+        return self._safety_issues(self.features(sql_query))
+
+    def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
+        """Analyze SQL query for performance suggestions"""
+        return self._performance_suggestions(self.features(sql_query), self.schema_findings(sql_query),
+                                             self.plan_findings(sql_query))
+
+    def calculate_risk_score(self, sql_query: str) -> int:
+        """Calculate risk score for SQL query"""
+        return self._risk_score(self.features(sql_query), self.schema_findings(sql_query))
+
+    def close(self) -> None:
+        """Close the plan analyzer's pooled database connections"""
+        self.planner.close()
+
+    @staticmethod
+    def _safety_issues(features: FrozenSet[str]) -> List[Finding]:
+        """Derive safety issues from a scanned feature set"""
         issues = []
-        
-        # Normalize SQL query for analysis
-        sql_normalized = sql_query.lower()
-        
+
         # Check for SQL injection risks
-        if "'" in sql_query or '"' in sql_query:
-            issues.append({
-                "issue": "Potential SQL injection risk",
-                "severity": "high",
-                "recommendation": "Use parameterized queries instead of string concatenation",
-                "explanation": "The query contains quote characters which may indicate string concatenation. This could lead to SQL injection if user input is not properly sanitized."
-            })
-        
+        if "quote" in features:
+            issues.append(Finding(INJECTION_ISSUE))
+
         # Check for dangerous operations
-        dangerous_operations = {
-            "drop": "high",
-            "truncate": "high",
-            "delete": "medium",
-            "update": "medium",
-            "grant": "high",
-            "revoke": "high",
-            "alter": "medium"
-        }
-        
-        for operation, severity in dangerous_operations.items():
-            pattern = r'\b' + operation + r'\b'
-            if re.search(pattern, sql_normalized):
-                issues.append({
-                    "issue": f"Dangerous operation: {operation.upper()}",
-                    "severity": severity,
-                    "recommendation": f"Ensure {operation.upper()} operation is necessary and properly authorized",
-                    "explanation": f"The {operation.upper()} operation can potentially cause data loss or security issues if not properly controlled."
-                })
-        
+        for operation, _ in DANGEROUS_OPERATIONS:
+            if operation in features:
+                issues.append(Finding(DANGEROUS_OPERATION_ISSUES[operation]))
+
         # Check for SELECT * usage
-        if re.search(r'select\s+\*', sql_normalized):
-            issues.append({
-                "issue": "Use of SELECT *",
-                "severity": "low",
-                "recommendation": "Specify only the columns you need instead of using SELECT *",
-                "explanation": "Using SELECT * can expose sensitive data and may impact performance by retrieving unnecessary columns."
-            })
-        
+        if "select_star" in features:
+            issues.append(Finding(SELECT_STAR_ISSUE))
+
         # Check for comments that might be used for SQL injection
-        if "--" in sql_query or "/*" in sql_query:
-            issues.append({
-                "issue": "SQL comments detected",
-                "severity": "medium",
-                "recommendation": "Review comments for potential SQL injection vectors",
-                "explanation": "SQL comments can sometimes be used to modify query behavior in SQL injection attacks."
-            })
-        
+        if "comment" in features:
+            issues.append(Finding(COMMENT_ISSUE))
+
         return issues
-    
-    def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
-        """Analyze SQL query for performance suggestions"""
+
+    @staticmethod
+    def _function_defeats_index(features: FrozenSet[str], schema: Optional[SchemaFindings]) -> bool:
+        """Whether a function in WHERE may defeat an index: always without schema, only on indexed columns with it"""
+        if "where" not in features or "function" not in features:
+            return False
+        return schema is None or not schema.functions_resolved or bool(schema.indexed_functions)
+
+    @staticmethod
+    def _performance_suggestions(features: FrozenSet[str], schema: Optional[SchemaFindings] = None,
+                                 plan: Optional[Tuple[PlanFinding, ...]] = None) -> List[Finding]:
+        """Derive performance suggestions from a scanned feature set, the schema findings and the query plan"""
         suggestions = []
-        
-        # Normalize SQL query for analysis
-        sql_normalized = sql_query.lower()
-        
+
         # Check for SELECT * usage
-        if re.search(r'select\s+\*', sql_normalized):
-            suggestions.append({
-                "suggestion": "Avoid using SELECT *",
-                "impact": "medium",
-                "recommendation": "Specify only the columns you need",
-                "explanation": "Using SELECT * retrieves all columns, which can increase I/O, memory usage, and network traffic, especially for tables with many columns or large data types."
-            })
-        
+        if "select_star" in features:
+            suggestions.append(Finding(SELECT_STAR_SUGGESTION))
+
         # Check for missing WHERE clause in SELECT queries
-        if re.search(r'select', sql_normalized) and not re.search(r'where', sql_normalized):
-            if not (re.search(r'count\(\*\)', sql_normalized) and not re.search(r'group\s+by', sql_normalized)):
-                suggestions.append({
-                    "suggestion": "Missing WHERE clause",
-                    "impact": "high",
-                    "recommendation": "Add a WHERE clause to filter the results",
-                    "explanation": "Queries without a WHERE clause can result in full table scans and return large result sets, causing performance issues."
-                })
-        
+        if "select" in features and "where" not in features:
+            if not ("count_star" in features and "group_by" not in features):
+                suggestions.append(Finding(MISSING_WHERE_SUGGESTION))
+
         # Check for potential Cartesian products (missing JOIN conditions)
-        if re.search(r'join', sql_normalized) and not re.search(r'on', sql_normalized) and not re.search(r'using', sql_normalized):
-            suggestions.append({
-                "suggestion": "Potential Cartesian product",
-                "impact": "high",
-                "recommendation": "Add proper JOIN conditions using ON or USING clauses",
-                "explanation": "Joins without conditions can result in Cartesian products, which multiply the number of rows and cause severe performance issues."
-            })
-        
+        if "join" in features and "join_condition" not in features:
+            suggestions.append(Finding(CARTESIAN_PRODUCT_SUGGESTION))
+
         # Check for ORDER BY with large result sets
-        if re.search(r'order\s+by', sql_normalized) and not re.search(r'limit', sql_normalized) and not re.search(r'top', sql_normalized):
-            suggestions.append({
-                "suggestion": "ORDER BY without LIMIT",
-                "impact": "medium",
-                "recommendation": "Add a LIMIT clause when using ORDER BY",
-                "explanation": "Sorting large result sets without limiting the number of rows can consume significant memory and processing resources."
-            })
-        
-        # Check for potential full table scans
-        if re.search(r'where', sql_normalized):
-            # Check for functions on indexed columns
-            function_patterns = [r'(\w+)\s*\(', r'lower\s*\(', r'upper\s*\(', r'concat\s*\(']
-            for pattern in function_patterns:
-                if re.search(pattern, sql_normalized):
-                    suggestions.append({
-                        "suggestion": "Function applied to column in WHERE clause",
-                        "impact": "medium",
-                        "recommendation": "Avoid using functions on columns in WHERE clauses",
-                        "explanation": "Applying functions to columns in WHERE clauses can prevent the use of indexes, resulting in full table scans."
-                    })
-                    break
-        
+        if "order_by" in features and "limit" not in features:
+            suggestions.append(Finding(ORDER_WITHOUT_LIMIT_SUGGESTION))
+
+        # Check for functions on indexed columns
+        if AdvancedModel._function_defeats_index(features, schema):
+            if schema is not None and schema.functions_resolved:
+                suggestions.extend(indexed_function_suggestion(*found) for found in schema.indexed_functions)
+            else:
+                suggestions.append(Finding(WHERE_FUNCTION_SUGGESTION))
+
+        # Check filters and joins against the indexes that exist
+        if schema is not None:
+            suggestions.extend(unindexed_filter_suggestion(*found) for found in schema.unindexed_filters)
+            suggestions.extend(unindexed_join_key_suggestion(*found) for found in schema.unindexed_join_keys)
+
+        # Check the database's own plan; scans already explained by a schema finding are not repeated
+        if plan:
+            explained = set()
+            if schema is not None:
+                explained.update(found[0] for found in schema.unindexed_filters)
+                explained.update(found[0] for found in schema.unindexed_join_keys)
+            suggestions.extend(plan_suggestion(finding) for finding in plan
+                               if not (finding.kind == "full_scan" and finding.table in explained))
+
         return suggestions
-    
-    def calculate_risk_score(self, sql_query: str) -> int:
-        """Calculate risk score for SQL query"""
+
+    @staticmethod
+    def _risk_score(features: FrozenSet[str], schema: Optional[SchemaFindings] = None) -> int:
+        """Derive the risk score from a scanned feature set"""
         score = 0
-        
-        # Normalize SQL query for analysis
-        sql_normalized = sql_query.lower()
-        
+
         # Data modification risk (0-30 points)
-        if re.search(r'\bdrop\b', sql_normalized):
-            score += 30
-        elif re.search(r'\btruncate\b', sql_normalized):
-            score += 25
-        elif re.search(r'\bdelete\b', sql_normalized):
-            score += 20
-        elif re.search(r'\bupdate\b', sql_normalized):
-            score += 15
-        elif re.search(r'\binsert\b', sql_normalized):
-            score += 10
-        
+        for operation, points in DATA_MODIFICATION_RISK:
+            if operation in features:
+                score += points
+                break
+
         # Permission risk (0-20 points)
-        if re.search(r'\bgrant\b', sql_normalized) or re.search(r'\brevoke\b', sql_normalized):
+        if "grant" in features or "revoke" in features:
             score += 20
-        
+
         # Injection risk (0-20 points)
-        if "'" in sql_query or '"' in sql_query:
+        if "quote" in features:
             score += 15
-        if "--" in sql_query or "/*" in sql_query:
+        if "comment" in features:
             score += 10
-        
+
         # Performance risk (0-15 points)
-        if re.search(r'select\s+\*', sql_normalized):
+        if "select_star" in features:
             score += 5
-        if re.search(r'join', sql_normalized) and not re.search(r'on', sql_normalized) and not re.search(r'using', sql_normalized):
+        if "join" in features and "join_condition" not in features:
             score += 15
-        if re.search(r'where', sql_normalized):
-            function_patterns = [r'(\w+)\s*\(', r'lower\s*\(', r'upper\s*\(', r'concat\s*\(']
-            for pattern in function_patterns:
-                if re.search(pattern, sql_normalized):
-                    score += 10
-                    break
-        
+        if AdvancedModel._function_defeats_index(features, schema):
+            score += 10
+
         # Data leakage risk (0-15 points)
-        if re.search(r'select', sql_normalized) and not re.search(r'where', sql_normalized):
+        if "select" in features and "where" not in features:
             score += 15
-        
+
         # Ensure score is between 0-100
-        return max(0, min(100, score))
\ No newline at end of file
+        return max(0, min(100, score))
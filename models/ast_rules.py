@@ -0,0 +1,148 @@
+"""
+Syntax-tree feature extraction for the rule-based SQL analyzers.
+
+Produces the same feature vocabulary as rule_engine.scan, but from the
+cached sqlglot tree of each statement instead of substring matches, so a
+column named "version" no longer counts as a JOIN ... ON condition and a
+quoted identifier is no longer mistaken for a string literal. Every node is
+visited once and dispatched on its node type to the visitor that handles it.
+
+Statements sqlglot cannot parse, or that are too long to parse within the
+rule time budget, fall back to the lexical scan.
+"""
+
+from typing import Callable, Dict, FrozenSet, Optional, Set
+from sqlglot import exp
+
+from utils.sql_parser import parse
+from .rule_engine import BUDGET_CHECK_INTERVAL, KEYWORDS, RuleBudget, scan
+
+# Statement node types and the keyword feature they stand for
+_STATEMENT_KEYWORDS = {
+    exp.Drop: "drop",
+    exp.Delete: "delete",
+    exp.Update: "update",
+    exp.Insert: "insert",
+    exp.AlterTable: "alter",
+}
+
+_KEYWORD_SET = frozenset(KEYWORDS)
+
+
+class _FeatureVisitor:
+    """Collects rule features while walking one or more syntax trees"""
+
+    def __init__(self):
+        self.features: Set[str] = set()
+        self.unconditioned_join = False
+
+    def visit(self, node: exp.Expression) -> None:
+        visitor = _VISITORS.get(type(node))
+        if visitor is not None:
+            visitor(self, node)
+        elif isinstance(node, exp.Func):
+            self.visit_function(node)
+
+    def visit_statement(self, node: exp.Expression) -> None:
+        self.features.add(_STATEMENT_KEYWORDS[type(node)])
+
+    def visit_command(self, node: exp.Command) -> None:
+        # Statements sqlglot does not model (TRUNCATE, GRANT, ...) keep only their name
+        name = str(node.this).lower()
+        if name in _KEYWORD_SET:
+            self.features.add(name)
+
+    def visit_select(self, node: exp.Select) -> None:
+        # A SELECT without FROM (SELECT 1, SELECT now()) scans nothing
+        if node.args.get("from") is not None:
+            self.features.add("select")
+        for projection in node.expressions:
+            if isinstance(projection, exp.Star) or (
+                    isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star)):
+                self.features.add("select_star")
+                break
+
+    def visit_where(self, node: exp.Where) -> None:
+        self.features.add("where")
+
+    def visit_join(self, node: exp.Join) -> None:
+        self.features.add("join")
+        if node.args.get("on") is not None or node.args.get("using") or \
+                str(node.args.get("method") or "").lower() == "natural":
+            return
+        # Comma joins and ON-less joins may carry their condition in WHERE
+        select = node.parent
+        if not (isinstance(select, exp.Select) and select.args.get("where") is not None):
+            self.unconditioned_join = True
+
+    def visit_count(self, node: exp.Count) -> None:
+        if isinstance(node.this, exp.Star):
+            self.features.add("count_star")
+
+    def visit_group(self, node: exp.Group) -> None:
+        self.features.add("group_by")
+
+    def visit_order(self, node: exp.Order) -> None:
+        # ORDER BY inside OVER (...) orders a window, not the result set
+        if not isinstance(node.parent, exp.Window):
+            self.features.add("order_by")
+
+    def visit_limit(self, node: exp.Expression) -> None:
+        self.features.add("limit")
+
+    def visit_literal(self, node: exp.Literal) -> None:
+        # The unparsed text of a Command is stored as a string literal too
+        if node.is_string and not isinstance(node.parent, exp.Command):
+            self.features.add("quote")
+
+    def visit_function(self, node: exp.Func) -> None:
+        # Only a function wrapped around a column, directly in a WHERE clause
+        # (not in a subquery's select list), defeats an index
+        if "function" in self.features or node.find(exp.Column) is None:
+            return
+        if isinstance(node.find_ancestor(exp.Where, exp.Select), exp.Where):
+            self.features.add("function")
+
+    def finish(self, sql_query: str) -> FrozenSet[str]:
+        if "join" in self.features and not self.unconditioned_join:
+            self.features.add("join_condition")
+        # Comments are not part of the tree, so they are still found lexically
+        if "--" in sql_query or "/*" in sql_query:
+            self.features.add("comment")
+        return frozenset(self.features)
+
+
+_VISITORS: Dict[type, Callable[[_FeatureVisitor, exp.Expression], None]] = {
+    **{node_type: _FeatureVisitor.visit_statement for node_type in _STATEMENT_KEYWORDS},
+    exp.Command: _FeatureVisitor.visit_command,
+    exp.Select: _FeatureVisitor.visit_select,
+    exp.Where: _FeatureVisitor.visit_where,
+    exp.Join: _FeatureVisitor.visit_join,
+    exp.Count: _FeatureVisitor.visit_count,
+    exp.Group: _FeatureVisitor.visit_group,
+    exp.Order: _FeatureVisitor.visit_order,
+    exp.Limit: _FeatureVisitor.visit_limit,
+    exp.Fetch: _FeatureVisitor.visit_limit,
+    exp.Literal: _FeatureVisitor.visit_literal,
+}
+
+
+def extract_features(sql_query: str, budget: Optional[RuleBudget] = None) -> FrozenSet[str]:
+    """Return the rule features of a SQL string, from its cached syntax trees
+
+    Falls back to rule_engine.scan when the text does not parse. When the
+    budget runs out the walk stops and the features found so far are returned.
+    """
+    statements = parse(sql_query)
+    if not statements:
+        return scan(sql_query, budget)
+
+    visitor = _FeatureVisitor()
+    visited = 0
+    for statement in statements:
+        for node, _, _ in statement.walk():
+            visited += 1
+            if budget is not None and visited % BUDGET_CHECK_INTERVAL == 0 and budget.expired():
+                return visitor.finish(sql_query)
+            visitor.visit(node)
+    return visitor.finish(sql_query)
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator
+import asyncio
 
 
 class SQLAnalyzerModel(ABC):
@@ -8,6 +9,30 @@ class SQLAnalyzerModel(ABC):
     All SQL analyzer models should inherit from this class and implement the analyze method.
     """
     
+    # Bump when a model's rules or output change, to invalidate cached results
+    version = "1"
+    
+    # Whether results are worth caching; cheap rule models recompute faster than a cache lookup
+    cache_results = True
+    
+    # Whether statements with the same fingerprint (differing only in literals) may share a cached result
+    cache_by_fingerprint = False
+    
+    # Whether concurrent requests should be coalesced into batched calls (remote LLM backends)
+    micro_batch = False
+    
+    # Whether analysis is pure CPU work that can be spread over worker processes (rule models)
+    cpu_bound = False
+    
+    def cache_version(self) -> str:
+        """
+        Identify everything besides the SQL text that determines this model's output.
+        
+        Used as part of the result cache key. LLM models extend it with the
+        backend model name and a hash of their prompt.
+        """
+        return f"{type(self).__name__}:{self.version}"
+    
     @abstractmethod
     def analyze(self, sql_query: str) -> Dict[str, Any]:
         """
@@ -23,9 +48,81 @@ class SQLAnalyzerModel(ABC):
             - risk_score: A score indicating the risk level of the query (0-100)
             - risk_level: A string indicating the risk level (low, medium, high)
             - details: Additional details about the analysis
+            
+            Each issue or suggestion is a mapping with the keys described in
+            get_safety_issues and get_performance_suggestions. LLM models
+            return plain dicts; the rule models return utils.findings.Finding
+            objects, mutable mappings that reference a shared rule catalog, so
+            callers must not assume a dict (use dict(finding) to copy one).
         """
         pass
     
+    def analyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze a list of SQL queries and return the results in the same order.
+        
+        The default implementation runs the whole batch in a single in-process
+        pass. Models backed by a remote LLM override this to pack several
+        statements into one prompt.
+        
+        Args:
+            sql_queries: The SQL queries to analyze
+            
+        Returns:
+            A list of analysis results (see analyze, including its note on
+            Finding objects), one per query, in input order
+        """
+        analyze = self.analyze
+        return [analyze(sql_query) for sql_query in sql_queries]
+    
+    async def aanalyze(self, sql_query: str) -> Dict[str, Any]:
+        """
+        Analyze a SQL query without blocking the event loop.
+        
+        The default implementation runs analyze in the event loop's worker
+        thread pool, which suits CPU-bound rule models. Models that talk to a
+        remote service override this with non-blocking HTTP calls.
+        
+        Args:
+            sql_query: The SQL query to analyze
+            
+        Returns:
+            The analysis result (see analyze; rule models return Finding
+            mappings rather than dicts for its issues and suggestions)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.analyze, sql_query)
+    
+    async def aanalyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze a list of SQL queries without blocking the event loop.
+        
+        Args:
+            sql_queries: The SQL queries to analyze
+            
+        Returns:
+            A list of analysis results, one per query, in input order
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.analyze_batch, sql_queries)
+    
+    async def astream_analyze(self, sql_query: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze a SQL query, yielding progress events as they become available.
+        
+        Each event is a dictionary with an "event" name and its "data":
+        - token: a piece of generated text, as it arrives (LLM models)
+        - safety_issue / performance_suggestion: one issue, as soon as it is complete
+        - result: the full analysis result (see analyze); always the last event
+        
+        Issues streamed early are provisional; the result event is authoritative.
+        The default implementation yields only the result.
+        
+        Args:
+            sql_query: The SQL query to analyze
+        """
+        yield {"event": "result", "data": await self.aanalyze(sql_query)}
+    
     @abstractmethod
     def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
         """
@@ -35,7 +132,7 @@ class SQLAnalyzerModel(ABC):
             sql_query: The SQL query to analyze
             
         Returns:
-            A list of dictionaries containing safety issues with the following keys:
+            A list of mappings (dicts, or Finding objects for the rule models) with the following keys:
             - issue: The safety issue description
             - severity: The severity of the issue (low, medium, high)
             - recommendation: A recommendation to fix the issue
@@ -51,7 +148,7 @@ class SQLAnalyzerModel(ABC):
             sql_query: The SQL query to analyze
             
         Returns:
-            A list of dictionaries containing performance suggestions with the following keys:
+            A list of mappings (dicts, or Finding objects for the rule models) with the following keys:
             - suggestion: The performance suggestion description
             - impact: The impact of the suggestion (low, medium, high)
             - recommendation: A recommendation to implement the suggestion
@@ -71,6 +168,16 @@ class SQLAnalyzerModel(ABC):
         """
         pass
     
+    def close(self) -> None:
+        """
+        Release resources held by the model (connections, cached tokens, pools).
+        
+        Model instances are shared across requests for the lifetime of the
+        application and closed once at shutdown. The default implementation
+        holds nothing and does nothing.
+        """
+        pass
+    
     @staticmethod
     def get_risk_level(risk_score: int) -> str:
         """
@@ -1,89 +1,257 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import asyncio
 import requests
 from .base_model import SQLAnalyzerModel
+from utils.http_client import HTTPPoolConfig, get_session, get_async_client, async_send
+from .llm_batch import (
+    chunk_queries,
+    gather_chunks,
+    get_batch_analysis_prompt,
+    parse_batch_analysis_response,
+    normalize_risk_score,
+)
+from .prompts import render_sql_prompt, templates_digest
+from utils.metrics import BACKEND_ERRORS, TOKEN_REFRESHES, stage_timer
 import os
 import json
 import time
+import threading
+
+# Stage timers and counters, looked up once for the hot path
+_PROMPT_SECONDS = stage_timer("copilot", "prompt")
+_TOKEN_SECONDS = stage_timer("copilot", "token_refresh")
+_HTTP_SECONDS = stage_timer("copilot", "http")
+_PARSE_SECONDS = stage_timer("copilot", "parse")
+_TOKEN_ERRORS = BACKEND_ERRORS.labels("copilot", "token")
+_COMPLETION_ERRORS = BACKEND_ERRORS.labels("copilot", "completion")
+_TOKEN_REFRESHES = TOKEN_REFRESHES.labels("copilot")
 
 class CopilotModel(SQLAnalyzerModel):
     """GitHub Copilot implementation for SQL analysis"""
     
-    def __init__(self):
+    # Templates whose output ends up in cached results: single and batched analyses
+    prompt_templates = ("analysis", "batch_analysis")
+    
+    # The analysis depends on the query's shape, not on its constants
+    cache_by_fingerprint = True
+    
+    # Concurrent requests are coalesced into batched prompts by the registry's scheduler
+    micro_batch = True
+    
+    def __init__(self, session: Optional[requests.Session] = None,
+                 http_config: Optional[HTTPPoolConfig] = None):
         # Basic API configuration
         self.api_url = os.getenv('COPILOT_API_URL', 'http://localhost:8080')
         self.auth_url = os.getenv('COPILOT_AUTH_URL', 'https://api.github.com/copilot_internal/v2/token')
         self.language = 'sql'
+        self.batch_size = int(os.getenv('COPILOT_BATCH_SIZE', '10'))  # Statements packed into one prompt
+        self.max_prompt_tokens = int(os.getenv('COPILOT_MAX_PROMPT_TOKENS', '6000'))  # Longer statements are summarized
+        
+        # Pooled keep-alive session shared with other models unless one is supplied
+        self.session = session or get_session()
+        self.http_config = http_config or HTTPPoolConfig()
+        self.timeout = self.http_config.timeout
         
         # Authentication configuration
         self.github_token = os.getenv('GITHUB_TOKEN', '')
         self.copilot_token = None
         self.token_expiry = 0  # Unix timestamp for token expiration
+        self._token_lock = threading.Lock()  # Instances are shared across concurrent requests
+        self._async_token_lock: Optional[asyncio.Lock] = None
+        self._async_token_lock_loop = None
         
     def _get_copilot_token(self) -> str:
         """Get access token for GitHub Copilot API
         
         Returns the existing token if valid; otherwise requests a new one
         """
-        current_time = time.time()
-        
         # Check if we have a valid token
-        if self.copilot_token and self.token_expiry > current_time + 60:  # Refresh token 60 seconds before expiry
+        if self._token_is_valid():
             return self.copilot_token
-            
+        
+        # Only one request refreshes the token; the others wait and reuse it
+        with self._token_lock:
+            if self._token_is_valid():
+                return self.copilot_token
+            return self._refresh_copilot_token()
+    
+    def _token_is_valid(self) -> bool:
+        """Return True if the cached token is set and not about to expire"""
+        return bool(self.copilot_token) and self.token_expiry > time.time() + 60  # Refresh token 60 seconds before expiry
+    
+    def _refresh_copilot_token(self) -> str:
+        """Request a new Copilot token; callers must hold _token_lock"""
+        current_time = time.time()
+        
         # Cannot get Copilot token without GitHub token
         if not self.github_token:
             raise Exception("GITHUB_TOKEN environment variable not set, cannot obtain Copilot access token")
             
         try:
-            headers = {
-                'Authorization': f'token {self.github_token}',
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
-            
-            response = requests.get(self.auth_url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            self.copilot_token = data.get('token')
-            
-            # Set token expiration time, default is 10 minutes
-            expires_in = data.get('expires_in', 600)
-            self.token_expiry = current_time + expires_in
-            
-            return self.copilot_token
+            with _TOKEN_SECONDS.time():
+                response = self.session.get(self.auth_url, headers=self._auth_headers(), timeout=self.timeout)
+                response.raise_for_status()
+                return self._store_copilot_token(response.json(), current_time)
         except Exception as e:
+            _TOKEN_ERRORS.inc()
             raise Exception(f"Failed to obtain Copilot access token: {str(e)}")
     
+    async def _aget_copilot_token(self) -> str:
+        """Non-blocking variant of _get_copilot_token"""
+        if self._token_is_valid():
+            return self.copilot_token
+        
+        # asyncio locks belong to one event loop; recreate the lock if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._async_token_lock is None or self._async_token_lock_loop is not loop:
+            self._async_token_lock = asyncio.Lock()
+            self._async_token_lock_loop = loop
+        
+        async with self._async_token_lock:
+            if self._token_is_valid():
+                return self.copilot_token
+            
+            current_time = time.time()
+            if not self.github_token:
+                raise Exception("GITHUB_TOKEN environment variable not set, cannot obtain Copilot access token")
+            try:
+                with _TOKEN_SECONDS.time():
+                    client = get_async_client()
+                    request = client.build_request("GET", self.auth_url, headers=self._auth_headers())
+                    response = await async_send(client, request, self.http_config)
+                    try:
+                        await response.aread()
+                        response.raise_for_status()
+                        return self._store_copilot_token(response.json(), current_time)
+                    finally:
+                        await response.aclose()
+            except Exception as e:
+                _TOKEN_ERRORS.inc()
+                raise Exception(f"Failed to obtain Copilot access token: {str(e)}")
+    
+    def _auth_headers(self) -> Dict[str, str]:
+        """Headers for exchanging the GitHub token for a Copilot token"""
+        return {
+            'Authorization': f'token {self.github_token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+    
+    def _store_copilot_token(self, data: Dict[str, Any], requested_at: float) -> str:
+        """Cache the token from a token endpoint response"""
+        _TOKEN_REFRESHES.inc()
+        self.copilot_token = data.get('token')
+        
+        # Set token expiration time, default is 10 minutes
+        expires_in = data.get('expires_in', 600)
+        self.token_expiry = requested_at + expires_in
+        
+        return self.copilot_token
+    
+    def _request_headers(self, token: str) -> Dict[str, str]:
+        """Headers for an authenticated Copilot API request"""
+        return {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+    
+    def _request_payload(self, prompt: str) -> Dict[str, Any]:
+        """Request body for a Copilot completion"""
+        return {
+            'prompt': prompt,
+            'language': self.language,
+            'max_tokens': 1500,  # Increased max tokens to accommodate larger responses
+            'temperature': 0.1,  # Use lower temperature for more deterministic results
+            'top_p': 0.95        # Use higher top_p value to maintain some creativity
+        }
+    
     def _query_copilot(self, prompt: str) -> str:
         """Send request to Copilot API"""
+        # Set once the token is in hand; failures before that are counted as token errors
+        token = None
         try:
             # Get access token
             token = self._get_copilot_token()
             
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
+            with _HTTP_SECONDS.time():
+                response = self.session.post(
+                    self.api_url,
+                    headers=self._request_headers(token),
+                    json=self._request_payload(prompt),
+                    timeout=self.timeout  # Read timeout defaults to 120s for slow responses
+                )
+                response.raise_for_status()
+                return response.text
+        except Exception as e:
+            if token is not None:
+                _COMPLETION_ERRORS.inc()
+            raise Exception(f"Copilot API call failed: {str(e)}")
+    
+    async def _aquery_copilot(self, prompt: str) -> str:
+        """Send request to Copilot API without blocking the event loop"""
+        # Set once the token is in hand; failures before that are counted as token errors
+        token = None
+        try:
+            token = await self._aget_copilot_token()
             
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json={
-                    'prompt': prompt,
-                    'language': self.language,
-                    'max_tokens': 1500,  # Increased max tokens to accommodate larger responses
-                    'temperature': 0.1,  # Use lower temperature for more deterministic results
-                    'top_p': 0.95        # Use higher top_p value to maintain some creativity
-                },
-                timeout=120  # Increased timeout for slow responses
-            )
-            response.raise_for_status()
-            return response.text
+            with _HTTP_SECONDS.time():
+                client = get_async_client()
+                request = client.build_request(
+                    "POST",
+                    self.api_url,
+                    headers=self._request_headers(token),
+                    json=self._request_payload(prompt)
+                )
+                response = await async_send(client, request, self.http_config)
+                try:
+                    await response.aread()
+                    response.raise_for_status()
+                    return response.text
+                finally:
+                    await response.aclose()
         except Exception as e:
+            if token is not None:
+                _COMPLETION_ERRORS.inc()
             raise Exception(f"Copilot API call failed: {str(e)}")
     
+    def _result_from_response(self, response: str) -> Dict[str, Any]:
+        """Build an analysis result from Copilot's JSON response; raises if it is not valid JSON"""
+        # Parse the JSON response
+        with _PARSE_SECONDS.time():
+            analysis_results = json.loads(response)
+        
+        # Ensure risk_score is an integer between 0 and 100
+        risk_score = normalize_risk_score(analysis_results.get('risk_score', 50))
+        
+        # Return the complete analysis results
+        return {
+            "safety_issues": analysis_results.get('safety_issues', []),
+            "performance_suggestions": analysis_results.get('performance_suggestions', []),
+            "risk_score": risk_score,
+            "risk_level": self.get_risk_level(risk_score),
+            "details": "Generated by GitHub Copilot model analysis",
+            "api_calls": 1  # Indicate that only one API call was made
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Build the result returned when the Copilot analysis fails"""
+        # Return an error message instead of falling back to individual analyses
+        return {
+            "safety_issues": [{
+                "issue": "Error in Copilot API analysis",
+                "severity": "high",
+                "recommendation": "Check Copilot API configuration and try again",
+                "explanation": f"Error details: {str(error)}"
+            }],
+            "performance_suggestions": [],
+            "risk_score": 50,  # Default medium risk
+            "risk_level": self.get_risk_level(50),
+            "details": f"Error occurred during GitHub Copilot analysis: {str(error)}",
+            "api_calls": 1,  # Still only one API call was attempted
+            "error": True
+        }
+    
     def analyze(self, sql_query: str) -> Dict[str, Any]:
         """Analyze SQL query and return analysis results
         
@@ -94,98 +262,94 @@ class CopilotModel(SQLAnalyzerModel):
         
         try:
             # Make a single API call to Copilot
-            response = self._query_copilot(combined_prompt)
-            
-            # Parse the JSON response
-            analysis_results = json.loads(response)
-            
-            # Extract analysis components
-            safety_issues = analysis_results.get('safety_issues', [])
-            performance_suggestions = analysis_results.get('performance_suggestions', [])
-            risk_score = analysis_results.get('risk_score', 50)
+            return self._result_from_response(self._query_copilot(combined_prompt))
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def aanalyze(self, sql_query: str) -> Dict[str, Any]:
+        """Analyze SQL query over a non-blocking HTTP client (one API call)"""
+        combined_prompt = self._get_combined_analysis_prompt(sql_query)
+        
+        try:
+            return self._result_from_response(await self._aquery_copilot(combined_prompt))
+        except Exception as e:
+            return self._error_result(e)
+    
+    def _results_from_batch(self, chunk: List[str], response: Optional[str]) -> List[Optional[Dict[str, Any]]]:
+        """Map a batched response onto per-query results; None marks queries that need a retry"""
+        if response is None:
+            return [None] * len(chunk)
+        with _PARSE_SECONDS.time():
+            entries = parse_batch_analysis_response(response, len(chunk))
+        results: List[Optional[Dict[str, Any]]] = []
+        for entry in entries:
+            if entry is None:
+                results.append(None)
+                continue
+            risk_score = normalize_risk_score(entry.get('risk_score', 50))
+            results.append({
+                "safety_issues": entry.get('safety_issues', []),
+                "performance_suggestions": entry.get('performance_suggestions', []),
+                "risk_score": risk_score,
+                "risk_level": self.get_risk_level(risk_score),
+                "details": "Generated by GitHub Copilot model analysis (batched)"
+            })
+        return results
+    
+    def analyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze several SQL queries, packing up to batch_size statements into each API call
+        
+        Statements missing from the batched response are re-analyzed individually,
+        so the result list always matches the input order and length.
+        """
+        results: List[Dict[str, Any]] = []
+        for chunk in chunk_queries(sql_queries, self.batch_size):
+            if len(chunk) == 1:
+                results.append(self.analyze(chunk[0]))
+                continue
             
-            # Ensure risk_score is an integer between 0 and 100
             try:
-                risk_score = int(risk_score)
-                risk_score = max(0, min(100, risk_score))
-            except:
-                risk_score = 50  # Default medium risk
+                response = self._query_copilot(self._get_batch_analysis_prompt(chunk))
+            except Exception:
+                response = None
             
-            # Return the complete analysis results
-            return {
-                "safety_issues": safety_issues,
-                "performance_suggestions": performance_suggestions,
-                "risk_score": risk_score,
-                "risk_level": self.get_risk_level(risk_score),
-                "details": "Generated by GitHub Copilot model analysis",
-                "api_calls": 1  # Indicate that only one API call was made
-            }
-        except Exception as e:
-            # If there's an error, return an error message instead of falling back to individual analyses
-            return {
-                "safety_issues": [{
-                    "issue": "Error in Copilot API analysis",
-                    "severity": "high",
-                    "recommendation": "Check Copilot API configuration and try again",
-                    "explanation": f"Error details: {str(e)}"
-                }],
-                "performance_suggestions": [],
-                "risk_score": 50,  # Default medium risk
-                "risk_level": self.get_risk_level(50),
-                "details": f"Error occurred during GitHub Copilot analysis: {str(e)}",
-                "api_calls": 1,  # Still only one API call was attempted
-                "error": True
-            }
+            for sql_query, result in zip(chunk, self._results_from_batch(chunk, response)):
+                results.append(result if result is not None else self.analyze(sql_query))
+        return results
+    
+    async def aanalyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze several SQL queries concurrently, one batched API call per chunk, within the connection pool size"""
+        async def analyze_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+            if len(chunk) == 1:
+                return [await self.aanalyze(chunk[0])]
+            try:
+                response = await self._aquery_copilot(self._get_batch_analysis_prompt(chunk))
+            except Exception:
+                response = None
+            results = self._results_from_batch(chunk, response)
+            for index, result in enumerate(results):
+                if result is None:
+                    results[index] = await self.aanalyze(chunk[index])
+            return results
+        
+        # No more chunks in flight than the connection pool has connections
+        return await gather_chunks(analyze_chunk, chunk_queries(sql_queries, self.batch_size),
+                                   self.http_config.pool_maxsize)
+    
+    def cache_version(self) -> str:
+        """Include the backend model and the prompts in the cache key, so changing any of them invalidates results"""
+        prompt_hash = templates_digest(self.prompt_templates)
+        return f"{super().cache_version()}:{self.api_url}:{prompt_hash}:{self.max_prompt_tokens}"
     
     def _get_combined_analysis_prompt(self, sql_query: str) -> str:
         """Generate a combined prompt for all analyses to reduce API calls"""
-        return f"""# SQL Analysis Task
-
-As an expert SQL analyzer, please analyze the following SQL query comprehensively for safety issues, performance optimization opportunities, and overall risk assessment.
-
-## SQL Query to Analyze:
-```sql
-{sql_query}
-```
-
-## Analysis Requirements:
-
-1. Identify safety issues including SQL injection risks, permission problems, data leakage risks, comment risks, and other security concerns.
-2. Provide performance optimization suggestions considering query structure, index usage, joins, data retrieval, filtering conditions, sorting/grouping, and data volume.
-3. Calculate an overall risk score (0-100) based on data modification risk, permission risk, injection risk, performance risk, data leakage risk, and transaction risk.
-
-## Response Format:
-Please provide your analysis in the following JSON format:
-
-```json
-{{
-  "safety_issues": [
-    {{
-      "issue": "Issue description",
-      "severity": "high/medium/low",
-      "recommendation": "Fix recommendation",
-      "explanation": "Detailed explanation of the problem and potential consequences"
-    }}
-  ],
-  "performance_suggestions": [
-    {{
-      "suggestion": "Optimization suggestion title",
-      "impact": "high/medium/low",
-      "recommendation": "Specific optimization method",
-      "explanation": "Detailed explanation of why this optimization is needed and expected performance improvement"
-    }}
-  ],
-  "risk_score": 50
-}}
-```
-
-If no issues are found in any category, return an empty array for that category. The risk score should be an integer between 0-100, where:
-- 0-29: Low risk (query is safe and efficient)
-- 30-69: Medium risk (query may have some safety or performance issues)
-- 70-100: High risk (query has serious safety or performance issues)
-
-Ensure your response is valid JSON format with no additional text or explanation outside the JSON structure.
-"""
+        with _PROMPT_SECONDS.time():
+            return render_sql_prompt("analysis", sql_query, self.max_prompt_tokens)
+    
+    def _get_batch_analysis_prompt(self, chunk: List[str]) -> str:
+        """Generate one prompt analyzing every statement of the chunk"""
+        with _PROMPT_SECONDS.time():
+            return get_batch_analysis_prompt(chunk, self.max_prompt_tokens)
     
     def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
         """
@@ -0,0 +1,83 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+import asyncio
+from .llm_response import load_json, validate_analysis
+from .prompts import get_template, fit_sql
+
+
+def chunk_queries(sql_queries: List[str], batch_size: int) -> List[List[str]]:
+    """Split a list of queries into consecutive chunks of at most batch_size items"""
+    batch_size = max(1, batch_size)
+    return [sql_queries[i:i + batch_size] for i in range(0, len(sql_queries), batch_size)]
+
+
+async def gather_chunks(analyze_chunk: Callable[[List[str]], Awaitable[List[Dict[str, Any]]]],
+                        chunks: List[List[str]], max_concurrency: int) -> List[Dict[str, Any]]:
+    """Analyze chunks concurrently, at most max_concurrency at a time, and concatenate the results in order"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def limited(chunk: List[str]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await analyze_chunk(chunk)
+
+    chunk_results = await asyncio.gather(*(limited(chunk) for chunk in chunks))
+    return [result for results in chunk_results for result in results]
+
+
+def get_batch_analysis_prompt(sql_queries: List[str], max_tokens: Optional[int] = None) -> str:
+    """Generate a single prompt that asks for an analysis of every query in the batch
+
+    With max_tokens, the room the template leaves is shared evenly between
+    the queries and each one is shrunk to its share (see fit_sql).
+    """
+    template = get_template("batch_analysis")
+    budget = template.budget_for(max_tokens)
+    if budget is not None:
+        # Each query also carries its "### Query N:" heading and code fence
+        budget = budget // max(1, len(sql_queries)) - 12
+    statements = []
+    for index, sql_query in enumerate(sql_queries):
+        sql, note = fit_sql(sql_query, budget)
+        statements.append(f"### Query {index}:\n{note}```sql\n{sql}\n```")
+    return template.render(count=len(sql_queries), statements="\n\n".join(statements))
+
+
+def parse_batch_analysis_response(response: str, count: int) -> List[Optional[Dict[str, Any]]]:
+    """Parse a batch response into a list of per-query analysis dicts
+
+    The returned list always has `count` entries; entries the model did not
+    answer (or answered with an invalid structure) are None so that callers
+    can re-analyze just those queries. The response is extracted and repaired
+    like a single analysis, and each entry is validated against the schema.
+    """
+    entries: List[Optional[Dict[str, Any]]] = [None] * count
+    try:
+        data = load_json(response)
+    except (TypeError, ValueError):
+        return entries
+
+    results = data.get('results') if isinstance(data, dict) else data
+    if not isinstance(results, list):
+        return entries
+
+    for position, entry in enumerate(results):
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get('index', position)
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and entries[index] is None:
+            try:
+                entries[index] = validate_analysis(entry)
+            except ValueError:
+                continue
+    return entries
+
+
+def normalize_risk_score(risk_score: Any) -> int:
+    """Coerce a model-provided risk score to an integer between 0 and 100"""
+    try:
+        return max(0, min(100, int(float(risk_score))))
+    except (TypeError, ValueError):
+        return 50  # Default medium risk
@@ -0,0 +1,185 @@
+from typing import Dict, Any, List, Optional
+import json
+import re
+from .prompts import get_template
+
+# Severity / impact levels accepted by the API, and common synonyms models produce
+LEVELS = ("high", "medium", "low")
+LEVEL_SYNONYMS = {"critical": "high", "severe": "high", "moderate": "medium", "minor": "low", "info": "low"}
+
+_FENCED_BLOCK = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|\Z)", re.DOTALL)
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Unicode-aware like str.isalpha, which decides when a bare word starts
+_BARE_WORD = re.compile(r"\w+")
+
+# Longest previous response quoted back to the model in a repair prompt
+MAX_REPAIR_ECHO = 8000
+
+
+def extract_json(text: str) -> str:
+    """Return the JSON document embedded in a model response
+
+    Takes the contents of the first fenced code block if there is one, then
+    trims any prose before the first "{" / "[" and after the last "}" / "]".
+    """
+    fenced = _FENCED_BLOCK.search(text)
+    if fenced and ("{" in fenced.group(1) or "[" in fenced.group(1)):
+        text = fenced.group(1)
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        return text.strip()
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    # A truncated document has no closing bracket after its start; repair closes it
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def repair_json(text: str) -> str:
+    """Fix the malformations models commonly produce, in one pass over the text
+
+    Outside strings: drops trailing commas and // comments, and turns Python's
+    True/False/None into JSON literals. Strings, arrays and objects left open
+    by a truncated generation are closed.
+    """
+    output: List[str] = []
+    closers: List[str] = []
+    in_string = False
+    escaped = False
+    index = 0
+    length = len(text)
+    while index < length:
+        char = text[index]
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            index += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(output)
+            if closers:
+                closers.pop()
+        elif char == "/" and text.startswith("//", index):
+            newline = text.find("\n", index)
+            index = length if newline < 0 else newline
+            continue
+        elif char.isalpha():
+            word = _BARE_WORD.match(text, index).group()
+            output.append(_PYTHON_LITERALS.get(word, word))
+            index += len(word)
+            continue
+        output.append(char)
+        index += 1
+
+    if in_string:
+        output.append('"')
+    for closer in reversed(closers):
+        _drop_trailing_comma(output)
+        output.append(closer)
+    return "".join(output)
+
+
+def _drop_trailing_comma(output: List[str]) -> None:
+    """Remove a "," (and the whitespace after it) at the end of the output"""
+    position = len(output) - 1
+    while position >= 0 and output[position].isspace():
+        position -= 1
+    if position >= 0 and output[position] == ",":
+        del output[position:]
+
+
+def load_json(text: str) -> Any:
+    """Parse the JSON in a model response, repairing it if needed; raises ValueError and nothing else
+
+    Whatever the model produced, callers only need to handle ValueError to
+    fall back to a repair request or to re-analyzing the statement.
+    """
+    document = extract_json(text)
+    try:
+        return json.loads(document)
+    except (ValueError, RecursionError):
+        pass
+    try:
+        return json.loads(repair_json(document))
+    except Exception as e:
+        raise ValueError(f"Response is not valid JSON: {str(e)}")
+
+
+def normalize_level(value: Any) -> Optional[str]:
+    """Map a severity / impact value onto high, medium or low; None if unrecognized"""
+    level = str(value or "").strip().lower()
+    if level in LEVELS:
+        return level
+    if level in LEVEL_SYNONYMS:
+        return LEVEL_SYNONYMS[level]
+    # "high/medium/low" copied from the template, or "High risk"
+    for candidate in LEVELS:
+        if level.startswith(candidate):
+            return candidate
+    return None
+
+
+def _validate_items(items: Any, name: str, title_key: str, level_key: str) -> List[Dict[str, Any]]:
+    if items is None:
+        return []
+    if not isinstance(items, list):
+        raise ValueError(f'"{name}" must be an array')
+    valid = []
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get(title_key) or "").strip():
+            continue
+        item = dict(item)
+        item[level_key] = normalize_level(item.get(level_key)) or "medium"
+        if not str(item.get("recommendation") or "").strip():
+            item["recommendation"] = str(item.get("explanation") or "Review the query").strip()
+        valid.append(item)
+    return valid
+
+
+def validate_analysis(data: Any) -> Dict[str, Any]:
+    """Check a parsed response against the analysis schema and normalize it
+
+    Raises ValueError if the structure is unusable. Items without a title are
+    dropped, unknown severities become "medium" and a missing recommendation
+    falls back to the explanation, so every result passes API validation.
+    """
+    if isinstance(data, dict) and "results" in data and "safety_issues" not in data:
+        results = data.get("results")
+        if isinstance(results, list) and len(results) == 1:
+            data = results[0]
+    if not isinstance(data, dict):
+        raise ValueError("Response must be a JSON object")
+    if "safety_issues" not in data and "performance_suggestions" not in data and "risk_score" not in data:
+        raise ValueError('Response has none of "safety_issues", "performance_suggestions" or "risk_score"')
+    risk_score = data.get("risk_score", 50)
+    try:
+        float(risk_score)
+    except (TypeError, ValueError):
+        raise ValueError('"risk_score" must be a number')
+    return {
+        "safety_issues": _validate_items(data.get("safety_issues"), "safety_issues", "issue", "severity"),
+        "performance_suggestions": _validate_items(
+            data.get("performance_suggestions"), "performance_suggestions", "suggestion", "impact"),
+        "risk_score": risk_score
+    }
+
+
+def parse_analysis_response(response: str) -> Dict[str, Any]:
+    """Extract, repair and validate a single-query analysis; raises ValueError"""
+    return validate_analysis(load_json(response))
+
+
+def get_repair_prompt(response: str, error: Exception) -> str:
+    """Ask the model to turn its previous, unusable response into valid JSON"""
+    if len(response) > MAX_REPAIR_ECHO:
+        response = response[:MAX_REPAIR_ECHO]
+    return get_template("json_repair").render(error=str(error), response=response)
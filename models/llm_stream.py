@@ -0,0 +1,88 @@
+from typing import Dict, Any, List, Optional, Tuple
+import json
+
+# Arrays of the analysis JSON whose elements are emitted as soon as they are complete,
+# mapped to the stream event each element produces
+STREAMED_ARRAYS = {
+    "safety_issues": "safety_issue",
+    "performance_suggestions": "performance_suggestion",
+}
+
+
+class AnalysisStreamParser:
+    """
+    Incremental parser for an analysis JSON document arriving in pieces.
+
+    Generated text is fed as it streams in. The parser tracks just enough JSON
+    structure (nesting depth, strings and escapes, the key of each top-level
+    array) to recognize when an element of "safety_issues" or
+    "performance_suggestions" has been closed, and returns that element right
+    away instead of waiting for the whole document. Text before the first "{"
+    (such as a ```json fence) is ignored. The complete text is kept as a list
+    of pieces and joined once, by text().
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string: List[str] = []
+        self._last_string = ""
+        self._key = ""
+        self._array_key = ""
+        self._element: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume the next piece of text; return (event, element) for every element it completed"""
+        self._parts.append(text)
+        completed = []
+        for char in text:
+            element = self._element
+            if element is not None:
+                element.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = "".join(self._string)
+                    continue
+                if self._depth == 1:
+                    self._string.append(char)
+                continue
+
+            if self._depth == 0 and char != "{":
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char == ":" and self._depth == 1:
+                self._key = self._last_string
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 2 and char == "[":
+                    self._array_key = self._key
+                elif self._depth == 3 and char == "{" and self._array_key in STREAMED_ARRAYS:
+                    self._element = ["{"]
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and element is not None:
+                    self._element = None
+                    try:
+                        parsed = json.loads("".join(element))
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(parsed, dict):
+                        completed.append((STREAMED_ARRAYS[self._array_key], parsed))
+                elif self._depth == 1:
+                    self._array_key = ""
+        return completed
+
+    def text(self) -> str:
+        """Return everything fed so far"""
+        return "".join(self._parts)
@@ -1,163 +1,306 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, AsyncIterator
 import requests
 import json
+import os
+import time
 from .base_model import SQLAnalyzerModel
+from utils.http_client import HTTPPoolConfig, get_session, get_async_client, async_send
+from .llm_batch import (
+    chunk_queries,
+    gather_chunks,
+    get_batch_analysis_prompt,
+    parse_batch_analysis_response,
+    normalize_risk_score,
+)
+from .llm_stream import AnalysisStreamParser
+from .llm_response import load_json, parse_analysis_response, get_repair_prompt
+from .prompts import render_sql_prompt, templates_digest
+from utils.metrics import BACKEND_ERRORS, RESPONSE_REPAIRS, stage_timer
+
+# Stage timers and counters, looked up once for the hot path
+_PROMPT_SECONDS = stage_timer("ollama", "prompt")
+_HTTP_SECONDS = stage_timer("ollama", "http")
+_PARSE_SECONDS = stage_timer("ollama", "parse")
+_GENERATE_ERRORS = BACKEND_ERRORS.labels("ollama", "generate")
+_REPAIRS = RESPONSE_REPAIRS.labels("ollama")
 
 class OllamaModel(SQLAnalyzerModel):
-    """Ollama model implementation for SQL analysis"""
+    """Ollama model implementation for SQL analysis
+    
+    Analyses run in Ollama's JSON mode. Responses are extracted from code
+    fences, repaired and validated against the analysis schema; a response
+    that is still unusable gets exactly one repair request, so an analysis
+    costs at most two generations.
+    
+    Prompts are rendered from precompiled templates whose static instructions
+    come first, so Ollama's prompt cache can reuse them across requests;
+    statements too long for OLLAMA_MAX_PROMPT_TOKENS are summarized or
+    truncated to fit.
+    """
+    
+    # Output changed with JSON mode and response recovery
+    version = "2"
+    
+    # Templates whose output ends up in cached results: single, batched and repaired analyses
+    prompt_templates = ("analysis", "batch_analysis", "json_repair")
     
-    def __init__(self, model_name: str = "deepseek-coder:6.7b", api_url: str = "http://localhost:11434"):
-        self.model_name = model_name
-        self.api_url = api_url
+    # The analysis depends on the query's shape, not on its constants
+    cache_by_fingerprint = True
+    
+    # Concurrent requests are coalesced into batched prompts by the registry's scheduler
+    micro_batch = True
+    
+    def __init__(self, model_name: Optional[str] = None, api_url: Optional[str] = None,
+                 batch_size: int = 10, session: Optional[requests.Session] = None,
+                 http_config: Optional[HTTPPoolConfig] = None, max_prompt_tokens: Optional[int] = None):
+        self.model_name = model_name or os.getenv('OLLAMA_MODEL', 'deepseek-coder:6.7b')
+        self.api_url = api_url or os.getenv('OLLAMA_API_URL', 'http://localhost:11434')
+        self.batch_size = batch_size  # Maximum number of statements packed into one prompt
+        
+        # Prompt size budget; the default leaves room for the answer in a 2048-token context
+        self.max_prompt_tokens = max_prompt_tokens if max_prompt_tokens is not None else int(os.getenv('OLLAMA_MAX_PROMPT_TOKENS', '1536'))
+        # How long Ollama keeps the model, and with it the cached prompt prefix, loaded between requests
+        self.keep_alive = os.getenv('OLLAMA_KEEP_ALIVE', '')
         
-    def _query_ollama(self, prompt: str) -> str:
+        # Pooled keep-alive session shared with other models unless one is supplied
+        self.session = session or get_session()
+        self.http_config = http_config or HTTPPoolConfig()
+        self.timeout = self.http_config.timeout
+    
+    @staticmethod
+    def _parse_stream_line(line) -> str:
+        """Extract the generated text from one line of Ollama's streaming response"""
+        if not line:
+            return ''
+        try:
+            return json.loads(line).get('response', '')
+        except json.JSONDecodeError:
+            return ''
+        
+    def _request_payload(self, prompt: str, json_mode: bool = True) -> Dict[str, Any]:
+        """Build the generate request; JSON mode constrains the output to valid JSON"""
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        if json_mode:
+            payload["format"] = "json"
+        return payload
+    
+    def _query_ollama(self, prompt: str, json_mode: bool = True) -> str:
         """Send request to Ollama API"""
         try:
-            response = requests.post(
+            # The context manager returns the connection to the pool once the stream is read
+            with _HTTP_SECONDS.time(), self.session.post(
                 f"{self.api_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt
-                },
-                stream=True
+                json=self._request_payload(prompt, json_mode),
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                parts = []
+                for line in response.iter_lines():
+                    parts.append(self._parse_stream_line(line))
+                return "".join(parts)
+        except Exception as e:
+            _GENERATE_ERRORS.inc()
+            raise Exception(f"Ollama API call failed: {str(e)}")
+    
+    async def _astream_ollama(self, prompt: str) -> AsyncIterator[str]:
+        """Send request to Ollama API and yield the generated text as it arrives
+        
+        The http stage is timed from the request until the stream ends.
+        """
+        started = time.perf_counter()
+        try:
+            client = get_async_client()
+            request = client.build_request(
+                "POST",
+                f"{self.api_url}/api/generate",
+                json=self._request_payload(prompt)
             )
-            response.raise_for_status()
-            full_response = ""
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        json_response = json.loads(line)
-                        full_response += json_response.get('response', '')
-                    except json.JSONDecodeError:
-                        continue
-            return full_response
+            response = await async_send(client, request, self.http_config)
+            try:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = self._parse_stream_line(line)
+                    if text:
+                        yield text
+            finally:
+                await response.aclose()
         except Exception as e:
+            _GENERATE_ERRORS.inc()
             raise Exception(f"Ollama API call failed: {str(e)}")
+        finally:
+            _HTTP_SECONDS.observe(time.perf_counter() - started)
     
-    def analyze(self, sql_query: str) -> Dict[str, Any]:
-        """Analyze SQL query and return analysis results"""
-        # Combine all analysis into a single API call to reduce latency
-        combined_prompt = self._get_combined_analysis_prompt(sql_query)
+    async def _aquery_ollama(self, prompt: str) -> str:
+        """Send request to Ollama API without blocking the event loop"""
+        parts = []
+        async for text in self._astream_ollama(prompt):
+            parts.append(text)
+        return "".join(parts)
+    
+    def _result_from_response(self, response: str, details: str = "Generated by Ollama model analysis") -> Dict[str, Any]:
+        """Build an analysis result from the model's response; raises ValueError if it cannot be recovered"""
+        with _PARSE_SECONDS.time():
+            analysis_results = parse_analysis_response(response)
+        
+        # Ensure risk_score is an integer between 0 and 100
+        risk_score = normalize_risk_score(analysis_results['risk_score'])
         
+        return {
+            "safety_issues": analysis_results['safety_issues'],
+            "performance_suggestions": analysis_results['performance_suggestions'],
+            "risk_score": risk_score,
+            "risk_level": self.get_risk_level(risk_score),
+            "details": details
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Build the result returned when the Ollama analysis fails"""
+        return {
+            "safety_issues": [{
+                "issue": "Error in Ollama analysis",
+                "severity": "high",
+                "recommendation": "Please check if the Ollama service is running properly",
+                "explanation": f"Error details: {str(error)}"
+            }],
+            "performance_suggestions": [],
+            "risk_score": 50,  # Default medium risk
+            "risk_level": self.get_risk_level(50),
+            "details": "Ollama analysis failed",
+            "error": True
+        }
+    
+    def analyze(self, sql_query: str) -> Dict[str, Any]:
+        """Analyze SQL query and return analysis results (at most two generations)"""
         try:
-            response = self._query_ollama(combined_prompt)
-            analysis_results = json.loads(response)
-            
-            safety_issues = analysis_results.get('safety_issues', [])
-            performance_suggestions = analysis_results.get('performance_suggestions', [])
-            risk_score = analysis_results.get('risk_score', 50)
-            
-            # Ensure risk_score is an integer between 0 and 100
+            response = self._query_ollama(self._get_combined_analysis_prompt(sql_query))
             try:
-                risk_score = int(risk_score)
-                risk_score = max(0, min(100, risk_score))
-            except:
-                risk_score = 50  # Default medium risk
-                
-            return {
-                "safety_issues": safety_issues,
-                "performance_suggestions": performance_suggestions,
+                return self._result_from_response(response)
+            except ValueError as e:
+                # One repair round instead of re-running each analysis separately
+                _REPAIRS.inc()
+                repaired = self._query_ollama(get_repair_prompt(response, e))
+                return self._result_from_response(repaired, "Generated by Ollama model analysis (repaired)")
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def aanalyze(self, sql_query: str) -> Dict[str, Any]:
+        """Analyze SQL query over a non-blocking HTTP client (at most two generations)"""
+        try:
+            response = await self._aquery_ollama(self._get_combined_analysis_prompt(sql_query))
+            return await self._arecover(response)
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def _arecover(self, response: str) -> Dict[str, Any]:
+        """Build the result from a response, asking for one repair if it cannot be recovered"""
+        try:
+            return self._result_from_response(response)
+        except ValueError as e:
+            _REPAIRS.inc()
+            repaired = await self._aquery_ollama(get_repair_prompt(response, e))
+            return self._result_from_response(repaired, "Generated by Ollama model analysis (repaired)")
+    
+    async def astream_analyze(self, sql_query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Analyze SQL query, forwarding generated tokens and each issue as soon as it is complete"""
+        parser = AnalysisStreamParser()
+        try:
+            async for text in self._astream_ollama(self._get_combined_analysis_prompt(sql_query)):
+                yield {"event": "token", "data": text}
+                for event, element in parser.feed(text):
+                    yield {"event": event, "data": element}
+            result = await self._arecover(parser.text())
+        except Exception as e:
+            result = self._error_result(e)
+        yield {"event": "result", "data": result}
+    
+    def _results_from_batch(self, chunk: List[str], response: Optional[str]) -> List[Optional[Dict[str, Any]]]:
+        """Map a batched response onto per-query results; None marks queries that need a retry"""
+        if response is None:
+            return [None] * len(chunk)
+        with _PARSE_SECONDS.time():
+            entries = parse_batch_analysis_response(response, len(chunk))
+        results: List[Optional[Dict[str, Any]]] = []
+        for entry in entries:
+            if entry is None:
+                results.append(None)
+                continue
+            risk_score = normalize_risk_score(entry.get('risk_score', 50))
+            results.append({
+                "safety_issues": entry.get('safety_issues', []),
+                "performance_suggestions": entry.get('performance_suggestions', []),
                 "risk_score": risk_score,
                 "risk_level": self.get_risk_level(risk_score),
-                "details": "Generated by Ollama model analysis"
-            }
-        except Exception:
-            # If combined analysis fails, fall back to individual analyses
-            safety_issues = self.get_safety_issues(sql_query)
-            performance_suggestions = self.get_performance_suggestions(sql_query)
-            risk_score = self.calculate_risk_score(sql_query)
+                "details": "Generated by Ollama model analysis (batched)"
+            })
+        return results
+    
+    def analyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze several SQL queries, packing up to batch_size statements into each prompt
+        
+        Statements the model fails to answer in the batched response are
+        re-analyzed individually, so the result list always matches the input.
+        """
+        results: List[Dict[str, Any]] = []
+        for chunk in chunk_queries(sql_queries, self.batch_size):
+            if len(chunk) == 1:
+                results.append(self.analyze(chunk[0]))
+                continue
             
-            return {
-                "safety_issues": safety_issues,
-                "performance_suggestions": performance_suggestions,
-                "risk_score": risk_score,
-                "risk_level": self.get_risk_level(risk_score),
-                "details": "Generated by Ollama model analysis (fallback method)"
-            }
+            try:
+                response = self._query_ollama(self._get_batch_analysis_prompt(chunk))
+            except Exception:
+                response = None
+            
+            for sql_query, result in zip(chunk, self._results_from_batch(chunk, response)):
+                results.append(result if result is not None else self.analyze(sql_query))
+        return results
+    
+    async def aanalyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze several SQL queries concurrently, one batched prompt per chunk, within the connection pool size"""
+        async def analyze_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+            if len(chunk) == 1:
+                return [await self.aanalyze(chunk[0])]
+            try:
+                response = await self._aquery_ollama(self._get_batch_analysis_prompt(chunk))
+            except Exception:
+                response = None
+            results = self._results_from_batch(chunk, response)
+            for index, result in enumerate(results):
+                if result is None:
+                    results[index] = await self.aanalyze(chunk[index])
+            return results
+        
+        # No more chunks in flight than the connection pool has connections
+        return await gather_chunks(analyze_chunk, chunk_queries(sql_queries, self.batch_size),
+                                   self.http_config.pool_maxsize)
+    
+    def cache_version(self) -> str:
+        """Include the backend model and the prompts in the cache key, so changing any of them invalidates results"""
+        prompt_hash = templates_digest(self.prompt_templates)
+        return f"{super().cache_version()}:{self.model_name}:{prompt_hash}:{self.max_prompt_tokens}"
     
     def _get_combined_analysis_prompt(self, sql_query: str) -> str:
         """Generate a combined prompt for all analyses to reduce API calls"""
-        return f"""# SQL Analysis Task
-
-As an expert SQL analyzer, please analyze the following SQL query comprehensively for safety issues, performance optimization opportunities, and overall risk assessment.
-
-## SQL Query to Analyze:
-```sql
-{sql_query}
-```
-
-## Analysis Requirements:
-
-1. Identify safety issues including SQL injection risks, permission problems, data leakage risks, comment risks, and other security concerns.
-2. Provide performance optimization suggestions considering query structure, index usage, joins, data retrieval, filtering conditions, sorting/grouping, and data volume.
-3. Calculate an overall risk score (0-100) based on data modification risk, permission risk, injection risk, performance risk, data leakage risk, and transaction risk.
-
-## Response Format:
-Please provide your analysis in the following JSON format:
-
-```json
-{{
-  "safety_issues": [
-    {{
-      "issue": "Issue description",
-      "severity": "high/medium/low",
-      "recommendation": "Fix recommendation",
-      "explanation": "Detailed explanation of the problem and potential consequences"
-    }}
-  ],
-  "performance_suggestions": [
-    {{
-      "suggestion": "Optimization suggestion title",
-      "impact": "high/medium/low",
-      "recommendation": "Specific optimization method",
-      "explanation": "Detailed explanation of why this optimization is needed and expected performance improvement"
-    }}
-  ],
-  "risk_score": 50
-}}
-```
-
-If no issues are found in any category, return an empty array for that category. The risk score should be an integer between 0-100, where:
-- 0-29: Low risk (query is safe and efficient)
-- 30-69: Medium risk (query may have some safety or performance issues)
-- 70-100: High risk (query has serious safety or performance issues)
-
-Ensure your response is valid JSON format with no additional text or explanation outside the JSON structure.
-"""
+        with _PROMPT_SECONDS.time():
+            return render_sql_prompt("analysis", sql_query, self.max_prompt_tokens)
+    
+    def _get_batch_analysis_prompt(self, chunk: List[str]) -> str:
+        """Generate one prompt analyzing every statement of the chunk"""
+        with _PROMPT_SECONDS.time():
+            return get_batch_analysis_prompt(chunk, self.max_prompt_tokens)
     
     def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
-        prompt = f"""# SQL Safety Analysis
-
-As a professional SQL security analyst, please analyze the following SQL query for security issues.
-
-Consider the following aspects:
-1. SQL injection risks: Check for string concatenation, non-parameterized queries, etc.
-2. Permission issues: Check for high-risk operations like DROP, TRUNCATE, DELETE, UPDATE, GRANT, REVOKE, etc.
-3. Data leakage risks: Check if sensitive data might be exposed
-4. Comment risks: Check for comments that could be used for SQL injection
-5. Other security concerns: Such as stored procedure execution, dynamic SQL, etc.
-
-## SQL Query:
-```sql
-{sql_query}
-```
-
-Please return your analysis in the following JSON format:
-[
-  {{
-    "issue": "Issue description",
-    "severity": "high/medium/low",
-    "recommendation": "Fix recommendation",
-    "explanation": "Detailed explanation of the problem and potential consequences"
-  }}
-]
-
-If no security issues are found, return an empty array []. Ensure your response is valid JSON format.
-"""
+        prompt = render_sql_prompt("safety_analysis", sql_query, self.max_prompt_tokens)
         response = self._query_ollama(prompt)
         try:
             # Try to parse JSON response
-            issues = json.loads(response)
+            issues = load_json(response)
             return issues if isinstance(issues, list) else []
         except:
             # Return error information if parsing fails
@@ -169,40 +312,11 @@ If no security issues are found, return an empty array []. Ensure your response
             }]
     
     def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
-        prompt = f"""# SQL Performance Analysis
-
-As a senior SQL performance optimization expert, please analyze the following SQL query for performance issues and provide optimization suggestions.
-
-Consider the following aspects:
-1. Query structure: Check for unnecessary complex queries, subqueries, or temporary tables
-2. Index usage: Analyze if the query can effectively use indexes, or if indexes need to be added
-3. Table joins: Evaluate if JOIN operations are efficient, check for Cartesian product risks
-4. Data retrieval: Check if SELECT * is used, or if unnecessary data is being retrieved
-5. Filtering conditions: Analyze the efficiency of WHERE clauses, check for full table scan risks
-6. Sorting and grouping: Evaluate the performance impact of ORDER BY and GROUP BY operations
-7. Data volume: Consider the amount of data the query might process and its impact on performance
-
-## SQL Query:
-```sql
-{sql_query}
-```
-
-Please return your analysis in the following JSON format:
-[
-  {{
-    "suggestion": "Optimization suggestion title",
-    "impact": "high/medium/low",
-    "recommendation": "Specific optimization method",
-    "explanation": "Detailed explanation of why this optimization is needed and expected performance improvement"
-  }}
-]
-
-If no performance issues are found, return an empty array []. Ensure your response is valid JSON format.
-"""
+        prompt = render_sql_prompt("performance_analysis", sql_query, self.max_prompt_tokens)
         response = self._query_ollama(prompt)
         try:
             # Try to parse JSON response
-            suggestions = json.loads(response)
+            suggestions = load_json(response)
             return suggestions if isinstance(suggestions, list) else []
         except:
             # Return error information if parsing fails
@@ -214,31 +328,8 @@ If no performance issues are found, return an empty array []. Ensure your respon
             }]
     
     def calculate_risk_score(self, sql_query: str) -> int:
-        prompt = f"""# SQL Risk Assessment
-
-As an SQL risk assessment expert, please conduct a comprehensive risk assessment (0-100 points) for the following SQL query.
-
-Consider the following risk factors:
-1. Data modification risk: Assess if the query contains DROP, TRUNCATE, DELETE, UPDATE, etc. that could lead to data loss
-2. Permission risk: Assess if the query contains GRANT, REVOKE, or other permission-related operations
-3. Injection risk: Assess if the query has SQL injection vulnerabilities
-4. Performance risk: Assess if the query might cause performance issues (such as full table scans, Cartesian products, etc.)
-5. Data leakage risk: Assess if the query might lead to sensitive data exposure
-6. Transaction risk: Assess the risk of the query in transactions
-
-Risk score criteria:
-- 0-29 points: Low risk, the query is safe and efficient
-- 30-69 points: Medium risk, the query may have some safety or performance issues
-- 70-100 points: High risk, the query has serious safety or performance issues
-
-## SQL Query:
-```sql
-{sql_query}
-```
-
-After careful analysis, please return only an integer between 0 and 100 as the risk score. Do not include any other text or explanation.
-"""
-        response = self._query_ollama(prompt)
+        prompt = render_sql_prompt("risk_assessment", sql_query, self.max_prompt_tokens)
+        response = self._query_ollama(prompt, json_mode=False)
         try:
             # Try to convert the response to an integer
             score = int(response.strip())
@@ -0,0 +1,204 @@
+from typing import Dict, Any, List, Optional, Tuple, FrozenSet
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+from .base_model import SQLAnalyzerModel
+from .llm_batch import chunk_queries
+from utils.logger import logger
+
+# Analyzed once by every worker at startup, to compile rule patterns and fill parse caches
+WARM_UP_SQL = ("SELECT u.id, u.name FROM users u JOIN orders o ON o.user_id = u.id "
+               "WHERE u.status = 'active' ORDER BY u.name LIMIT 10")
+
+# Model instances living in this worker process, keyed by their registered name
+_worker_models: Dict[str, SQLAnalyzerModel] = {}
+
+
+def _install(key: str, model: SQLAnalyzerModel) -> SQLAnalyzerModel:
+    model.analyze(WARM_UP_SQL)
+    _worker_models[key] = model
+    return model
+
+
+def _init_worker(models: Tuple[Tuple[str, SQLAnalyzerModel], ...]) -> None:
+    """Process pool initializer: unpickle and warm up every rule model once per worker"""
+    for key, model in models:
+        _install(key, model)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _analyze_chunk(key: str, sql_queries: List[str], model: Optional[SQLAnalyzerModel] = None) -> List[Dict[str, Any]]:
+    """Analyze a chunk in a worker; models registered after the pool started travel with each task"""
+    worker_model = _worker_models.get(key)
+    if worker_model is None:
+        if model is None:
+            raise Exception(f"Rule model '{key}' is not loaded in worker {os.getpid()}")
+        worker_model = _install(key, model)
+    return worker_model.analyze_batch(sql_queries)
+
+
+class RuleProcessPool:
+    """
+    Process pool that runs CPU-bound rule models outside the API process.
+
+    Rule analysis is pure Python, so threads in one process share a single
+    core. The pool spreads it over worker processes instead: batches are
+    split into chunks of at most chunk_size statements, at least one chunk
+    per worker, and analyzed in parallel. Registered models are pickled into
+    each worker once, by the pool initializer, which also warms them up.
+
+    Settings default to the RULE_POOL_WORKERS (default: CPU count),
+    RULE_POOL_CHUNK_SIZE and RULE_POOL_START_METHOD environment variables.
+    Workers are started with "spawn" by default, which is safe next to the
+    server's threads. If the pool breaks (a worker was killed), the affected
+    call is analyzed in-process and the pool is rebuilt on the next call.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 start_method: Optional[str] = None):
+        self.max_workers = max(1, max_workers or int(os.getenv('RULE_POOL_WORKERS', '0')) or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size or int(os.getenv('RULE_POOL_CHUNK_SIZE', '256')))
+        self.start_method = start_method or os.getenv('RULE_POOL_START_METHOD', 'spawn')
+
+        self._models: Dict[str, SQLAnalyzerModel] = {}
+        self._preloaded: FrozenSet[str] = frozenset()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def register(self, key: str, model: SQLAnalyzerModel) -> None:
+        """Make a model available to the workers under the given name"""
+        self._models[key] = model
+
+    def start(self) -> ProcessPoolExecutor:
+        """Start the workers if they are not running; returns the executor"""
+        executor = self._executor
+        if executor is not None:
+            return executor
+        with self._lock:
+            if self._executor is None:
+                self._preloaded = frozenset(self._models)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(tuple(self._models.items()),)
+                )
+                # Workers are spawned on demand; one trivial task each starts and warms them all now
+                for _ in range(self.max_workers):
+                    self._executor.submit(_worker_pid)
+                logger.info(f"Rule process pool started with {self.max_workers} workers")
+            return self._executor
+
+    def chunks(self, sql_queries: List[str]) -> List[List[str]]:
+        """Split a batch so every worker gets work, in chunks of at most chunk_size statements"""
+        size = min(self.chunk_size, max(1, math.ceil(len(sql_queries) / self.max_workers)))
+        return chunk_queries(sql_queries, size)
+
+    def _task_args(self, key: str, chunk: List[str]) -> Tuple[str, List[str], Optional[SQLAnalyzerModel]]:
+        return key, chunk, None if key in self._preloaded else self._models[key]
+
+    def _broken(self, executor: ProcessPoolExecutor, error: Exception) -> None:
+        logger.warning(f"Rule process pool failed, analyzing in-process: {str(error)}")
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, key: str, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze a batch with the named model across the workers, preserving order"""
+        executor = self.start()
+        try:
+            futures = [executor.submit(_analyze_chunk, *self._task_args(key, chunk))
+                       for chunk in self.chunks(sql_queries)]
+            return [result for future in futures for result in future.result()]
+        except BrokenProcessPool as e:
+            self._broken(executor, e)
+            return self._models[key].analyze_batch(sql_queries)
+
+    async def amap(self, key: str, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Non-blocking variant of map; the event loop only waits on the workers"""
+        executor = self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            chunk_results = await asyncio.gather(*(
+                loop.run_in_executor(executor, _analyze_chunk, *self._task_args(key, chunk))
+                for chunk in self.chunks(sql_queries)
+            ))
+            return [result for results in chunk_results for result in results]
+        except BrokenProcessPool as e:
+            self._broken(executor, e)
+            return await loop.run_in_executor(None, self._models[key].analyze_batch, sql_queries)
+
+    def close(self) -> None:
+        """Stop the workers"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class PooledModel(SQLAnalyzerModel):
+    """
+    Runs a CPU-bound rule model's analyses in a RuleProcessPool.
+
+    Asynchronous analyses and batches go to the worker processes, so the API
+    process only dispatches and collects results. Synchronous single-statement
+    analyses, cache settings and every other attribute are those of the
+    wrapped model.
+    """
+
+    def __init__(self, model: SQLAnalyzerModel, pool: RuleProcessPool, name: str):
+        self.model = model
+        self.pool = pool
+        self.name = name
+        pool.register(name, model)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not found on the wrapper itself
+        return getattr(self.model, name)
+
+    @property
+    def cache_results(self) -> bool:
+        return self.model.cache_results
+
+    @property
+    def cache_by_fingerprint(self) -> bool:
+        return self.model.cache_by_fingerprint
+
+    def cache_version(self) -> str:
+        return self.model.cache_version()
+
+    def analyze(self, sql_query: str) -> Dict[str, Any]:
+        return self.model.analyze(sql_query)
+
+    def analyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        if len(sql_queries) < 2:
+            return self.model.analyze_batch(sql_queries)
+        return self.pool.map(self.name, sql_queries)
+
+    async def aanalyze(self, sql_query: str) -> Dict[str, Any]:
+        return (await self.pool.amap(self.name, [sql_query]))[0]
+
+    async def aanalyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        if not sql_queries:
+            return []
+        return await self.pool.amap(self.name, sql_queries)
+
+    def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
+        return self.model.get_safety_issues(sql_query)
+
+    def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
+        return self.model.get_performance_suggestions(sql_query)
+
+    def calculate_risk_score(self, sql_query: str) -> int:
+        return self.model.calculate_risk_score(sql_query)
+
+    def close(self) -> None:
+        self.model.close()
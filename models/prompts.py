@@ -0,0 +1,152 @@
+from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+import hashlib
+import os
+import re
+from utils.fingerprint import fingerprint
+
+# Prompt templates live next to the API prompt documentation
+PROMPTS_DIR = os.getenv('PROMPTS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompts'))
+
+# Templates used by the LLM models, loaded at startup by load_templates
+TEMPLATE_NAMES = (
+    "analysis",
+    "batch_analysis",
+    "json_repair",
+    "safety_analysis",
+    "performance_analysis",
+    "risk_assessment",
+)
+
+# Fewest tokens a statement is cut down to, however little room the prompt leaves
+MIN_SQL_TOKENS = 64
+
+SUMMARY_NOTE = "Note: this query was too long to include verbatim; its literals were replaced with ? and value lists collapsed.\n"
+TRUNCATED_NOTE = "Note: this query was too long to include verbatim; its literals were replaced with ? and the omitted middle part is marked with a comment.\n"
+
+# Tokens taken by the "/* ... N tokens omitted ... */" marker of a truncated statement
+_MARKER_TOKENS = 16
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def _token_cost(token: str) -> int:
+    # Common words are a single token; subword tokenizers split longer ones into pieces of about four characters
+    return (len(token) + 3) // 4 if len(token) > 6 else 1
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens an LLM tokenizer produces for the text
+
+    Counts words and punctuation marks, charging words longer than six
+    characters one token per four characters. Close enough to BPE counts for
+    English and SQL to budget prompts without a model-specific tokenizer.
+    """
+    return sum(_token_cost(token) for token in _TOKEN.findall(text))
+
+
+def _cut(text: str, budget: int, from_end: bool = False) -> int:
+    """Return the offset that keeps at most budget tokens from the start (or end) of text"""
+    matches = list(_TOKEN.finditer(text))
+    if from_end:
+        matches.reverse()
+    used = 0
+    offset = len(text) if from_end else 0
+    for match in matches:
+        used += _token_cost(match.group())
+        if used > budget:
+            break
+        offset = match.start() if from_end else match.end()
+    return offset
+
+
+def fit_sql(sql_query: str, budget: Optional[int]) -> Tuple[str, str]:
+    """Shrink a statement to at most budget tokens; returns (sql, note for the model)
+
+    The statement is kept verbatim when it fits. Otherwise it is summarized by
+    its fingerprint, which drops literals and comments but keeps the shape the
+    analysis depends on. If even that is too long, the head and tail of the
+    summary are kept and the middle is replaced by a comment saying how much
+    was left out. A budget of None or 0 means no limit.
+    """
+    if not budget or estimate_tokens(sql_query) <= budget:
+        return sql_query, ""
+    summary = fingerprint(sql_query)
+    if estimate_tokens(summary) <= max(MIN_SQL_TOKENS, budget - estimate_tokens(SUMMARY_NOTE)):
+        return summary, SUMMARY_NOTE
+
+    # The note and the omission marker come out of the same budget
+    budget = max(MIN_SQL_TOKENS, budget - estimate_tokens(TRUNCATED_NOTE) - _MARKER_TOKENS)
+    # Keep more of the head: it names the operation and the tables
+    head_budget = budget * 2 // 3
+    tail_budget = budget - head_budget
+    head_end = _cut(summary, head_budget)
+    tail_start = max(head_end, _cut(summary, tail_budget, from_end=True))
+    omitted = estimate_tokens(summary[head_end:tail_start])
+    truncated = f"{summary[:head_end]}\n/* ... {omitted} tokens omitted ... */\n{summary[tail_start:]}"
+    return truncated, TRUNCATED_NOTE
+
+
+class PromptTemplate:
+    """
+    A prompt template compiled once into literal segments and placeholders.
+
+    Placeholders are written {{ name }}; everything else, including JSON
+    braces, is literal. Rendering is a single join with no parsing. Templates
+    put the per-request values last, so every prompt built from a template
+    starts with the same static prefix, which the backend can reuse from its
+    prompt cache instead of evaluating it again.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        pieces = _PLACEHOLDER.split(text)
+        # Even indexes are literal text, odd indexes placeholder names
+        self._segments: List[str] = pieces
+        self.placeholders: Tuple[str, ...] = tuple(pieces[1::2])
+        self.prefix = pieces[0]
+        self.static_tokens = sum(estimate_tokens(segment) for segment in pieces[0::2])
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def render(self, **values: str) -> str:
+        """Fill in every placeholder; raises KeyError if a value is missing"""
+        parts = list(self._segments)
+        for index in range(1, len(parts), 2):
+            parts[index] = str(values[parts[index]])
+        return "".join(parts)
+
+    def budget_for(self, max_tokens: Optional[int]) -> Optional[int]:
+        """Tokens left for the variable part of the prompt, or None without a limit"""
+        if not max_tokens:
+            return None
+        return max(MIN_SQL_TOKENS, max_tokens - self.static_tokens)
+
+
+@lru_cache(maxsize=None)
+def get_template(name: str) -> PromptTemplate:
+    """Load and compile prompts/<name>.md; the file is read only once"""
+    path = os.path.join(PROMPTS_DIR, f"{name}.md")
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return PromptTemplate(name, file.read())
+    except OSError as e:
+        raise Exception(f"Loading prompt template {name} failed: {str(e)}")
+
+
+def load_templates() -> Dict[str, PromptTemplate]:
+    """Compile every template up front, so a missing file fails at startup instead of mid-request"""
+    return {name: get_template(name) for name in TEMPLATE_NAMES}
+
+
+def templates_digest(names: Tuple[str, ...]) -> str:
+    """One digest of several templates, for the cache key of results rendered from any of them"""
+    digests = ":".join(get_template(name).digest for name in names)
+    return hashlib.sha256(digests.encode("utf-8")).hexdigest()[:16]
+
+
+def render_sql_prompt(name: str, sql_query: str, max_tokens: Optional[int] = None) -> str:
+    """Render a single-statement template, fitting the statement into the prompt budget"""
+    template = get_template(name)
+    sql, note = fit_sql(sql_query, template.budget_for(max_tokens))
+    return template.render(sql=sql, note=note)
@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Type
+import os
+import threading
+from .base_model import SQLAnalyzerModel
+from .scheduler import ScheduledModel
+from .process_pool import RuleProcessPool, PooledModel
+from utils.logger import logger
+from utils.metrics import stage_timer
+
+
+class ModelRegistry:
+    """
+    Holds one shared instance of each analyzer model for the lifetime of the application.
+
+    Models are built once at startup and reused by every request, so per-model
+    state such as cached access tokens and HTTP connections survives between
+    analyses. Models that fail to build at startup are retried on first use.
+    Instances must be safe to call from concurrent requests.
+
+    A model class with a from_registry classmethod is built by calling it with
+    the registry, so composite models can reuse other registered instances.
+    Models that set micro_batch are wrapped in a ScheduledModel, so all
+    asynchronous analyses against that backend share one scheduler.
+
+    With rule_executor "process" (env RULE_EXECUTOR, default "thread"),
+    models that set cpu_bound are wrapped in a PooledModel, so their
+    asynchronous and batched analyses run in one shared RuleProcessPool.
+    The pool (built from RULE_POOL_* settings unless one is supplied) is
+    started at the end of startup and stopped at shutdown.
+    """
+
+    def __init__(self, model_map: Dict[str, Type[SQLAnalyzerModel]], rule_executor: Optional[str] = None,
+                 rule_pool: Optional[RuleProcessPool] = None):
+        self._model_map = {name.lower(): model_class for name, model_class in model_map.items()}
+        self._instances: Dict[str, SQLAnalyzerModel] = {}
+        self.rule_executor = (rule_executor or os.getenv('RULE_EXECUTOR', 'thread')).lower()
+        self._rule_pool = rule_pool
+        # Re-entrant so a model built under the lock can fetch the models it depends on
+        self._lock = threading.RLock()
+
+    def names(self) -> List[str]:
+        """Return the names of all registered models"""
+        return list(self._model_map)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._model_map
+
+    def startup(self) -> None:
+        """Build every registered model; failures are logged and retried lazily"""
+        for name in self._model_map:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Failed to initialize model '{name}' at startup: {str(e)}")
+        if self._rule_pool is not None and self.rule_executor == "process":
+            # Spawn and warm the workers now rather than on the first request
+            self._rule_pool.start()
+        logger.info(f"Model registry started with models: {', '.join(self._instances)}")
+
+    def get(self, name: str) -> SQLAnalyzerModel:
+        """Return the shared instance of a model, building it on first use
+
+        Raises:
+            KeyError: If no model is registered under the given name
+        """
+        name = name.lower()
+        model = self._instances.get(name)
+        if model is not None:
+            return model
+
+        model_class = self._model_map[name]
+        with self._lock:
+            # Another request may have built the model while we waited for the lock
+            model = self._instances.get(name)
+            if model is None:
+                with stage_timer(name, "build").time():
+                    if hasattr(model_class, 'from_registry'):
+                        model = model_class.from_registry(self)
+                    else:
+                        model = model_class()
+                if model.micro_batch:
+                    model = ScheduledModel(model)
+                elif model.cpu_bound and self.rule_executor == "process":
+                    model = PooledModel(model, self.rule_pool(), name)
+                self._instances[name] = model
+        return model
+
+    def instances(self) -> Dict[str, SQLAnalyzerModel]:
+        """Return the models built so far, by name"""
+        with self._lock:
+            return dict(self._instances)
+
+    def rule_pool(self) -> RuleProcessPool:
+        """Return the process pool shared by the rule models, creating it on first use"""
+        with self._lock:
+            if self._rule_pool is None:
+                self._rule_pool = RuleProcessPool()
+            return self._rule_pool
+
+    def shutdown(self) -> None:
+        """Close and discard every model instance"""
+        with self._lock:
+            instances, self._instances = self._instances, {}
+            rule_pool, self._rule_pool = self._rule_pool, None
+        if rule_pool is not None:
+            rule_pool.close()
+        for name, model in instances.items():
+            try:
+                model.close()
+            except Exception as e:
+                logger.warning(f"Failed to close model '{name}': {str(e)}")
+        logger.info("Model registry shut down")
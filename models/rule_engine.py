@@ -0,0 +1,136 @@
+"""
+Single-pass feature extraction for the rule-based SQL analyzers.
+
+All patterns are compiled once at import time and combined into one
+alternation, so each statement is lowercased once and scanned once. The
+resulting feature set is shared by the safety, performance and risk rules.
+
+The scan runs in time linear in the statement: every alternative of the
+pattern starts with a literal, and the only variable-length parts (the
+whitespace after SELECT, ORDER and GROUP) are runs that belong to one match
+attempt each, so no text is re-examined by more than one failed attempt.
+Large inputs are still bounded by a RuleBudget, checked as matches are
+consumed, so a multi-megabyte paste cannot hold a worker for long.
+"""
+
+from typing import FrozenSet, Optional
+import math
+import re
+import time
+
+# Statement keywords matched as whole words, in reporting order
+KEYWORDS = ("drop", "truncate", "delete", "update", "grant", "revoke", "alter", "insert")
+
+# Literal substrings whose mere presence is a feature (matched anywhere, as
+# the original rules did with unanchored searches)
+_SUBSTRING_FEATURES = (
+    ("select", "select"),
+    ("where", "where"),
+    ("join", "join"),
+    ("on", "join_condition"),
+    ("using", "join_condition"),
+    ("limit", "limit"),
+    ("top", "limit"),
+)
+
+# One alternation over every anchor the rules care about. Nothing in it can
+# hide another feature: no keyword ends with a prefix of another alternative,
+# ORDER/GROUP BY consume only their first word, and function calls are found
+# from the "(" by looking back, so "drop(" still counts as a call. Word
+# boundaries for keywords are checked on the match instead of with \b, which
+# keeps the pattern a plain literal alternation that the regex engine scans
+# quickly.
+_FEATURE_PATTERN = re.compile(
+    "|".join(KEYWORDS)
+    + r"|select\s+\*|order(?=\s+by)|group(?=\s+by)|count\(\*\)|\("
+)
+
+_KEYWORD_SET = frozenset(KEYWORDS)
+
+
+# Matches processed between two looks at the clock
+BUDGET_CHECK_INTERVAL = 1024
+
+
+class RuleBudget:
+    """Wall-clock allowance for analyzing one statement, checked cooperatively
+
+    Rules poll expired() every BUDGET_CHECK_INTERVAL steps and stop early
+    once it returns True; exhausted then records that the result is partial.
+    A budget of 0 seconds or less never expires.
+    """
+
+    __slots__ = ("seconds", "deadline", "exhausted")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.perf_counter() + seconds if seconds > 0 else math.inf
+        self.exhausted = False
+
+    def expired(self) -> bool:
+        if not self.exhausted and time.perf_counter() >= self.deadline:
+            self.exhausted = True
+        return self.exhausted
+
+
+def _is_word_char(char: str) -> bool:
+    """Return True if char matches the regex class \\w"""
+    return char.isalnum() or char == "_"
+
+
+def _is_call(text: str, paren: int) -> bool:
+    """Return True if the "(" at index paren follows a word (the pattern \\w\\s*\\()"""
+    index = paren - 1
+    while index >= 0 and text[index].isspace():
+        index -= 1
+    return index >= 0 and _is_word_char(text[index])
+
+
+def scan(sql_query: str, budget: Optional[RuleBudget] = None) -> FrozenSet[str]:
+    """Scan a SQL statement once and return the set of rule features it contains
+
+    Feature names are the lowercase keywords in KEYWORDS plus:
+    quote, comment, select, select_star, where, join, join_condition,
+    count_star, group_by, order_by, limit and function.
+
+    When the budget runs out the scan stops and returns the features found
+    so far; the substring features below are cheap and always checked.
+    """
+    text = sql_query.lower()
+    length = len(text)
+    features = set()
+    add = features.add
+
+    for count, match in enumerate(_FEATURE_PATTERN.finditer(text), 1):
+        if budget is not None and count % BUDGET_CHECK_INTERVAL == 0 and budget.expired():
+            break
+        token = match.group()
+        if token == "(":
+            if "function" not in features and _is_call(text, match.start()):
+                add("function")
+        elif token in _KEYWORD_SET:
+            start, end = match.span()
+            if (start == 0 or not _is_word_char(text[start - 1])) and \
+                    (end == length or not _is_word_char(text[end])):
+                add(token)
+        elif token == "order":
+            add("order_by")
+        elif token == "group":
+            add("group_by")
+        elif token == "count(*)":
+            # COUNT(*) is itself a function call
+            add("count_star")
+            add("function")
+        else:
+            add("select_star")
+
+    for substring, feature in _SUBSTRING_FEATURES:
+        if substring in text:
+            add(feature)
+
+    if "'" in sql_query or '"' in sql_query:
+        add("quote")
+    if "--" in sql_query or "/*" in sql_query:
+        add("comment")
+
+    return frozenset(features)
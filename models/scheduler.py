@@ -0,0 +1,271 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator, Set, Tuple
+import asyncio
+import math
+import os
+import time
+import weakref
+from .base_model import SQLAnalyzerModel
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a backend's queue is full; retry_after estimates when to try again (seconds)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM backend is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SchedulerSlot:
+    """A place in a BatchScheduler's queue, held by one streamed analysis
+
+    Counted in the queue from the moment it is reserved; entering it waits for
+    one of the scheduler's concurrency slots, leaving it frees both.
+    """
+
+    def __init__(self, scheduler: "BatchScheduler", loop: asyncio.AbstractEventLoop):
+        self._scheduler = scheduler
+        self._loop = loop
+        self._released = False
+
+    async def __aenter__(self) -> "SchedulerSlot":
+        await self._scheduler._semaphore.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._scheduler._semaphore.release()
+        self.release()
+
+    def release(self) -> None:
+        """Leave the queue; safe to call more than once"""
+        if self._released:
+            return
+        self._released = True
+        # Queue state is reset when the scheduler moves to another event loop
+        if self._scheduler._loop is self._loop:
+            self._scheduler._queued -= 1
+
+
+class BatchScheduler:
+    """
+    Micro-batching scheduler for one LLM backend.
+
+    Single-statement requests that arrive within max_wait seconds of each
+    other are coalesced into batches of up to max_batch_size statements,
+    which are analyzed with one batched call; each caller receives its own
+    result. At most max_concurrency batches run against the backend at once.
+    When max_queue statements are already waiting or running, new requests
+    are rejected with SchedulerBusyError instead of queueing without bound.
+
+    Settings default to the LLM_BATCH_MAX_SIZE, LLM_BATCH_MAX_WAIT_MS,
+    LLM_MAX_CONCURRENCY and LLM_MAX_QUEUE environment variables. Queue state
+    belongs to the running event loop and is reset if the loop changes.
+    """
+
+    def __init__(self,
+                 analyze_batch: Callable[[List[str]], Awaitable[List[Dict[str, Any]]]],
+                 max_batch_size: Optional[int] = None,
+                 max_wait: Optional[float] = None,
+                 max_concurrency: Optional[int] = None,
+                 max_queue: Optional[int] = None):
+        self._analyze_batch = analyze_batch
+        self.max_batch_size = max(1, max_batch_size if max_batch_size is not None else int(os.getenv('LLM_BATCH_MAX_SIZE', '8')))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('LLM_BATCH_MAX_WAIT_MS', '20')) / 1000
+        self.max_concurrency = max(1, max_concurrency if max_concurrency is not None else int(os.getenv('LLM_MAX_CONCURRENCY', '2')))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('LLM_MAX_QUEUE', '64'))
+
+        # Moving average of batch latency, used to estimate Retry-After
+        self.batch_latency = 1.0
+        self.batches = 0
+        self.rejected = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._queued = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _bind(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._pending = []
+            self._queued = 0
+            self._timer = None
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._tasks = set()
+        return loop
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained"""
+        waves = self._queued / (self.max_batch_size * self.max_concurrency)
+        return max(1, math.ceil(self.batch_latency * max(1.0, waves)))
+
+    async def submit(self, sql_query: str) -> Dict[str, Any]:
+        """Analyze one statement as part of the next batch; raises SchedulerBusyError when the queue is full"""
+        loop = self._bind()
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusyError(self.retry_after())
+
+        future = loop.create_future()
+        self._pending.append((sql_query, future))
+        self._queued += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def submit_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Analyze a caller-built batch in chunks of max_batch_size, within the concurrency limit
+
+        The caller has already grouped these statements, so they are not
+        coalesced with other requests, but they count against the queue limit:
+        raises SchedulerBusyError when the batch does not fit in the queue. A
+        batch larger than the whole queue is only accepted when the queue is empty.
+        """
+        self._bind()
+        if not sql_queries:
+            return []
+        if self._queued + len(sql_queries) > self.max_queue and (self._queued or self.max_queue <= 0):
+            self.rejected += 1
+            raise SchedulerBusyError(self.retry_after())
+
+        self._queued += len(sql_queries)
+        try:
+            chunks = [sql_queries[i:i + self.max_batch_size] for i in range(0, len(sql_queries), self.max_batch_size)]
+            chunk_results = await asyncio.gather(*(self._limited(chunk) for chunk in chunks))
+        finally:
+            self._queued -= len(sql_queries)
+        return [result for results in chunk_results for result in results]
+
+    def reserve(self) -> SchedulerSlot:
+        """Take a place in the queue for one streamed analysis; raises SchedulerBusyError when the queue is full"""
+        loop = self._bind()
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusyError(self.retry_after())
+        self._queued += 1
+        return SchedulerSlot(self, loop)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batching counters"""
+        return {
+            "queued": self._queued,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "batch_latency": self.batch_latency,
+            "max_batch_size": self.max_batch_size,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = self._loop.create_task(self._run(batch))
+            # Keep a reference so the task is not garbage collected while running
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await self._limited([sql_query for sql_query, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._queued -= len(batch)
+
+    async def _limited(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        async with self._semaphore:
+            started = time.perf_counter()
+            results = await self._analyze_batch(sql_queries)
+            self.batch_latency = 0.8 * self.batch_latency + 0.2 * (time.perf_counter() - started)
+            self.batches += 1
+            return results
+
+
+class ScheduledModel(SQLAnalyzerModel):
+    """
+    Puts a BatchScheduler in front of an LLM model.
+
+    Asynchronous analyses go through the scheduler, and each streamed analysis
+    holds one of its slots while it runs; synchronous analyses, cache settings
+    and every other attribute are those of the wrapped model.
+    """
+
+    def __init__(self, model: SQLAnalyzerModel, scheduler: Optional[BatchScheduler] = None):
+        self.model = model
+        self.scheduler = scheduler or BatchScheduler(model.aanalyze_batch)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not found on the wrapper itself
+        return getattr(self.model, name)
+
+    @property
+    def cache_results(self) -> bool:
+        return self.model.cache_results
+
+    @property
+    def cache_by_fingerprint(self) -> bool:
+        return self.model.cache_by_fingerprint
+
+    def cache_version(self) -> str:
+        return self.model.cache_version()
+
+    def analyze(self, sql_query: str) -> Dict[str, Any]:
+        return self.model.analyze(sql_query)
+
+    def analyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        return self.model.analyze_batch(sql_queries)
+
+    async def aanalyze(self, sql_query: str) -> Dict[str, Any]:
+        return await self.scheduler.submit(sql_query)
+
+    async def aanalyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        return await self.scheduler.submit_batch(sql_queries)
+
+    def astream_analyze(self, sql_query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the wrapped model's analysis within the scheduler's limits
+
+        The place in the queue is reserved by this call, before any event is
+        requested, so a full queue raises SchedulerBusyError while the caller
+        can still answer 429.
+        """
+        slot = self.scheduler.reserve()
+        events = self._stream(slot, sql_query)
+        # A stream that is discarded without ever being started gives its place back too
+        weakref.finalize(events, slot.release)
+        return events
+
+    async def _stream(self, slot: SchedulerSlot, sql_query: str) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            async with slot:
+                async for event in self.model.astream_analyze(sql_query):
+                    yield event
+        finally:
+            slot.release()
+
+    def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
+        return self.model.get_safety_issues(sql_query)
+
+    def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
+        return self.model.get_performance_suggestions(sql_query)
+
+    def calculate_risk_score(self, sql_query: str) -> int:
+        return self.model.calculate_risk_score(sql_query)
+
+    def close(self) -> None:
+        self.model.close()
@@ -0,0 +1,205 @@
+"""
+Schema-aware rules for the rule-based SQL analyzers.
+
+Given a Catalog of the tables and indexes that actually exist, these rules
+check each SELECT, UPDATE and DELETE of a statement's cached syntax tree:
+whether a function in WHERE wraps a column that an index could have served,
+whether a table is filtered only on columns that lead no index, and whether
+an equality join probes a table on a column that leads no index. Columns are
+resolved through the table aliases of their own query block; a column that
+cannot be resolved to exactly one catalog table is left to the generic rules.
+
+Tables whose statistics show fewer than SCHEMA_SMALL_TABLE_ROWS rows are
+scanned cheaply and are not reported.
+"""
+
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlglot import exp
+
+from utils.catalog import Catalog, normalize_expression
+from utils.sql_parser import parse
+from .rule_engine import BUDGET_CHECK_INTERVAL, RuleBudget
+
+SMALL_TABLE_ROWS = int(os.getenv('SCHEMA_SMALL_TABLE_ROWS', '1000'))
+
+# Comparisons an index on the compared column can serve
+_INDEXABLE_COMPARISONS = (exp.EQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.In, exp.Between, exp.Like)
+
+
+class SchemaFindings(NamedTuple):
+    """What the schema rules found in one SQL string"""
+    # (table, column, index) of index-leading columns wrapped in a function in WHERE
+    indexed_functions: Tuple[Tuple[str, str, str], ...]
+    # Whether every function-wrapped column in WHERE was resolved against the catalog
+    functions_resolved: bool
+    # (table, filtered columns, row count) of tables filtered on no index-leading column
+    unindexed_filters: Tuple[Tuple[str, Tuple[str, ...], Optional[int]], ...]
+    # (table, column, row count) of equality join keys that lead no index
+    unindexed_join_keys: Tuple[Tuple[str, str, Optional[int]], ...]
+
+
+def _outside_subqueries(node: exp.Expression):
+    """Nodes of a clause, without descending into the subqueries it contains"""
+    for child, _, _ in node.walk(prune=lambda n, *_: isinstance(n, exp.Subqueryable) and n is not node):
+        if not isinstance(child, exp.Subqueryable):
+            yield child
+
+
+class _SchemaChecker:
+    """Applies the schema rules to every query block of one or more syntax trees"""
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self.indexed_functions: Dict[Tuple[str, str, str], None] = {}
+        self.function_columns = 0
+        self.unresolved_functions = False
+        self.unindexed_filters: Dict[Tuple[str, Tuple[str, ...], Optional[int]], None] = {}
+        self.unindexed_join_keys: Dict[Tuple[str, str, Optional[int]], None] = {}
+
+    def scope(self, node: exp.Expression) -> Dict[str, Optional[str]]:
+        """Alias (or name) of every table the query block reads -> catalog table name, None if unknown"""
+        sources = [node.this] if isinstance(node, (exp.Update, exp.Delete)) else []
+        from_ = node.args.get("from")
+        if from_ is not None:
+            sources.append(from_.this)
+        sources.extend(join.this for join in node.args.get("joins") or ())
+
+        scope: Dict[str, Optional[str]] = {}
+        for source in sources:
+            if not isinstance(source, exp.Expression):
+                continue
+            table = self.catalog.table(source.name.lower()) if isinstance(source, exp.Table) else None
+            scope[source.alias_or_name.lower()] = table.name if table is not None else None
+        return scope
+
+    def resolve(self, column: exp.Column, scope: Dict[str, Optional[str]]) -> Optional[Tuple[str, str, str]]:
+        """(alias, table, column) of a column reference, or None if it is not a known catalog column"""
+        name = column.name.lower()
+        qualifier = column.table.lower()
+        if qualifier:
+            table = scope.get(qualifier)
+            if table is not None and self.catalog.has_column(table, name):
+                return qualifier, table, name
+            return None
+        # Unqualified: only resolvable when every source is known and exactly one has the column
+        if None in scope.values():
+            return None
+        owners = [(alias, table) for alias, table in scope.items() if self.catalog.has_column(table, name)]
+        if len(owners) != 1:
+            return None
+        return owners[0][0], owners[0][1], name
+
+    def large(self, table: str) -> bool:
+        rows = self.catalog.table(table).row_count
+        return rows is None or rows >= SMALL_TABLE_ROWS
+
+    def check(self, node: exp.Expression) -> None:
+        scope = self.scope(node)
+        if not scope:
+            return
+        driving = next(iter(scope))
+        filters: Dict[str, List[str]] = {}
+
+        where = node.args.get("where")
+        if where is not None:
+            for predicate in _outside_subqueries(where):
+                if isinstance(predicate, exp.Func) and not isinstance(predicate.parent, exp.Func):
+                    self.check_function(predicate, scope)
+                elif isinstance(predicate, _INDEXABLE_COMPARISONS):
+                    self.check_comparison(predicate, scope, driving, filters)
+        for join in node.args.get("joins") or ():
+            condition = join.args.get("on")
+            if condition is not None:
+                for predicate in _outside_subqueries(condition):
+                    if isinstance(predicate, exp.EQ):
+                        self.check_comparison(predicate, scope, driving, filters)
+
+        for table, columns in filters.items():
+            if self.large(table) and not any(self.catalog.leading_index(table, column) for column in columns):
+                self.unindexed_filters[(table, tuple(columns), self.catalog.table(table).row_count)] = None
+
+    def check_function(self, function: exp.Func, scope: Dict[str, Optional[str]]) -> None:
+        columns = [node for node in _outside_subqueries(function) if isinstance(node, exp.Column)]
+        if not columns:
+            return
+        expression = None
+        for column in columns:
+            self.function_columns += 1
+            resolved = self.resolve(column, scope)
+            if resolved is None:
+                self.unresolved_functions = True
+                continue
+            _, table, name = resolved
+            if expression is None:
+                expression = normalize_expression(function)
+            # An index on the expression itself serves the predicate as written
+            if self.catalog.leading_index(table, expression) is not None:
+                continue
+            index = self.catalog.leading_index(table, name)
+            if index is not None:
+                self.indexed_functions[(table, name, index.name)] = None
+
+    def check_comparison(self, comparison: exp.Expression, scope: Dict[str, Optional[str]], driving: str,
+                         filters: Dict[str, List[str]]) -> None:
+        left = comparison.this
+        right = comparison.args.get("expression")
+        if isinstance(left, exp.Column) and isinstance(right, exp.Column):
+            if isinstance(comparison, exp.EQ):
+                self.check_join_key(left, right, scope, driving)
+            return
+        if not isinstance(left, exp.Column) and isinstance(right, exp.Column):
+            # 5 < t.x: the column is on the right
+            left, right = right, left
+        if not isinstance(left, exp.Column):
+            return
+        operands = [right] + list(comparison.args.get("expressions") or ()) + \
+            [comparison.args.get("low"), comparison.args.get("high")]
+        if any(operand is not None and operand.find(exp.Column) is not None for operand in operands):
+            return
+        resolved = self.resolve(left, scope)
+        if resolved is not None:
+            columns = filters.setdefault(resolved[1], [])
+            if resolved[2] not in columns:
+                columns.append(resolved[2])
+
+    def check_join_key(self, left: exp.Column, right: exp.Column, scope: Dict[str, Optional[str]],
+                       driving: str) -> None:
+        sides = [self.resolve(left, scope), self.resolve(right, scope)]
+        if None in sides or sides[0][0] == sides[1][0]:
+            return
+        # Each table joined to the driving one is probed on its side of the key
+        for alias, table, column in sides:
+            if alias != driving and self.large(table) and self.catalog.leading_index(table, column) is None:
+                self.unindexed_join_keys[(table, column, self.catalog.table(table).row_count)] = None
+
+    def findings(self) -> SchemaFindings:
+        return SchemaFindings(
+            tuple(self.indexed_functions),
+            self.function_columns > 0 and not self.unresolved_functions,
+            tuple(self.unindexed_filters),
+            tuple(self.unindexed_join_keys)
+        )
+
+
+def check_schema(sql_query: str, catalog: Catalog, budget: Optional[RuleBudget] = None) -> Optional[SchemaFindings]:
+    """Apply the schema rules to a SQL string; None if the catalog is empty or the text does not parse
+
+    When the budget runs out the walk stops and the findings so far are returned.
+    """
+    if not len(catalog):
+        return None
+    statements = parse(sql_query)
+    if not statements:
+        return None
+
+    checker = _SchemaChecker(catalog)
+    visited = 0
+    for statement in statements:
+        for node, _, _ in statement.walk():
+            visited += 1
+            if budget is not None and visited % BUDGET_CHECK_INTERVAL == 0 and budget.expired():
+                return checker.findings()
+            if isinstance(node, (exp.Select, exp.Update, exp.Delete)):
+                checker.check(node)
+    return checker.findings()
@@ -1,10 +1,28 @@
 from typing import Dict, Any, List
 from .base_model import SQLAnalyzerModel
+from utils.findings import Finding, define_rule
 import re
 
+INJECTION_ISSUE = define_rule("simple.injection", "safety", "可能存在SQL注入风险", "high", "使用参数化查询替代字符串拼接")
+
+# {0} 为危险操作的关键字
+DANGEROUS_OPERATION_ISSUE = define_rule("simple.dangerous_operation", "safety", "包含危险操作: {0}", "high",
+                                        "确保有适当的权限控制和数据备份")
+
+SELECT_STAR_SUGGESTION = define_rule("simple.select_star", "performance", "避免使用SELECT *", "medium", "明确指定需要的列名")
+
+MISSING_WHERE_SUGGESTION = define_rule("simple.missing_where", "performance", "缺少WHERE子句", "high",
+                                       "添加WHERE子句以限制影响范围")
+
 class SimpleModel(SQLAnalyzerModel):
     """基于规则的简单SQL分析模型"""
     
+    # 规则分析比缓存查找更快，不缓存结果
+    cache_results = False
+    
+    # 纯CPU规则分析，可分发到进程池
+    cpu_bound = True
+    
     def analyze(self, sql_query: str) -> Dict[str, Any]:
         """分析SQL查询并返回分析结果"""
         safety_issues = self.get_safety_issues(sql_query)
@@ -19,54 +37,41 @@ class SimpleModel(SQLAnalyzerModel):
             "details": "由简单规则模型分析生成"
         }
     
-    def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
+    def get_safety_issues(self, sql_query: str) -> List[Finding]:
         issues = []
         
         # 检查SQL注入风险
         if "'" in sql_query or "\"" in sql_query:
-            issues.append({
-                "issue": "可能存在SQL注入风险",
-                "severity": "high",
-                "recommendation": "使用参数化查询替代字符串拼接"
-            })
+            issues.append(Finding(INJECTION_ISSUE))
         
         # 检查危险操作
+        upper_query = sql_query.upper()  # 只转换一次，各规则的正则都是线性时间
         dangerous_keywords = ["DROP", "TRUNCATE", "DELETE", "UPDATE"]
         for keyword in dangerous_keywords:
-            if re.search(rf"\b{keyword}\b", sql_query.upper()):
-                issues.append({
-                    "issue": f"包含危险操作: {keyword}",
-                    "severity": "high",
-                    "recommendation": "确保有适当的权限控制和数据备份"
-                })
+            if re.search(rf"\b{keyword}\b", upper_query):
+                issues.append(Finding(DANGEROUS_OPERATION_ISSUE, (keyword,)))
         
         return issues
     
-    def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
+    def get_performance_suggestions(self, sql_query: str) -> List[Finding]:
         suggestions = []
+        upper_query = sql_query.upper()
         
         # 检查SELECT *
-        if re.search(r"SELECT\s+\*", sql_query.upper()):
-            suggestions.append({
-                "suggestion": "避免使用SELECT *",
-                "impact": "medium",
-                "recommendation": "明确指定需要的列名"
-            })
+        if re.search(r"SELECT\s+\*", upper_query):
+            suggestions.append(Finding(SELECT_STAR_SUGGESTION))
         
         # 检查是否缺少WHERE子句
-        if not re.search(r"\bWHERE\b", sql_query.upper()) and (
-            re.search(r"\bUPDATE\b", sql_query.upper()) or 
-            re.search(r"\bDELETE\b", sql_query.upper())):
-            suggestions.append({
-                "suggestion": "缺少WHERE子句",
-                "impact": "high",
-                "recommendation": "添加WHERE子句以限制影响范围"
-            })
+        if not re.search(r"\bWHERE\b", upper_query) and (
+            re.search(r"\bUPDATE\b", upper_query) or 
+            re.search(r"\bDELETE\b", upper_query)):
+            suggestions.append(Finding(MISSING_WHERE_SUGGESTION))
         
         return suggestions
     
     def calculate_risk_score(self, sql_query: str) -> int:
         score = 0
+        upper_query = sql_query.upper()
         
         # 基于关键字评估风险
         high_risk_keywords = ["DROP", "TRUNCATE", "DELETE", "UPDATE"]
@@ -74,13 +79,13 @@ class SimpleModel(SQLAnalyzerModel):
         
         # 高风险操作
         for keyword in high_risk_keywords:
-            if re.search(rf"\b{keyword}\b", sql_query.upper()):
+            if re.search(rf"\b{keyword}\b", upper_query):
                 score = 70  # 设置基础分数为70
                 break  # 一旦发现高风险操作，立即设置基础分数
         
         # 中等风险操作
         for keyword in medium_risk_keywords:
-            if re.search(rf"\b{keyword}\b", sql_query.upper()):
+            if re.search(rf"\b{keyword}\b", upper_query):
                 score += 15
         
         # SQL注入风险
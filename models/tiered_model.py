@@ -0,0 +1,209 @@
+from typing import Dict, Any, List, Optional
+import asyncio
+import os
+from .base_model import SQLAnalyzerModel
+from .advanced_model import AdvancedModel
+from utils.sql_parser import parse, too_large_to_parse
+from utils.logger import logger
+from utils.metrics import stage_timer
+
+# Severity order used to compare issues against the escalation threshold
+SEVERITY_RANKS = {"low": 1, "medium": 2, "high": 3}
+
+_SCREEN_SECONDS = stage_timer("tiered", "screen")
+_ESCALATE_SECONDS = stage_timer("tiered", "escalate")
+
+
+class TieredModel(SQLAnalyzerModel):
+    """
+    Two-tier analysis: rules first, an LLM only when the rules say it is worth it.
+
+    Every statement is screened by the rule-based AdvancedModel. The statement
+    is escalated to the LLM model when the screen's risk score, the severity
+    of any safety issue, or the size of the statement's syntax tree reaches
+    its threshold, when the statement does not parse, or when the screen ran
+    out of its time budget and returned a partial result. Everything else is
+    answered by the rules alone. Each result records the tier that answered
+    it in "tier" ("rules" or "llm") and, when escalated, why.
+
+    Thresholds come from the constructor or from the TIERED_RISK_THRESHOLD,
+    TIERED_SEVERITY_THRESHOLD and TIERED_COMPLEXITY_THRESHOLD environment
+    variables; TIERED_LLM_MODEL names the registered LLM model to escalate to.
+    """
+
+    def __init__(self,
+                 screen: Optional[SQLAnalyzerModel] = None,
+                 escalation: Optional[SQLAnalyzerModel] = None,
+                 risk_threshold: Optional[int] = None,
+                 severity_threshold: Optional[str] = None,
+                 complexity_threshold: Optional[int] = None):
+        self.screen = screen or AdvancedModel()
+        if escalation is None:
+            from .ollama_model import OllamaModel
+            escalation = OllamaModel()
+        self.escalation = escalation
+        self.risk_threshold = risk_threshold if risk_threshold is not None else int(os.getenv('TIERED_RISK_THRESHOLD', '30'))
+        severity = severity_threshold or os.getenv('TIERED_SEVERITY_THRESHOLD', 'high')
+        if severity.lower() not in SEVERITY_RANKS:
+            raise ValueError(f"Invalid severity threshold: {severity}")
+        self.severity_threshold = severity.lower()
+        self.complexity_threshold = complexity_threshold if complexity_threshold is not None else int(os.getenv('TIERED_COMPLEXITY_THRESHOLD', '60'))
+
+    @classmethod
+    def from_registry(cls, registry) -> "TieredModel":
+        """Build a tiered model from the registry's shared rule and LLM instances"""
+        return cls(
+            screen=registry.get('advanced'),
+            escalation=registry.get(os.getenv('TIERED_LLM_MODEL', 'ollama'))
+        )
+
+    def cache_version(self) -> str:
+        """Both tiers and the thresholds between them determine the output"""
+        return ":".join((
+            super().cache_version(),
+            self.screen.cache_version(),
+            self.escalation.cache_version(),
+            f"{self.risk_threshold}/{self.severity_threshold}/{self.complexity_threshold}"
+        ))
+
+    @staticmethod
+    def complexity(sql_query: str) -> Optional[int]:
+        """Number of syntax tree nodes in the statement, or None if it does not parse"""
+        statements = parse(sql_query)
+        if not statements:
+            return None
+        return sum(1 for statement in statements for _ in statement.walk())
+
+    def escalation_reasons(self, sql_query: str, screened: Dict[str, Any]) -> List[str]:
+        """Return why the screened statement needs the LLM tier; empty if it does not"""
+        reasons = []
+        if screened.get("risk_score", 0) >= self.risk_threshold:
+            reasons.append(f"risk score {screened['risk_score']} >= {self.risk_threshold}")
+
+        threshold_rank = SEVERITY_RANKS[self.severity_threshold]
+        for issue in screened.get("safety_issues", []):
+            if SEVERITY_RANKS.get(str(issue.get("severity", "")).lower(), 0) >= threshold_rank:
+                reasons.append(f"{issue.get('severity')} severity issue: {issue.get('issue')}")
+                break
+
+        if screened.get("partial"):
+            reasons.append("rule screen exhausted its time budget")
+
+        complexity = self.complexity(sql_query)
+        if complexity is None:
+            reasons.append("statement too large to parse" if too_large_to_parse(sql_query)
+                           else "statement could not be parsed")
+        elif complexity >= self.complexity_threshold:
+            reasons.append(f"complexity {complexity} >= {self.complexity_threshold}")
+        return reasons
+
+    def analyze(self, sql_query: str) -> Dict[str, Any]:
+        """Screen the statement with rules and escalate to the LLM if needed"""
+        with _SCREEN_SECONDS.time():
+            screened = self.screen.analyze(sql_query)
+        reasons = self.escalation_reasons(sql_query, screened)
+        if not reasons:
+            return self._answered_by_rules(screened)
+        try:
+            with _ESCALATE_SECONDS.time():
+                result = self.escalation.analyze(sql_query)
+        except Exception as e:
+            result = self._escalation_error(e)
+        return self._answered_by_llm(screened, result, reasons)
+
+    async def aanalyze(self, sql_query: str) -> Dict[str, Any]:
+        """Screen off the event loop, then escalate with the LLM's non-blocking path"""
+        loop = asyncio.get_running_loop()
+        with _SCREEN_SECONDS.time():
+            screened = await self.screen.aanalyze(sql_query)
+            # The complexity check parses the statement, which is CPU work too
+            reasons = await loop.run_in_executor(None, self.escalation_reasons, sql_query, screened)
+        if not reasons:
+            return self._answered_by_rules(screened)
+        try:
+            with _ESCALATE_SECONDS.time():
+                result = await self.escalation.aanalyze(sql_query)
+        except Exception as e:
+            result = self._escalation_error(e)
+        return self._answered_by_llm(screened, result, reasons)
+
+    def analyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Screen the whole batch, then send only the escalated statements to the LLM in one batch"""
+        with _SCREEN_SECONDS.time():
+            screened = self.screen.analyze_batch(sql_queries)
+        escalated = self._escalated(sql_queries, screened)
+        llm_results = []
+        if escalated:
+            try:
+                with _ESCALATE_SECONDS.time():
+                    llm_results = self.escalation.analyze_batch([sql_queries[i] for i in escalated])
+            except Exception as e:
+                llm_results = [self._escalation_error(e)] * len(escalated)
+        return self._merge(screened, escalated, llm_results)
+
+    async def aanalyze_batch(self, sql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Non-blocking variant of analyze_batch"""
+        loop = asyncio.get_running_loop()
+        with _SCREEN_SECONDS.time():
+            screened = await self.screen.aanalyze_batch(sql_queries)
+            escalated = await loop.run_in_executor(None, self._escalated, sql_queries, screened)
+        llm_results = []
+        if escalated:
+            try:
+                with _ESCALATE_SECONDS.time():
+                    llm_results = await self.escalation.aanalyze_batch([sql_queries[i] for i in escalated])
+            except Exception as e:
+                llm_results = [self._escalation_error(e)] * len(escalated)
+        return self._merge(screened, escalated, llm_results)
+
+    def get_safety_issues(self, sql_query: str) -> List[Dict[str, Any]]:
+        """Get safety issues from whichever tier answers the statement"""
+        return self.analyze(sql_query)["safety_issues"]
+
+    def get_performance_suggestions(self, sql_query: str) -> List[Dict[str, Any]]:
+        """Get performance suggestions from whichever tier answers the statement"""
+        return self.analyze(sql_query)["performance_suggestions"]
+
+    def calculate_risk_score(self, sql_query: str) -> int:
+        """Get the risk score from whichever tier answers the statement"""
+        return self.analyze(sql_query)["risk_score"]
+
+    def _escalated(self, sql_queries: List[str], screened: List[Dict[str, Any]]) -> Dict[int, List[str]]:
+        """Map the index of every statement that needs the LLM tier to its escalation reasons"""
+        escalated = {}
+        for index, (sql_query, result) in enumerate(zip(sql_queries, screened)):
+            reasons = self.escalation_reasons(sql_query, result)
+            if reasons:
+                escalated[index] = reasons
+        return escalated
+
+    def _merge(self, screened: List[Dict[str, Any]], escalated: Dict[int, List[str]],
+               llm_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = [self._answered_by_rules(result) for result in screened]
+        for (index, reasons), result in zip(escalated.items(), llm_results):
+            results[index] = self._answered_by_llm(screened[index], result, reasons)
+        return results
+
+    @staticmethod
+    def _answered_by_rules(screened: Dict[str, Any]) -> Dict[str, Any]:
+        return {**screened, "tier": "rules"}
+
+    @staticmethod
+    def _answered_by_llm(screened: Dict[str, Any], result: Optional[Dict[str, Any]],
+                         reasons: List[str]) -> Dict[str, Any]:
+        # A failed LLM call still returns the rule screen, marked as an error so it is not cached
+        if not result or result.get("error"):
+            detail = result.get("details", "") if result else "no result"
+            logger.warning(f"LLM escalation failed, answering with rules: {detail}")
+            return {
+                **screened,
+                "tier": "rules",
+                "escalation_reasons": reasons,
+                "details": f"{screened.get('details', '')} (LLM escalation failed: {detail})",
+                "error": True
+            }
+        return {**result, "tier": "llm", "escalation_reasons": reasons}
+
+    @staticmethod
+    def _escalation_error(e: Exception) -> Dict[str, Any]:
+        return {"error": True, "details": str(e)}
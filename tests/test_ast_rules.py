@@ -0,0 +1,62 @@
+import unittest
+from models.ast_rules import extract_features
+from models.advanced_model import AdvancedModel
+from utils.sql_parser import parse
+
+
+class TestASTRules(unittest.TestCase):
+    def test_parse_is_cached(self):
+        """测试同一语句只解析一次"""
+        sql = "SELECT id FROM users WHERE id = 42"
+        self.assertIs(parse(sql), parse(sql))
+        self.assertIsNone(parse("SELECT (("))
+        self.assertEqual(parse("SELECT 1;"), parse("SELECT 1"))
+
+    def test_no_substring_false_positives(self):
+        """测试列名和标识符不再被误判为关键字或字符串"""
+        features = extract_features('SELECT version, "updated" FROM t WHERE id = 1')
+        self.assertNotIn("join_condition", features)
+        self.assertNotIn("quote", features)
+        self.assertNotIn("update", features)
+        self.assertNotIn("select", extract_features("SELECT 1"))
+
+    def test_join_conditions(self):
+        """测试按语法树判断连接条件"""
+        self.assertIn("join_condition", extract_features("SELECT a.x FROM a JOIN b ON a.id = b.id"))
+        self.assertIn("join_condition", extract_features("SELECT a.x FROM a JOIN b USING (id)"))
+        self.assertIn("join_condition", extract_features("SELECT a.x FROM a, b WHERE a.id = b.id"))
+        self.assertNotIn("join_condition", extract_features("SELECT a.x FROM a, b"))
+        self.assertNotIn("join_condition",
+                         extract_features("SELECT a.x FROM a JOIN b ON a.id = b.id JOIN c"))
+
+    def test_function_on_column_in_where(self):
+        """测试只有WHERE中作用于列的函数才会被标记"""
+        self.assertIn("function", extract_features("SELECT id FROM t WHERE lower(email) = ?"))
+        self.assertNotIn("function", extract_features("SELECT id FROM t WHERE created > now()"))
+        self.assertNotIn("function", extract_features("SELECT lower(email) FROM t WHERE id = 1"))
+        self.assertNotIn("function",
+                         extract_features("SELECT id FROM t WHERE id IN (SELECT max(id) FROM s)"))
+
+    def test_statement_types(self):
+        """测试按语句类型识别危险操作"""
+        self.assertEqual(extract_features("TRUNCATE TABLE logs"), frozenset({"truncate"}))
+        self.assertIn("drop", extract_features("SELECT 1; DROP TABLE users"))
+        self.assertIn("alter", extract_features("ALTER TABLE t ADD COLUMN x INT"))
+        features = extract_features("SELECT row_number() OVER (ORDER BY x) FROM t WHERE x = 1")
+        self.assertNotIn("order_by", features)
+
+    def test_unparsable_sql_falls_back_to_scan(self):
+        """测试无法解析的语句回退到词法扫描"""
+        self.assertIn("revoke", extract_features("REVOKE ALL ON t FROM bob"))
+
+    def test_advanced_model_uses_ast(self):
+        """测试高级模型基于语法树给出结果"""
+        model = AdvancedModel(use_ast=True)
+        result = model.analyze("SELECT u.id FROM users u JOIN orders o ON u.id = o.user_id WHERE u.id = 1")
+        self.assertEqual(result["risk_score"], 0)
+        self.assertEqual(result["performance_suggestions"], [])
+        self.assertNotEqual(model.cache_version(), AdvancedModel(use_ast=False).cache_version())
+
+
+if __name__ == '__main__':
+    unittest.main()
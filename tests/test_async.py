@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app as app_module
+from models import AdvancedModel, OllamaModel, CopilotModel
+from utils.http_client import HTTPPoolConfig
+
+ANALYSIS = {"safety_issues": [], "performance_suggestions": [], "risk_score": 10}
+
+
+def ollama_handler(delay: float):
+    """构造模拟Ollama流式接口的异步处理函数"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        text = json.dumps(ANALYSIS)
+        lines = "\n".join(json.dumps({"response": text[i:i + 7]}) for i in range(0, len(text), 7))
+        return httpx.Response(200, text=lines)
+    return handler
+
+
+class TestAsyncAnalysis(unittest.TestCase):
+    def test_rule_model_runs_off_the_event_loop(self):
+        """测试规则模型的异步接口结果与同步接口一致"""
+        model = AdvancedModel()
+        sql = "SELECT * FROM users"
+        self.assertEqual(asyncio.run(model.aanalyze(sql)), model.analyze(sql))
+        self.assertEqual(asyncio.run(model.aanalyze_batch([sql, sql])), model.analyze_batch([sql, sql]))
+
+    def test_concurrent_ollama_calls_overlap(self):
+        """测试并发的Ollama分析在同一事件循环中重叠执行"""
+        model = OllamaModel()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(ollama_handler(0.2)))
+
+        async def run():
+            with mock.patch('models.ollama_model.get_async_client', return_value=client):
+                return await asyncio.gather(*(model.aanalyze(f"SELECT {i}") for i in range(20)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(result["risk_score"] == 10 for result in results))
+        self.assertLess(elapsed, 2.0)
+
+    def test_batch_chunks_are_limited_to_the_pool_size(self):
+        """测试批量分析同时进行的请求数不超过连接池大小"""
+        model = OllamaModel(batch_size=2, http_config=HTTPPoolConfig(pool_maxsize=3))
+        running, peak = 0, 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return httpx.Response(200, text="")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        async def run():
+            with mock.patch('models.ollama_model.get_async_client', return_value=client):
+                return await model.aanalyze_batch([f"SELECT {i}" for i in range(20)])
+
+        self.assertEqual(len(asyncio.run(run())), 20)
+        self.assertLessEqual(peak, 3)
+
+    def test_copilot_async_token_is_reused(self):
+        """测试Copilot异步路径复用访问令牌"""
+        calls = {"token": 0, "completion": 0}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.method == "GET":
+                calls["token"] += 1
+                return httpx.Response(200, json={"token": "copilot-token", "expires_in": 600})
+            calls["completion"] += 1
+            self.assertEqual(request.headers["Authorization"], "Bearer copilot-token")
+            return httpx.Response(200, text=json.dumps(ANALYSIS))
+
+        with mock.patch.dict('os.environ', {'GITHUB_TOKEN': 'gh-token'}):
+            model = CopilotModel()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        async def run():
+            with mock.patch('models.copilot_model.get_async_client', return_value=client):
+                return await asyncio.gather(*(model.aanalyze("SELECT 1") for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertTrue(all(not result.get("error") for result in results))
+        self.assertEqual(calls, {"token": 1, "completion": 5})
+
+
+class TestAnalyzeEndpoints(unittest.TestCase):
+    def test_analyze_and_batch_endpoints(self):
+        """测试单条和批量分析接口"""
+        with TestClient(app_module.app) as client:
+            response = client.post("/api/analyze", json={"sql": "DROP TABLE users", "model": "advanced"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["issues"][0]["description"], "Dangerous operation: DROP")
+
+            response = client.post("/api/analyze/batch", json={"queries": ["SELECT 1", "DELETE FROM t"], "model": "simple"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["count"], 2)
+
+            response = client.post("/api/analyze", json={"sql": "SELECT 1", "model": "unknown"})
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from benchmarks.api import run_api_benchmarks
+from benchmarks.corpus import SIZES, generate_corpus
+from benchmarks.compare import compare
+from benchmarks.run import run_benchmarks, percentile
+
+
+class TestBenchmarkCorpus(unittest.TestCase):
+    def test_corpus_is_reproducible_and_sized(self):
+        """测试语料按种子可复现且不超过目标大小"""
+        corpus = generate_corpus(SIZES["100kb"], seed=7)
+        self.assertEqual(corpus, generate_corpus(SIZES["100kb"], seed=7))
+        self.assertNotEqual(corpus, generate_corpus(SIZES["100kb"], seed=8))
+        size = sum(len(statement.encode("utf-8")) for statement in corpus)
+        self.assertLessEqual(size, SIZES["100kb"])
+        self.assertGreater(size, SIZES["100kb"] * 0.9)
+        self.assertTrue(any(len(statement) > 1000 for statement in corpus))
+
+    def test_percentile(self):
+        """测试最近秩百分位数"""
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+    def test_run_against_mock_llm(self):
+        """测试基准测试在模拟LLM服务上运行规则模型和LLM模型"""
+        document = run_benchmarks(["simple", "ollama"], ["1kb"], llm_latency=0.0, llm_limit=3,
+                                  memory=True, log=lambda line: None)
+        results = {result["model"]: result for result in document["results"]}
+        self.assertEqual(results["ollama"]["statements"], 3)
+        self.assertEqual(results["simple"]["statements"], len(generate_corpus(SIZES["1kb"])))
+        for result in results.values():
+            self.assertGreater(result["statements_per_sec"], 0)
+            self.assertGreaterEqual(result["p99_ms"], result["p50_ms"])
+            self.assertGreater(result["peak_memory_bytes"], 0)
+        self.assertIn("commit", document["meta"])
+
+    def test_regression_gate(self):
+        """测试吞吐下降或延迟、内存上升超过阈值时判定为回归"""
+        baseline = {("simple", "1kb"): {"statements_per_sec": 1000.0, "p99_ms": 1.0, "peak_memory_bytes": 1000}}
+        current = {("simple", "1kb"): {"statements_per_sec": 850.0, "p99_ms": 1.1, "peak_memory_bytes": 1500}}
+        rows = {row["metric"]: row for row in compare(baseline, current)}
+        self.assertTrue(rows["statements_per_sec"]["regression"])
+        self.assertFalse(rows["p99_ms"]["regression"])
+        self.assertTrue(rows["peak_memory_bytes"]["regression"])
+        relaxed = compare(baseline, current, {"statements_per_sec": 0.2, "peak_memory_bytes": 1.0})
+        self.assertFalse(any(row["regression"] for row in relaxed))
+
+
+class TestApiBenchmark(unittest.TestCase):
+    def test_request_throughput(self):
+        """测试API吞吐基准在进程内驱动单条和批量分析接口"""
+        document = asyncio.run(run_api_benchmarks(["advanced"], ["analyze", "batch"], "1kb", requests=20,
+                                                  concurrency=2, batch_size=5, warmup=5, log=lambda line: None))
+        results = {result["corpus"]: result for result in document["results"]}
+        self.assertEqual(results["api-analyze"]["requests"], 20)
+        self.assertAlmostEqual(results["api-batch"]["statements_per_sec"],
+                               results["api-batch"]["requests_per_sec"] * 5, places=1)
+        self.assertGreaterEqual(results["api-analyze"]["p99_ms"], results["api-analyze"]["p50_ms"])
+
+    def test_json_encoders_agree(self):
+        """测试有无orjson时响应编码结果一致"""
+        from utils import json_response
+        content = {"summary": "风险等级: low", "score": 100.0, "issues": [{"partial": None, "ok": True}]}
+        encoded = json_response.dumps(content)
+        with mock.patch.object(json_response, 'orjson', None):
+            self.assertEqual(json_response.dumps(content), encoded)
+
+
+if __name__ == '__main__':
+    unittest.main()
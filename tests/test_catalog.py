@@ -0,0 +1,211 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from models.advanced_model import AdvancedModel
+from models.schema_rules import check_schema
+from utils.catalog import Catalog
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE, org_id INT, name TEXT, created DATE);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INT, total INT);
+CREATE INDEX ix_users_lower_name ON users (lower(name));
+"""
+
+
+def ddl_catalog() -> Catalog:
+    catalog = Catalog(ddl_paths=[], database_url="", refresh_interval=0)
+    catalog.load_ddl(SCHEMA)
+    return catalog
+
+
+def suggestions(model: AdvancedModel, sql: str):
+    return [suggestion["suggestion"] for suggestion in model.analyze(sql)["performance_suggestions"]]
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ddl_tables_and_indexes(self):
+        """测试从DDL加载表、列、主键、唯一约束和表达式索引"""
+        catalog = ddl_catalog()
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(catalog.table("users").columns, ("id", "email", "org_id", "name", "created"))
+        self.assertIs(catalog.table("main.users"), catalog.table("users"))
+        self.assertTrue(catalog.has_column("orders", "user_id"))
+        self.assertTrue(catalog.leading_index("users", "email").unique)
+        self.assertEqual(catalog.leading_index("users", "lower(name)").name, "ix_users_lower_name")
+        self.assertIsNone(catalog.leading_index("orders", "user_id"))
+
+    def test_ddl_directory_is_refreshed_incrementally(self):
+        """测试DDL目录按顺序执行，且只重新解析发生变化的文件"""
+        path = self.directory.name
+        with open(os.path.join(path, "001_logs.sql"), "w") as file:
+            file.write("CREATE TABLE logs (id INT, msg TEXT);")
+        with open(os.path.join(path, "002_index.sql"), "w") as file:
+            file.write("CREATE INDEX ix_msg ON logs (msg); ALTER TABLE logs ADD COLUMN level INT;")
+        catalog = Catalog(ddl_paths=[path], database_url="", refresh_interval=0)
+        self.assertEqual(catalog.table("logs").columns, ("id", "msg", "level"))
+        version = catalog.version
+
+        self.assertEqual(catalog.refresh()["files"], 0)
+        with open(os.path.join(path, "003_drop.sql"), "w") as file:
+            file.write("DROP INDEX ix_msg;")
+        self.assertEqual(catalog.refresh()["files"], 1)
+        self.assertIsNone(catalog.leading_index("logs", "msg"))
+        self.assertNotEqual(catalog.version, version)
+
+    def test_sqlite_reflection(self):
+        """测试通过SQLAlchemy反射SQLite数据库，并只重新反射变化的表"""
+        path = os.path.join(self.directory.name, "app.db")
+        connection = sqlite3.connect(path)
+        connection.executescript(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE, org_id INT);"
+            "CREATE TABLE orgs (id INTEGER PRIMARY KEY, name TEXT);"
+            "INSERT INTO users (email, org_id) VALUES ('a', 1), ('b', 2);"
+            "ANALYZE;"
+        )
+        connection.commit()
+        try:
+            catalog = Catalog(ddl_paths=[], database_url=f"sqlite:///{path}", refresh_interval=0)
+            self.assertEqual(catalog.table("users").row_count, 2)
+            self.assertTrue(catalog.leading_index("users", "email").unique)
+            self.assertEqual(catalog.refresh()["tables"], 0)
+            # 已知行数较少的表不提示
+            model = AdvancedModel(use_ast=True, catalog=catalog)
+            self.assertEqual(suggestions(model, "SELECT id FROM users WHERE org_id = 3"), [])
+
+            connection.execute("CREATE INDEX ix_org ON users (org_id)")
+            connection.commit()
+            self.assertEqual(catalog.refresh()["tables"], 1)
+            self.assertEqual(catalog.leading_index("users", "org_id").name, "ix_org")
+        finally:
+            connection.close()
+
+    def test_due_refresh_runs_in_the_background(self):
+        """测试到期的刷新在后台线程执行，不阻塞分析"""
+        catalog = ddl_catalog()
+        catalog._next_refresh = 0
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_refresh(force):
+            started.set()
+            finish.wait(5)
+            return {}
+
+        with mock.patch.object(catalog, '_refresh', side_effect=slow_refresh):
+            catalog.refresh_if_due()
+            self.assertTrue(started.wait(5))
+            # 刷新进行中时不会再启动新的刷新
+            catalog.refresh_if_due()
+            finish.set()
+            catalog._refresher.join(5)
+        self.assertFalse(catalog._refresher.is_alive())
+        self.assertTrue(catalog._lock.acquire(blocking=False))
+        catalog._lock.release()
+
+    def test_empty_catalog_picks_up_later_ddl(self):
+        """测试启动时为空的表结构目录在DDL写入后刷新并启用表结构规则"""
+        path = os.path.join(self.directory.name, "schema.sql")
+        open(path, "w").close()
+        catalog = Catalog(ddl_paths=[path], database_url="", refresh_interval=0.01)
+        model = AdvancedModel(use_ast=True, catalog=catalog)
+        self.assertEqual(len(catalog), 0)
+        with open(path, "w") as file:
+            file.write(SCHEMA)
+        catalog._next_refresh = 0
+        model.analyze("SELECT id FROM users WHERE org_id = 3")
+        catalog._refresher.join(5)
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(suggestions(model, "SELECT id FROM users WHERE org_id = 3"),
+                         ["No index on the filtered columns of users"])
+
+    def test_version_ignores_row_count_growth(self):
+        """测试行数在同一数量级内变化时版本不变"""
+        catalog = ddl_catalog()
+        catalog._row_counts = {"users": 2000}
+        catalog._rebuild()
+        version = catalog.version
+        catalog._row_counts = {"users": 2500}
+        catalog._rebuild()
+        self.assertEqual(catalog.version, version)
+        self.assertEqual(catalog.table("users").row_count, 2500)
+        catalog._row_counts = {"users": 25000}
+        catalog._rebuild()
+        self.assertNotEqual(catalog.version, version)
+
+    def test_catalog_is_picklable(self):
+        """测试表结构目录可随模型传给工作进程"""
+        catalog = pickle.loads(pickle.dumps(ddl_catalog()))
+        self.assertEqual(catalog.version, ddl_catalog().version)
+        catalog.load_ddl("CREATE INDEX ix_user ON orders (user_id);", "extra")
+        self.assertIsNotNone(catalog.leading_index("orders", "user_id"))
+
+
+class TestSchemaRules(unittest.TestCase):
+    def setUp(self):
+        self.catalog = ddl_catalog()
+        self.model = AdvancedModel(use_ast=True, catalog=self.catalog)
+
+    def test_function_only_reported_on_indexed_columns(self):
+        """测试只有作用在索引列上的函数才会提示"""
+        self.assertIn("Function applied to indexed column users.email in WHERE clause",
+                      suggestions(self.model, "SELECT id FROM users WHERE lower(email) = ?"))
+        # 存在对应的表达式索引
+        self.assertEqual(suggestions(self.model, "SELECT id FROM users WHERE lower(name) = ?"), [])
+        # 列上本就没有索引
+        result = self.model.analyze("SELECT id FROM users WHERE year(created) = 2020")
+        self.assertEqual(result["performance_suggestions"], [])
+        self.assertEqual(result["risk_score"], 0)
+        # 未知的表仍使用通用规则
+        self.assertIn("Function applied to column in WHERE clause",
+                      suggestions(self.model, "SELECT id FROM events WHERE lower(kind) = ?"))
+
+    def test_unindexed_filters_and_join_keys(self):
+        """测试未命中索引的过滤条件和连接键"""
+        self.assertEqual(suggestions(self.model, "SELECT id FROM users WHERE org_id = 3"),
+                         ["No index on the filtered columns of users"])
+        self.assertEqual(suggestions(self.model, "SELECT id FROM users WHERE id = 3 AND org_id = 3"), [])
+        self.assertEqual(
+            suggestions(self.model, "SELECT u.id FROM users u JOIN orders o ON o.user_id = u.id WHERE u.id = 1"),
+            ["Unindexed join key orders.user_id"])
+        findings = check_schema("SELECT o.id FROM orders o, users u WHERE u.id = o.user_id AND o.id = 1", self.catalog)
+        self.assertEqual(findings.unindexed_join_keys, ())
+        self.assertIsNone(check_schema("SELECT ((", self.catalog))
+
+    def test_cache_version_follows_schema(self):
+        """测试表结构变化后缓存版本随之变化"""
+        version = self.model.cache_version()
+        self.catalog.load_ddl("CREATE INDEX ix_org ON users (org_id);", "extra")
+        self.assertNotEqual(self.model.cache_version(), version)
+        empty = Catalog(ddl_paths=[], database_url="", refresh_interval=0)
+        self.assertNotIn("schema", AdvancedModel(use_ast=True, catalog=empty).cache_version())
+
+    def test_admin_endpoints(self):
+        """测试表结构管理接口"""
+        with mock.patch.object(app_module, 'ADMIN_TOKEN', 'secret'), \
+                mock.patch.object(app_module, 'get_catalog', return_value=self.catalog), \
+                TestClient(app_module.app) as client:
+            self.assertEqual(client.get("/admin/catalog").status_code, 403)
+            response = client.get("/admin/catalog", params={"tables": "true"}, headers={"X-Admin-Token": "secret"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["tables"], 2)
+            self.assertEqual(response.json()["table_list"][0]["name"], "users")
+            response = client.post("/admin/catalog/refresh", headers={"X-Admin-Token": "secret"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["reloaded"]["table_count"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+
+import cli
+
+
+class TestCommandLineAudit(unittest.TestCase):
+    def test_audit_writes_results_and_summary(self):
+        """测试命令行工具输出逐条结果和按指纹汇总"""
+        with tempfile.TemporaryDirectory() as directory:
+            script = os.path.join(directory, "script.sql")
+            with open(script, "w") as file:
+                file.write("SELECT * FROM users WHERE id = 1;\nSELECT * FROM users WHERE id = 2;\nDROP TABLE t;\n")
+            results_path = os.path.join(directory, "results.jsonl")
+            summary_path = os.path.join(directory, "summary.csv")
+            with redirect_stderr(io.StringIO()):
+                status = cli.main([script, "-m", "advanced", "-w", "1", "--batch-size", "2",
+                                   "-o", results_path, "--summary", summary_path])
+            self.assertEqual(status, 0)
+
+            with open(results_path) as file:
+                records = [json.loads(line) for line in file]
+            self.assertEqual([record["line"] for record in records], [1, 2, 3])
+            self.assertEqual(records[0]["fingerprint"], records[1]["fingerprint"])
+            self.assertEqual(records[2]["sql"], "DROP TABLE t")
+            self.assertIn("safety_score", records[2])
+
+            with open(summary_path, newline="") as file:
+                rows = list(csv.DictReader(file))
+            self.assertEqual(len(rows), 2)
+            self.assertEqual(rows[0]["query"], "drop table t")
+            self.assertEqual(rows[1]["count"], "2")
+
+    def test_summary_is_bounded(self):
+        """测试汇总的指纹数量有上限，超出部分计入其他"""
+        summary = cli.FingerprintSummary(max_fingerprints=1)
+        for index, sql in enumerate(["SELECT 1", "DELETE FROM a", "DELETE FROM b"]):
+            statement = cli.LoggedStatement("x.sql", index + 1, sql, None)
+            summary.add(statement, sql, {"risk_score": 10, "issues": []})
+        self.assertEqual(sorted(summary.entries), [cli.OTHER_FINGERPRINT, "SELECT 1"])
+        self.assertEqual(summary.entries[cli.OTHER_FINGERPRINT]["count"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
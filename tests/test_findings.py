@@ -0,0 +1,61 @@
+import pickle
+import unittest
+
+from models import AdvancedModel, SimpleModel
+from models.advanced_model import unindexed_join_key_suggestion
+from utils.findings import Finding, RULES, decode_result, define_rule, encode_result
+from utils.result_cache import ResultCache
+
+
+class TestFindings(unittest.TestCase):
+    def test_finding_reads_like_a_dict(self):
+        """测试规则结果与原来的字典结构一致"""
+        suggestion = unindexed_join_key_suggestion("orders", "user_id", 5000)
+        self.assertEqual(dict(suggestion), {
+            "suggestion": "Unindexed join key orders.user_id",
+            "impact": "high",
+            "recommendation": "Create an index on orders(user_id)",
+            "explanation": "orders is joined on user_id, which is not the first column of any index, so every joined "
+                           "row searches the whole table (5000 rows) or forces a hash join over it."
+        })
+        issue = SimpleModel().analyze("DROP TABLE t")["safety_issues"][0]
+        self.assertEqual(issue, {"issue": "包含危险操作: DROP", "severity": "high",
+                                 "recommendation": "确保有适当的权限控制和数据备份"})
+        self.assertIsNone(issue.get("explanation"))
+        self.assertFalse(hasattr(issue, "__dict__"))
+
+    def test_changes_stay_on_one_finding(self):
+        """测试修改单个结果不影响规则目录和其他结果"""
+        first, second = (AdvancedModel(use_ast=False).analyze("DROP TABLE t")["safety_issues"][0] for _ in range(2))
+        first["issue"] = "changed"
+        del first["explanation"]
+        first["note"] = "x"
+        self.assertEqual(list(first), ["issue", "severity", "recommendation", "note"])
+        self.assertEqual(second["issue"], "Dangerous operation: DROP")
+        self.assertEqual(dict(decode_result(encode_result({"issues": [first]}))["issues"][0]), dict(first))
+        self.assertEqual(dict(pickle.loads(pickle.dumps(first))), dict(first))
+
+    def test_encoding_refers_to_rules(self):
+        """测试序列化结果只记录规则ID和参数，并可还原"""
+        result = AdvancedModel(use_ast=False).analyze("SELECT * FROM a, b ORDER BY 1")
+        payload = encode_result(result)
+        self.assertNotIn("Cartesian", payload)
+        self.assertEqual(decode_result(payload), result)
+        self.assertEqual(pickle.loads(pickle.dumps(result)), result)
+        self.assertLess(len(pickle.dumps(result)), len(pickle.dumps({
+            key: [dict(item) for item in value] if isinstance(value, list) else value for key, value in result.items()
+        })))
+
+    def test_unknown_rule_is_a_cache_miss(self):
+        """测试缓存中引用了已删除规则的结果视为未命中"""
+        rule = define_rule("test.removed", "safety", "Removed {0}", "low", "Nothing")
+        cache = ResultCache(max_entries=10, max_bytes=10 ** 6, ttl=60, path='', enabled=True)
+        cache.set("k", {"safety_issues": [Finding(rule, ("x",))], "risk_score": 0})
+        self.assertEqual(cache.get("k")["safety_issues"][0]["issue"], "Removed x")
+        del RULES["test.removed"]
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
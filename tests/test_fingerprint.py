@@ -0,0 +1,48 @@
+import time
+import unittest
+from utils.fingerprint import fingerprint, fingerprint_hash
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_literals_collapse_to_placeholders(self):
+        """测试仅常量不同的查询具有相同指纹"""
+        first = "SELECT * FROM users WHERE id = 17"
+        second = "select *\n  FROM users   where ID = 42;"
+        self.assertEqual(fingerprint(first), "select * from users where id = ?")
+        self.assertEqual(fingerprint(first), fingerprint(second))
+        self.assertEqual(fingerprint_hash(first), fingerprint_hash(second))
+        self.assertEqual(len(fingerprint_hash(first)), 16)
+
+    def test_strings_comments_and_parameters(self):
+        """测试字符串、注释和绑定参数的归一化"""
+        sql = "SELECT a FROM t /* note */ WHERE b = 'it''s' AND c = :p AND d = %s -- tail"
+        self.assertEqual(fingerprint(sql), "select a from t where b = ? and c = ? and d = ?")
+        self.assertEqual(fingerprint("SELECT '--not a comment' FROM t"), "select ? from t")
+
+    def test_lists_collapse(self):
+        """测试IN列表和多行VALUES列表折叠"""
+        self.assertEqual(fingerprint("SELECT a FROM t WHERE id IN (1, 2, 3)"),
+                         fingerprint("SELECT a FROM t WHERE id IN (7)"))
+        self.assertEqual(fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y')"),
+                         "insert into t (a, b) values (?+)")
+
+    def test_shape_differences_are_kept(self):
+        """测试结构不同的查询指纹不同"""
+        self.assertNotEqual(fingerprint("SELECT * FROM users WHERE name = 'admin'"),
+                            fingerprint("SELECT * FROM users WHERE name = 'admin' OR '1'='1'"))
+        self.assertNotEqual(fingerprint("SELECT a FROM t"), fingerprint("SELECT b FROM t"))
+
+
+    def test_pathological_input_is_linear(self):
+        """测试病态输入（长数字串、未闭合的括号和引号）在线性时间内完成"""
+        # 回溯实现处理这些输入需要数分钟
+        for sql in ("1" * 200000 + "a", "[" * 200000, '"' * 200001, "`" * 200001):
+            started = time.perf_counter()
+            fingerprint(sql)
+            self.assertLess(time.perf_counter() - started, 2.0)
+        self.assertEqual(fingerprint("SELECT [a b FROM t"), "select [a b from t")
+        self.assertEqual(fingerprint("SELECT 12abc, 1.5e3 FROM t"), "select 12abc, ? from t")
+
+
+if __name__ == '__main__':
+    unittest.main()
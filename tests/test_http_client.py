@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from urllib3.exceptions import NewConnectionError, ReadTimeoutError
+
+from utils.http_client import HTTPPoolConfig, async_send, create_session, get_session, close_sessions
+from models.ollama_model import OllamaModel
+
+
+class TestHTTPClient(unittest.TestCase):
+    def tearDown(self):
+        close_sessions()
+
+    def test_config_from_environment(self):
+        """测试连接池配置可由环境变量覆盖"""
+        with mock.patch.dict('os.environ', {'HTTP_POOL_MAXSIZE': '64', 'HTTP_READ_TIMEOUT': '30'}):
+            config = HTTPPoolConfig()
+        self.assertEqual(config.pool_maxsize, 64)
+        self.assertEqual(config.timeout, (config.connect_timeout, 30.0))
+        self.assertEqual(HTTPPoolConfig(max_retries=0).max_retries, 0)
+
+    def test_session_pool_and_retry_settings(self):
+        """测试会话使用带重试的连接池适配器"""
+        config = HTTPPoolConfig(pool_maxsize=7, max_retries=2, backoff_factor=0.1)
+        session = create_session(config)
+        adapter = session.get_adapter('http://localhost:11434/api/generate')
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+        session.close()
+
+    def test_post_is_not_resent_after_it_was_sent(self):
+        """测试POST请求只在连接失败或429/503时重试，读取超时和502/504不重试"""
+        retry = create_session(HTTPPoolConfig(max_retries=2)).get_adapter('http://localhost').max_retries
+        self.assertTrue(retry.is_retry('POST', 503))
+        self.assertTrue(retry.is_retry('POST', 429))
+        self.assertFalse(retry.is_retry('POST', 504))
+        self.assertTrue(retry.is_retry('GET', 504))
+        with self.assertRaises(ReadTimeoutError):
+            retry.increment('POST', '/api/generate', error=ReadTimeoutError(None, '/api/generate', 'timed out'))
+        self.assertEqual(retry.increment('POST', '/api/generate', error=NewConnectionError(None, 'refused')).connect, 1)
+
+        attempts = []
+
+        def handler(request):
+            attempts.append(request.method)
+            return httpx.Response(502)
+
+        async def send(method):
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            response = await async_send(client, client.build_request(method, 'http://backend/'),
+                                        HTTPPoolConfig(max_retries=2, backoff_factor=0))
+            await response.aclose()
+            return response.status_code
+
+        self.assertEqual(asyncio.run(send('POST')), 502)
+        self.assertEqual(attempts, ['POST'])
+        asyncio.run(send('GET'))
+        self.assertEqual(attempts.count('GET'), 3)
+
+    def test_models_share_the_default_session(self):
+        """测试模型共享同一个连接池会话"""
+        self.assertIs(OllamaModel().session, get_session())
+        self.assertIs(OllamaModel().session, OllamaModel().session)
+        close_sessions()
+        self.assertIsNot(get_session(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+from models import OllamaModel
+from models.llm_batch import parse_batch_analysis_response
+from models.llm_response import extract_json, repair_json, load_json, validate_analysis, parse_analysis_response
+
+ANALYSIS = {"safety_issues": [], "performance_suggestions": [], "risk_score": 10}
+
+
+class TestResponseRecovery(unittest.TestCase):
+    def test_extract_from_fences_and_prose(self):
+        """测试从代码块和说明文字中提取JSON"""
+        self.assertEqual(extract_json('Sure!\n```json\n{"a": 1}\n```\nDone.'), '{"a": 1}')
+        self.assertEqual(extract_json('Result: {"a": [1]} hope this helps'), '{"a": [1]}')
+
+    def test_repair_common_malformations(self):
+        """测试修复尾随逗号、Python字面量、注释和截断"""
+        self.assertEqual(json.loads(repair_json('{"a": [1, 2,], "b": True,}')), {"a": [1, 2], "b": True})
+        self.assertEqual(json.loads(repair_json('{"a": None, // note\n "b": "x, ]"}')), {"a": None, "b": "x, ]"})
+        self.assertEqual(load_json('{"safety_issues": [{"issue": "trunc'), {"safety_issues": [{"issue": "trunc"}]})
+
+    def test_non_ascii_bare_word_is_invalid_json(self):
+        """测试字符串外的非ASCII裸词只导致JSON无效，而不是其他异常"""
+        self.assertEqual(repair_json('{"a": 高}'), '{"a": 高}')
+        with self.assertRaises(ValueError):
+            load_json('{"risk_score": 高}')
+        with self.assertRaises(ValueError):
+            load_json("[" * 100000)
+        self.assertEqual(parse_batch_analysis_response('[{"risk_score": 高}]', 1), [None])
+
+    def test_schema_validation(self):
+        """测试按模式校验并规范化分析结果"""
+        result = validate_analysis({
+            "safety_issues": [{"issue": "x", "severity": "Critical", "explanation": "why"}, {"severity": "low"}, "junk"],
+            "performance_suggestions": [{"suggestion": "y", "impact": "high/medium/low", "recommendation": "do"}],
+            "risk_score": "70"
+        })
+        self.assertEqual(result["safety_issues"], [{"issue": "x", "severity": "high", "explanation": "why", "recommendation": "why"}])
+        self.assertEqual(result["performance_suggestions"][0]["impact"], "high")
+        with self.assertRaises(ValueError):
+            parse_analysis_response('{"safety_issues": "none"}')
+        with self.assertRaises(ValueError):
+            parse_analysis_response('I cannot analyze this query.')
+
+
+class TestOllamaRecovery(unittest.TestCase):
+    def run_with_responses(self, responses):
+        """依次返回给定的生成结果，并记录请求"""
+        requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(json.loads(request.content))
+            text = responses[min(len(requests), len(responses)) - 1]
+            return httpx.Response(200, text=json.dumps({"response": text}))
+
+        model = OllamaModel()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        async def run():
+            with mock.patch('models.ollama_model.get_async_client', return_value=client):
+                return await model.aanalyze("SELECT 1")
+
+        return asyncio.run(run()), requests
+
+    def test_recoverable_response_needs_one_generation(self):
+        """测试可修复的响应只需一次生成，且使用JSON模式"""
+        result, requests = self.run_with_responses(['```json\n{"safety_issues": [], "risk_score": 20,}\n```'])
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0]["format"], "json")
+        self.assertEqual(result["risk_score"], 20)
+
+    def test_at_most_two_generations(self):
+        """测试无法解析时只重试一次修复请求"""
+        result, requests = self.run_with_responses(["no json here", json.dumps(ANALYSIS)])
+        self.assertEqual(len(requests), 2)
+        self.assertIn("JSON Repair Task", requests[1]["prompt"])
+        self.assertEqual(result["risk_score"], 10)
+
+        result, requests = self.run_with_responses(["no json here"])
+        self.assertEqual(len(requests), 2)
+        self.assertTrue(result["error"])
+
+
+if __name__ == '__main__':
+    unittest.main()
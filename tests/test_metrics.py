@@ -0,0 +1,135 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app as app_module
+from models import CopilotModel
+from utils.metrics import Histogram, MetricsRegistry, REGISTRY
+
+
+def sample(text: str, line_prefix: str) -> float:
+    """取出指标文本中以给定前缀开头的样本值"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"sample not found: {line_prefix}")
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_counter_gauge_and_labels(self):
+        """测试计数器、仪表和标签的文本格式"""
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("path",))
+        in_flight = registry.gauge("in_flight", "In flight")
+        requests.labels("/a").inc()
+        requests.labels("/a").inc(2)
+        requests.labels('/b"').inc()
+        in_flight.labels().inc()
+        in_flight.labels().dec()
+        text = registry.render()
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertEqual(sample(text, 'requests_total{path="/a"}'), 3)
+        self.assertEqual(sample(text, 'requests_total{path="/b\\""}'), 1)
+        self.assertEqual(sample(text, "in_flight"), 0)
+        with self.assertRaises(ValueError):
+            requests.labels("/a", "extra")
+        with self.assertRaises(ValueError):
+            registry.counter("requests_total", "Again")
+
+    def test_histogram_buckets_are_cumulative(self):
+        """测试直方图的累积桶、总和与计数"""
+        histogram = Histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+        child = histogram.labels("parse")
+        for value in (0.05, 0.1, 0.5, 5.0):
+            child.observe(value)
+        text = "\n".join(histogram.render())
+        self.assertEqual(sample(text, 'latency_seconds_bucket{stage="parse",le="0.1"}'), 2)
+        self.assertEqual(sample(text, 'latency_seconds_bucket{stage="parse",le="1"}'), 3)
+        self.assertEqual(sample(text, 'latency_seconds_bucket{stage="parse",le="+Inf"}'), 4)
+        self.assertEqual(sample(text, 'latency_seconds_count{stage="parse"}'), 4)
+        self.assertAlmostEqual(sample(text, 'latency_seconds_sum{stage="parse"}'), 5.65)
+
+        with child.time():
+            pass
+        self.assertEqual(child.count, 5)
+        histogram.clear()
+        self.assertEqual(histogram.labels("parse").count, 0)
+        self.assertIs(histogram.labels("parse"), child)
+
+    def test_collectors_are_read_at_scrape_time(self):
+        """测试采集函数在抓取时读取数值"""
+        registry = MetricsRegistry()
+        values = {"depth": 1}
+        registry.add_collector(lambda: [("queue_depth", "gauge", "Depth", [({"model": "m"}, values["depth"])])])
+        self.assertEqual(sample(registry.render(), 'queue_depth{model="m"}'), 1)
+        values["depth"] = 7
+        self.assertEqual(sample(registry.render(), 'queue_depth{model="m"}'), 7)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        REGISTRY.clear()
+
+    def test_metrics_endpoint(self):
+        """测试/metrics接口导出阶段耗时、请求、缓存命中和在途请求"""
+        with mock.patch.object(app_module.result_cache, 'enabled', True), \
+                TestClient(app_module.app) as client:
+            app_module.result_cache.clear()
+            for _ in range(2):
+                response = client.post("/api/analyze", json={"sql": "SELECT * FROM users", "model": "advanced"})
+                self.assertEqual(response.status_code, 200)
+            client.get("/no/such/path")
+            client.get("/api/sessions/unknown-session")
+            response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        text = response.text
+        self.assertEqual(sample(text, 'sqlcheck_stage_duration_seconds_count{model="advanced",stage="analyze"}'), 1)
+        self.assertEqual(sample(text, 'sqlcheck_stage_duration_seconds_count{model="advanced",stage="cache_lookup"}'), 2)
+        self.assertEqual(sample(text, 'sqlcheck_stage_duration_seconds_count{model="advanced",stage="format"}'), 2)
+        self.assertEqual(sample(text, 'sqlcheck_request_duration_seconds_count{endpoint="/api/analyze",status="200"}'), 2)
+        self.assertEqual(sample(text, 'sqlcheck_request_duration_seconds_count{endpoint="other",status="404"}'), 1)
+        # 带路径参数的接口按路由模板统计
+        self.assertEqual(sample(text, 'sqlcheck_request_duration_seconds_count'
+                                      '{endpoint="/api/sessions/{session_id}",status="404"}'), 1)
+        self.assertEqual(sample(text, 'sqlcheck_requests_in_flight{endpoint="/api/sessions/{session_id}"}'), 0)
+        self.assertEqual(sample(text, 'sqlcheck_requests_in_flight{endpoint="/api/analyze"}'), 0)
+        # 抓取请求本身仍在进行中
+        self.assertEqual(sample(text, 'sqlcheck_requests_in_flight{endpoint="/metrics"}'), 1)
+        self.assertGreaterEqual(sample(text, "sqlcheck_result_cache_hits_total"), 1)
+        self.assertIn('sqlcheck_scheduler_queued{model="ollama"}', text)
+
+    def test_metrics_endpoint_can_be_disabled(self):
+        """测试关闭指标后接口返回404"""
+        with mock.patch.object(app_module, 'METRICS_ENABLED', False), TestClient(app_module.app) as client:
+            self.assertEqual(client.get("/metrics").status_code, 404)
+
+    def test_copilot_token_refreshes_and_errors(self):
+        """测试Copilot令牌刷新次数和后端错误计数"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.method == "GET":
+                return httpx.Response(200, json={"token": "copilot-token", "expires_in": 600})
+            return httpx.Response(503, text="unavailable")
+
+        with mock.patch.dict('os.environ', {'GITHUB_TOKEN': 'gh-token'}):
+            model = CopilotModel()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        async def run():
+            with mock.patch('models.copilot_model.get_async_client', return_value=client):
+                return [await model.aanalyze("SELECT 1") for _ in range(2)]
+
+        results = asyncio.run(run())
+        self.assertTrue(all(result.get("error") for result in results))
+        text = REGISTRY.render()
+        self.assertEqual(sample(text, 'sqlcheck_token_refreshes_total{backend="copilot"}'), 1)
+        self.assertEqual(sample(text, 'sqlcheck_backend_errors_total{backend="copilot",operation="completion"}'), 2)
+        self.assertEqual(sample(text, 'sqlcheck_backend_errors_total{backend="copilot",operation="token"}'), 0)
+        self.assertEqual(sample(text, 'sqlcheck_stage_duration_seconds_count{model="copilot",stage="http"}'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
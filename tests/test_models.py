@@ -3,6 +3,7 @@ from models.simple_model import SimpleModel
 from models.advanced_model import AdvancedModel
 from models.ollama_model import OllamaModel
 from models.copilot_model import CopilotModel
+from models.llm_batch import chunk_queries, parse_batch_analysis_response
 from utils.logger import logger
 import os
 
@@ -171,6 +172,32 @@ class TestSQLAnalyzerModels(unittest.TestCase):
         logger.info("高级模型测试通过！")
         logger.info("=== 缺少WHERE子句测试完成 ===\n")
     
+    def test_analyze_batch(self):
+        """测试批量分析保持输入顺序且与单条分析结果一致"""
+        logger.info("=== 开始测试批量分析 ===")
+        queries = [
+            "SELECT id, name FROM users WHERE age >= 18",
+            "DROP TABLE users",
+            "SELECT * FROM users WHERE username = 'admin' OR '1'='1'",
+            "DELETE FROM users",
+        ]
+        for model in (self.simple_model, self.advanced_model):
+            results = model.analyze_batch(queries)
+            self.assertEqual(len(results), len(queries))
+            for sql, result in zip(queries, results):
+                self.assertEqual(result, model.analyze(sql))
+        self.assertEqual(self.advanced_model.analyze_batch([]), [])
+        logger.info("=== 批量分析测试完成 ===\n")
+    
+    def test_parse_batch_analysis_response(self):
+        """测试LLM批量响应的解析"""
+        response = '{"results": [{"index": 1, "risk_score": 80}, {"index": 7, "risk_score": 10}]}'
+        entries = parse_batch_analysis_response(response, 2)
+        self.assertIsNone(entries[0])
+        self.assertEqual(entries[1]['risk_score'], 80)
+        self.assertEqual(parse_batch_analysis_response('not json', 3), [None, None, None])
+        self.assertEqual(chunk_queries(['a', 'b', 'c'], 2), [['a', 'b'], ['c']])
+    
     def test_ollama_model(self):
         """测试Ollama模型（如果启用）"""
         if not self.test_ollama:
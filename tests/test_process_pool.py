@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from models import SimpleModel, AdvancedModel, ModelRegistry, PooledModel, RuleProcessPool
+
+QUERIES = [
+    "SELECT * FROM users",
+    "DELETE FROM users",
+    "SELECT id FROM orders WHERE id = 1",
+    "DROP TABLE accounts",
+    "UPDATE users SET name = 'x'",
+] * 8
+
+
+class TestRuleProcessPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = RuleProcessPool(max_workers=2, chunk_size=8)
+        cls.pool.register("advanced", AdvancedModel())
+        cls.pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_chunks_cover_every_worker(self):
+        """测试批次按进程数切分且每块不超过chunk_size"""
+        self.assertEqual([len(chunk) for chunk in self.pool.chunks(QUERIES[:6])], [3, 3])
+        self.assertEqual([len(chunk) for chunk in self.pool.chunks(QUERIES)], [8] * 5)
+        self.assertEqual(self.pool.chunks([]), [])
+
+    def test_results_match_in_process_analysis(self):
+        """测试进程池结果与进程内分析一致且保持顺序"""
+        self.assertEqual(self.pool.map("advanced", QUERIES), AdvancedModel().analyze_batch(QUERIES))
+        results = asyncio.run(self.pool.amap("advanced", QUERIES))
+        self.assertEqual(results, AdvancedModel().analyze_batch(QUERIES))
+
+    def test_model_registered_after_start(self):
+        """测试进程池启动后注册的模型随任务发送到工作进程"""
+        self.pool.register("simple", SimpleModel())
+        self.assertEqual(self.pool.map("simple", QUERIES), SimpleModel().analyze_batch(QUERIES))
+
+
+class TestProcessExecutorRegistry(unittest.TestCase):
+    def test_rule_models_use_the_pool(self):
+        """测试RULE_EXECUTOR为process时规则模型在进程池中执行"""
+        registry = ModelRegistry({"simple": SimpleModel, "advanced": AdvancedModel}, rule_executor="process")
+        registry.rule_pool().max_workers = 2
+        registry.startup()
+        try:
+            model = registry.get("advanced")
+            self.assertIsInstance(model, PooledModel)
+            self.assertEqual(model.cache_version(), AdvancedModel().cache_version())
+            results = asyncio.run(model.aanalyze_batch(QUERIES))
+            self.assertEqual(results, AdvancedModel().analyze_batch(QUERIES))
+            self.assertEqual(asyncio.run(registry.get("simple").aanalyze("DELETE FROM users")),
+                             SimpleModel().analyze("DELETE FROM users"))
+        finally:
+            registry.shutdown()
+        self.assertIsNone(registry._rule_pool)
+
+    def test_thread_executor_by_default(self):
+        """测试默认不使用进程池"""
+        registry = ModelRegistry({"simple": SimpleModel}, rule_executor="thread")
+        self.assertIsInstance(registry.get("simple"), SimpleModel)
+
+
+if __name__ == '__main__':
+    unittest.main()
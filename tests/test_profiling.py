@@ -0,0 +1,114 @@
+import os
+import pstats
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from utils.profiling import ProfileStore, RequestProfiler
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProfileStore(self.directory.name, max_profiles=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run_stores_profile_and_prunes(self):
+        """测试性能分析结果保存为pstats文件，并只保留最新的若干份"""
+        profiler = RequestProfiler(self.store, enabled=False, sample_rate=0.0)
+        ids = []
+        for _ in range(3):
+            result, profile_id = profiler.run(busy, 1000, info={"model": "test"})
+            self.assertEqual(result, busy(1000))
+            ids.append(profile_id)
+        listed = [record["id"] for record in self.store.list()]
+        self.assertEqual(len(listed), 2)
+        self.assertNotIn(ids[0], listed)
+        stats = pstats.Stats(self.store.path(listed[0]))
+        self.assertTrue(any(name == "busy" for _, _, name in stats.stats))
+        self.assertIn("busy", self.store.report(listed[0]))
+        self.assertEqual(self.store.info(listed[0])["model"], "test")
+
+    def test_invalid_ids_are_rejected(self):
+        """测试非法的分析ID不会访问文件系统"""
+        with self.assertRaises(KeyError):
+            self.store.path("../../etc/passwd")
+        with self.assertRaises(KeyError):
+            self.store.info("20240101T000000000000-deadbeef")
+
+    def test_sampling_and_busy(self):
+        """测试开关与采样率，以及同一时间只采集一份"""
+        profiler = RequestProfiler(self.store, enabled=False, sample_rate=1.0)
+        self.assertFalse(profiler.should_profile())
+        self.assertTrue(profiler.should_profile(requested=True))
+        profiler.configure(enabled=True)
+        self.assertTrue(profiler.should_profile())
+        profiler.configure(sample_rate=0.0)
+        self.assertFalse(profiler.should_profile())
+        with self.assertRaises(ValueError):
+            profiler.configure(sample_rate=2)
+
+        nested = profiler.run(lambda: profiler.run(busy, 10))
+        result, profile_id = nested[0]
+        self.assertEqual(result, busy(10))
+        self.assertIsNone(profile_id)
+        self.assertIsNotNone(nested[1])
+
+
+class TestProfilingEndpoints(unittest.TestCase):
+    def test_profile_requested_by_header_and_retrieved(self):
+        """测试通过请求头触发分析，并通过管理接口查看和下载"""
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = RequestProfiler(ProfileStore(directory), enabled=False, sample_rate=0.0)
+            with mock.patch.object(app_module, 'ADMIN_TOKEN', 'secret'), \
+                    mock.patch.object(app_module, 'request_profiler', profiler), \
+                    TestClient(app_module.app) as client:
+                response = client.post("/api/analyze", json={"sql": "SELECT * FROM users", "model": "advanced"},
+                                       headers={"X-Profile": "secret"})
+                self.assertEqual(response.status_code, 200)
+                profile_id = response.headers["X-Profile-Id"]
+
+                # 错误的令牌不会触发分析
+                response = client.post("/api/analyze", json={"sql": "SELECT 1", "model": "advanced"},
+                                       headers={"X-Profile": "wrong"})
+                self.assertNotIn("X-Profile-Id", response.headers)
+
+                self.assertEqual(client.get("/admin/profiles").status_code, 403)
+                profiles = client.get("/admin/profiles", headers=ADMIN).json()["profiles"]
+                self.assertEqual([record["id"] for record in profiles], [profile_id])
+                self.assertEqual(profiles[0]["model"], "advanced")
+
+                report = client.get(f"/admin/profiles/{profile_id}", headers=ADMIN)
+                self.assertIn("advanced_model.py", report.text)
+                raw = client.get(f"/admin/profiles/{profile_id}/raw", headers=ADMIN)
+                self.assertEqual(raw.status_code, 200)
+                self.assertEqual(client.get("/admin/profiles/nope", headers=ADMIN).status_code, 404)
+
+                settings = client.put("/admin/profiling", json={"enabled": True, "sample_rate": 1.0}, headers=ADMIN)
+                self.assertTrue(settings.json()["enabled"])
+                response = client.post("/api/analyze", json={"sql": "SELECT 2", "model": "simple"})
+                self.assertIn("X-Profile-Id", response.headers)
+                self.assertEqual(client.put("/admin/profiling", json={"sample_rate": 5}, headers=ADMIN).status_code, 400)
+
+                self.assertEqual(client.delete(f"/admin/profiles/{profile_id}", headers=ADMIN).status_code, 200)
+                self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_admin_endpoints_disabled_without_token(self):
+        """测试未配置管理令牌时管理接口不可用"""
+        with mock.patch.object(app_module, 'ADMIN_TOKEN', ''), TestClient(app_module.app) as client:
+            self.assertEqual(client.get("/admin/profiling", headers={"X-Admin-Token": ""}).status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
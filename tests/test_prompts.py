@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+from models import CopilotModel, OllamaModel
+from models.llm_batch import get_batch_analysis_prompt
+from models.llm_response import get_repair_prompt
+from models.prompts import (PromptTemplate, get_template, load_templates, estimate_tokens, fit_sql,
+                            render_sql_prompt, SUMMARY_NOTE, TRUNCATED_NOTE)
+
+LONG_SELECT = ("SELECT " + ", ".join(f"col_{i}" for i in range(3000))
+               + " FROM t WHERE a IN (" + ",".join(str(i) for i in range(500)) + ") AND b = 'x'")
+
+
+class TestPromptTemplate(unittest.TestCase):
+    def test_compile_and_render(self):
+        """测试模板预编译：JSON花括号保持原样，只替换占位符"""
+        template = PromptTemplate("t", 'Return {"a": 1}\n## SQL:\n{{ sql }} ({{count}})')
+        self.assertEqual(template.placeholders, ("sql", "count"))
+        self.assertEqual(template.prefix, 'Return {"a": 1}\n## SQL:\n')
+        self.assertEqual(template.render(sql="select 1", count=2), 'Return {"a": 1}\n## SQL:\nselect 1 (2)')
+        with self.assertRaises(KeyError):
+            template.render(sql="select 1")
+
+    def test_templates_loaded_once(self):
+        """测试模板只加载一次，且SQL位于静态前缀之后"""
+        templates = load_templates()
+        self.assertIs(templates["analysis"], get_template("analysis"))
+        for name, template in templates.items():
+            self.assertNotIn("{{", template.prefix, name)
+        prompt = render_sql_prompt("analysis", "SELECT 1")
+        self.assertTrue(prompt.startswith(get_template("analysis").prefix))
+        self.assertTrue(prompt.rstrip().endswith("SELECT 1\n```"))
+
+
+class TestTokenBudget(unittest.TestCase):
+    def test_estimate_tokens(self):
+        """测试token估算：单词、标点和长标识符"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("select * from t;"), 5)
+        self.assertEqual(estimate_tokens("customer_addresses"), 5)
+
+    def test_short_sql_kept_verbatim(self):
+        """测试预算内的SQL保持原样"""
+        self.assertEqual(fit_sql("SELECT * FROM users WHERE id = 1", 100), ("SELECT * FROM users WHERE id = 1", ""))
+        self.assertEqual(fit_sql(LONG_SELECT, None), (LONG_SELECT, ""))
+
+    def test_summarize_then_truncate(self):
+        """测试超长SQL先用指纹摘要，仍超长则截断中间部分"""
+        in_list = "SELECT a FROM t WHERE a IN (" + ",".join(str(i) for i in range(3000)) + ")"
+        self.assertEqual(fit_sql(in_list, 200), ("select a from t where a in (?+)", SUMMARY_NOTE))
+
+        sql, note = fit_sql(LONG_SELECT, 300)
+        self.assertEqual(note, TRUNCATED_NOTE)
+        self.assertLessEqual(estimate_tokens(sql) + estimate_tokens(note), 300)
+        self.assertTrue(sql.startswith("select col_0, col_1"))
+        self.assertTrue(sql.endswith("from t where a in (?+) and b = ?"))
+        self.assertIn("tokens omitted", sql)
+
+    def test_prompts_fit_model_budget(self):
+        """测试各类提示词不超过模型的token预算"""
+        model = OllamaModel(max_prompt_tokens=1536)
+        self.assertLessEqual(estimate_tokens(model._get_combined_analysis_prompt(LONG_SELECT)), 1536)
+        batch = get_batch_analysis_prompt([LONG_SELECT, "SELECT 1"], 1536)
+        self.assertLessEqual(estimate_tokens(batch), 1536)
+        self.assertIn("### Query 1:\n```sql\nSELECT 1\n```", batch)
+        self.assertIn("(2 queries)", batch)
+        self.assertNotEqual(model.cache_version(), OllamaModel(max_prompt_tokens=4096).cache_version())
+
+    def test_cache_version_covers_batch_template(self):
+        """测试批量提示词模板变化后缓存版本随之变化"""
+        versions = (OllamaModel().cache_version(), CopilotModel().cache_version())
+        batch = get_template("batch_analysis")
+        with mock.patch.object(batch, 'digest', 'changed'):
+            self.assertNotEqual(OllamaModel().cache_version(), versions[0])
+            self.assertNotEqual(CopilotModel().cache_version(), versions[1])
+
+    def test_repair_prompt(self):
+        """测试修复提示词包含错误信息和原始响应"""
+        prompt = get_repair_prompt("not json", ValueError("bad"))
+        self.assertTrue(prompt.startswith("# JSON Repair Task"))
+        self.assertIn("## Error:\nbad", prompt)
+        self.assertTrue(prompt.rstrip().endswith("not json"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+from utils.query_log import (detect_format, iter_mysql_slow_log, iter_postgres_log, iter_file,
+                             iter_sources, LoggedStatement)
+
+MYSQL_SLOW_LOG = """/usr/sbin/mysqld, Version: 8.0.32 (MySQL Community Server - GPL). started with:
+Tcp port: 3306  Unix socket: /var/run/mysqld/mysqld.sock
+Time                 Id Command    Argument
+# Time: 2024-05-01T10:00:00.123456Z
+# User@Host: app[app] @ localhost []  Id:    12
+# Query_time: 2.500000  Lock_time: 0.000100 Rows_sent: 10  Rows_examined: 100000
+use shop;
+SET timestamp=1714557600;
+SELECT * FROM orders
+WHERE customer_id = 17;
+# Time: 2024-05-01T10:00:02.000000Z
+# Query_time: 0.300000  Lock_time: 0.000000 Rows_sent: 0  Rows_examined: 0
+SET timestamp=1714557602;
+DELETE FROM sessions;
+"""
+
+POSTGRES_LOG = """2024-05-01 10:00:00.123 UTC [1234] LOG:  duration: 1523.456 ms  statement: SELECT *
+\tFROM users
+\tWHERE id = 5
+2024-05-01 10:00:01.000 UTC [1234] LOG:  checkpoint starting: time
+2024-05-01 10:00:02.000 UTC [1235] LOG:  execute <unnamed>: UPDATE users SET name = 'x'
+"""
+
+
+class TestQueryLogReaders(unittest.TestCase):
+    def test_mysql_slow_log(self):
+        """测试解析MySQL慢查询日志：跳过头部、use和SET timestamp"""
+        statements = list(iter_mysql_slow_log(io.StringIO(MYSQL_SLOW_LOG), "slow.log"))
+        self.assertEqual(statements, [
+            LoggedStatement("slow.log", 9, "SELECT * FROM orders\nWHERE customer_id = 17", 2.5),
+            LoggedStatement("slow.log", 14, "DELETE FROM sessions", 0.3),
+        ])
+
+    def test_postgres_log(self):
+        """测试解析PostgreSQL日志中的多行语句和执行时间"""
+        statements = list(iter_postgres_log(io.StringIO(POSTGRES_LOG), "pg.log"))
+        self.assertEqual(statements, [
+            LoggedStatement("pg.log", 1, "SELECT *\nFROM users\nWHERE id = 5", 1.523456),
+            LoggedStatement("pg.log", 5, "UPDATE users SET name = 'x'", None),
+        ])
+
+    def test_detect_format(self):
+        """测试根据文件开头识别输入格式"""
+        self.assertEqual(detect_format(MYSQL_SLOW_LOG), "mysql-slow")
+        self.assertEqual(detect_format(POSTGRES_LOG), "postgres")
+        self.assertEqual(detect_format("SELECT 1; -- LOG: nothing\n"), "sql")
+        statements = list(iter_file(io.StringIO("SELECT 1;\nDROP TABLE t;"), "a.sql"))
+        self.assertEqual([(s.line, s.sql) for s in statements], [(1, "SELECT 1"), (2, "DROP TABLE t")])
+
+    def test_directories_and_gzip(self):
+        """测试读取目录（按文件名排序）和gzip压缩日志"""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "b.sql"), "w") as file:
+                file.write("SELECT 2;")
+            with gzip.open(os.path.join(directory, "a.log.gz"), "wt") as file:
+                file.write(MYSQL_SLOW_LOG)
+            with open(os.path.join(directory, "notes.txt"), "w") as file:
+                file.write("SELECT 3;")
+            statements = list(iter_sources([directory]))
+        self.assertEqual([s.sql for s in statements],
+                         ["SELECT * FROM orders\nWHERE customer_id = 17", "DELETE FROM sessions", "SELECT 2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from models.advanced_model import AdvancedModel
+from utils.catalog import Catalog
+from utils.query_plan import PlanAnalyzer, PlanFinding, explainable, mysql_findings, postgres_findings
+
+
+def suggestions(model: AdvancedModel, sql: str):
+    return [suggestion["suggestion"] for suggestion in model.analyze(sql)["performance_suggestions"]]
+
+
+class TestQueryPlan(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "app.db")
+        connection = sqlite3.connect(self.path)
+        connection.executescript(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT, org_id INT);"
+            "CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INT, total INT);"
+            "CREATE INDEX ix_users_email ON users (email);"
+        )
+        connection.close()
+        self.planner = PlanAnalyzer(database_url=f"sqlite:///{self.path}", pool_size=1, pool_timeout=0.05)
+        empty = Catalog(ddl_paths=[], database_url="", refresh_interval=0)
+        self.model = AdvancedModel(use_ast=True, catalog=empty, planner=self.planner)
+
+    def tearDown(self):
+        self.planner.close()
+        self.directory.cleanup()
+
+    def test_sqlite_plan_findings(self):
+        """测试从SQLite执行计划中识别全表扫描、临时B树和嵌套循环"""
+        self.assertEqual(suggestions(self.model, "SELECT id FROM users WHERE email = ?"), [])
+        self.assertIn("Full table scan of users in the query plan",
+                      suggestions(self.model, "SELECT id FROM users WHERE org_id = ?"))
+        self.assertIn("Temporary structure for GROUP BY in the query plan",
+                      suggestions(self.model, "SELECT org_id, count(*) FROM users WHERE org_id > 1 GROUP BY org_id"))
+        self.assertIn("Nested loop scans orders for every row of users",
+                      suggestions(self.model, "SELECT u.id FROM users u, orders o WHERE o.total > u.org_id"))
+        result = self.model.analyze("SELECT u.id FROM users u, orders o WHERE o.total > u.org_id")
+        impacts = [suggestion["impact"] for suggestion in result["performance_suggestions"]]
+        self.assertIn("high", impacts)
+        self.assertTrue(self.model.cache_version().endswith(":plan"))
+
+    def test_plans_are_cached_by_fingerprint(self):
+        """测试执行计划按查询指纹缓存"""
+        self.planner.plan("SELECT id FROM users WHERE org_id = 1")
+        self.planner.plan("SELECT id FROM users WHERE org_id = 2")
+        self.assertEqual((self.planner.hits, self.planner.misses), (1, 1))
+
+    def test_only_single_selects_are_explained(self):
+        """测试只对单条SELECT语句获取执行计划，且连接为只读"""
+        self.assertIsNone(explainable("DELETE FROM users"))
+        self.assertIsNone(explainable("SELECT 1; DROP TABLE users"))
+        self.assertIsNone(explainable("SELECT id FROM users FOR UPDATE"))
+        self.assertIsNone(self.planner.plan("DROP TABLE users"))
+        with self.planner.engine().connect() as connection:
+            with self.assertRaises(Exception):
+                connection.exec_driver_sql("DELETE FROM users")
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(connection.execute("SELECT count(*) FROM sqlite_master WHERE name = 'users'").fetchone()[0], 1)
+        connection.close()
+
+    def test_busy_pool_skips_plan(self):
+        """测试连接池耗尽时跳过执行计划而不排队"""
+        with self.planner.engine().connect():
+            self.assertIsNone(self.planner.plan("SELECT id FROM users WHERE org_id = 1"))
+        # 未缓存，空闲后重新获取
+        self.assertIsNotNone(self.planner.plan("SELECT id FROM users WHERE org_id = 1"))
+
+    def test_disabled_without_database(self):
+        """测试未配置数据库时不获取执行计划"""
+        planner = PlanAnalyzer(database_url="")
+        self.assertIsNone(planner.plan("SELECT id FROM users"))
+        model = AdvancedModel(use_ast=True, catalog=Catalog(ddl_paths=[], database_url="", refresh_interval=0),
+                              planner=planner)
+        self.assertNotIn(":plan", model.cache_version())
+
+    def test_postgres_and_mysql_plans(self):
+        """测试解析PostgreSQL和MySQL的执行计划"""
+        plan = [{"Plan": {"Node Type": "Sort", "Plan Rows": 5000, "Plans": [
+            {"Node Type": "Nested Loop", "Plan Rows": 5000, "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "users", "Plan Rows": 100},
+                {"Node Type": "Seq Scan", "Relation Name": "orders", "Plan Rows": 50000}]}]}}]
+        self.assertEqual(postgres_findings(plan), [
+            PlanFinding("temp_structure", "", "sort", 5000),
+            PlanFinding("nested_loop", "orders", "users", 100),
+            PlanFinding("full_scan", "users", "", 100),
+            PlanFinding("full_scan", "orders", "", 50000),
+        ])
+        rows = [{"table": "u", "type": "ALL", "rows": 2000, "Extra": "Using where; Using filesort"},
+                {"table": "o", "type": "ALL", "rows": 9000, "Extra": "Using join buffer (hash join)"}]
+        self.assertEqual(mysql_findings(rows), [
+            PlanFinding("full_scan", "u", "", 2000),
+            PlanFinding("temp_structure", "u", "filesort", 2000),
+            PlanFinding("full_scan", "o", "", 9000),
+            PlanFinding("nested_loop", "o", "u", 9000),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import threading
+from unittest import mock
+from models import ModelRegistry, SimpleModel, AdvancedModel, CopilotModel
+
+
+class CountingModel(SimpleModel):
+    """记录构造和关闭次数的测试模型"""
+    built = 0
+
+    def __init__(self):
+        CountingModel.built += 1
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        CountingModel.built = 0
+        self.registry = ModelRegistry({"simple": SimpleModel, "advanced": AdvancedModel, "counting": CountingModel})
+
+    def test_instances_are_reused(self):
+        """测试同一模型在多次获取时复用同一实例"""
+        self.registry.startup()
+        self.assertIs(self.registry.get("advanced"), self.registry.get("ADVANCED"))
+        self.assertEqual(CountingModel.built, 1)
+        self.assertIn("simple", self.registry)
+        self.assertNotIn("unknown", self.registry)
+        with self.assertRaises(KeyError):
+            self.registry.get("unknown")
+
+    def test_concurrent_first_use_builds_once(self):
+        """测试并发首次获取只构造一次模型"""
+        barrier = threading.Barrier(8)
+        instances = []
+
+        def worker():
+            barrier.wait()
+            instances.append(self.registry.get("counting"))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(CountingModel.built, 1)
+        self.assertTrue(all(instance is instances[0] for instance in instances))
+
+    def test_shutdown_closes_models(self):
+        """测试关闭时释放所有模型实例"""
+        model = self.registry.get("counting")
+        self.registry.shutdown()
+        self.assertTrue(model.closed)
+        self.assertIsNot(self.registry.get("counting"), model)
+
+
+class TestCopilotTokenReuse(unittest.TestCase):
+    def test_token_is_fetched_once_across_calls(self):
+        """测试共享的Copilot实例在多次调用间复用访问令牌"""
+        session = mock.Mock()
+        session.get.return_value.json.return_value = {'token': 'copilot-token', 'expires_in': 600}
+        with mock.patch.dict('os.environ', {'GITHUB_TOKEN': 'gh-token'}):
+            model = CopilotModel(session=session)
+        for _ in range(5):
+            self.assertEqual(model._get_copilot_token(), 'copilot-token')
+        self.assertEqual(session.get.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app as app_module
+from models import SimpleModel
+from utils.result_cache import ResultCache, normalize_sql
+
+RESULT = {"safety_issues": [], "performance_suggestions": [], "risk_score": 10, "risk_level": "low", "details": "测试"}
+
+
+class CountingModel(SimpleModel):
+    """记录分析次数、允许缓存的测试模型"""
+    cache_results = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyze(self, sql_query):
+        self.calls += 1
+        return super().analyze(sql_query)
+
+
+class TestResultCache(unittest.TestCase):
+    def test_key_uses_normalized_sql(self):
+        """测试仅空白不同的SQL使用同一个缓存键"""
+        self.assertEqual(normalize_sql("  SELECT 1\n\tFROM  t "), "SELECT 1 FROM t")
+        self.assertEqual(ResultCache.make_key("ollama", "v1", "SELECT 1\nFROM t"),
+                         ResultCache.make_key("OLLAMA", "v1", "SELECT 1 FROM t"))
+        self.assertNotEqual(ResultCache.make_key("ollama", "v1", "SELECT 1"),
+                            ResultCache.make_key("ollama", "v2", "SELECT 1"))
+
+    def test_lru_eviction_and_counters(self):
+        """测试按条目数的LRU淘汰和命中统计"""
+        cache = ResultCache(max_entries=2, max_bytes=10 ** 6, ttl=60, path='', enabled=True)
+        cache.set("a", RESULT)
+        cache.set("b", RESULT)
+        self.assertIsNotNone(cache.get("a"))  # a 变为最近使用
+        cache.set("c", RESULT)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["entries"]), (2, 1, 1, 2))
+
+    def test_byte_limit(self):
+        """测试按字节数限制缓存大小"""
+        cache = ResultCache(max_entries=100, max_bytes=250, ttl=60, path='', enabled=True)
+        for key in "abcdef":
+            cache.set(key, RESULT)
+        self.assertLessEqual(cache.stats()["bytes"], 250)
+        self.assertIsNotNone(cache.get("f"))
+        self.assertIsNone(cache.get("a"))
+
+    def test_ttl_expiry(self):
+        """测试过期条目不再命中"""
+        cache = ResultCache(max_entries=10, max_bytes=10 ** 6, ttl=5, path='', enabled=True)
+        with mock.patch('utils.result_cache.time.time', return_value=1000.0):
+            cache.set("a", RESULT)
+        with mock.patch('utils.result_cache.time.time', return_value=1004.0):
+            self.assertIsNotNone(cache.get("a"))
+        with mock.patch('utils.result_cache.time.time', return_value=1006.0):
+            self.assertIsNone(cache.get("a"))
+
+    def test_hits_are_independent_copies(self):
+        """测试命中返回的结果互不影响"""
+        cache = ResultCache(max_entries=10, max_bytes=10 ** 6, ttl=60, path='', enabled=True)
+        cache.set("a", RESULT)
+        cache.get("a")["risk_score"] = 99
+        self.assertEqual(cache.get("a")["risk_score"], 10)
+
+    def test_persistent_store_survives_restart(self):
+        """测试SQLite持久化缓存在重启后仍可命中"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.db")
+            cache = ResultCache(max_entries=10, max_bytes=10 ** 6, ttl=60, path=path, enabled=True)
+            cache.set("a", RESULT)
+            cache.close()
+
+            reopened = ResultCache(max_entries=10, max_bytes=10 ** 6, ttl=60, path=path, enabled=True)
+            self.assertEqual(reopened.get("a"), RESULT)
+            self.assertEqual(reopened.stats()["disk_hits"], 1)
+            reopened.close()
+
+
+class TestCachedDispatch(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResultCache(max_entries=100, max_bytes=10 ** 6, ttl=60, path='', enabled=True)
+        self.patcher = mock.patch.object(app_module, 'result_cache', self.cache)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_repeated_statements_are_analyzed_once(self):
+        """测试重复语句只分析一次"""
+        model = CountingModel()
+        asyncio.run(app_module.run_analysis("counting", model, "SELECT 1"))
+        asyncio.run(app_module.run_analysis("counting", model, "SELECT   1"))
+        results = asyncio.run(app_module.run_batch_analysis(
+            "counting", model, ["SELECT 1", "DELETE FROM t", "DELETE  FROM t", "SELECT 2"]))
+        self.assertEqual(model.calls, 3)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[1], results[2])
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_rule_models_bypass_the_cache(self):
+        """测试规则模型不经过缓存"""
+        asyncio.run(app_module.run_analysis("simple", SimpleModel(), "SELECT 1"))
+        self.assertEqual(self.cache.stats()["misses"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
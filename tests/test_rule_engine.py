@@ -0,0 +1,94 @@
+import time
+import unittest
+from unittest import mock
+from models.rule_engine import RuleBudget, scan
+from models.advanced_model import AdvancedModel
+from models.tiered_model import TieredModel
+
+
+class TestRuleEngine(unittest.TestCase):
+    def test_keywords_require_word_boundaries(self):
+        """测试关键字必须是完整单词"""
+        self.assertIn("drop", scan("DROP TABLE users"))
+        self.assertIn("update", scan("x=1;update t set a=1"))
+        self.assertNotIn("drop", scan("SELECT dropped FROM t"))
+        self.assertNotIn("update", scan("SELECT last_update FROM t"))
+
+    def test_overlapping_features(self):
+        """测试相互重叠的特征不会互相遮蔽"""
+        # 关键字后直接跟括号时仍视为函数调用
+        self.assertIn("function", scan("select drop(x) from t"))
+        # ORDER BY / GROUP BY 后的 by( 仍视为函数调用
+        self.assertIn("function", scan("select a from t order by(a)"))
+        self.assertIn("group_by", scan("select a from t group  by a"))
+        # COUNT(*) 前有其他单词字符时仍能识别
+        features = scan("select xcount(*) from t")
+        self.assertIn("count_star", features)
+        self.assertIn("function", features)
+
+    def test_function_call_detection(self):
+        """测试函数调用识别（单词后跟可选空白和左括号）"""
+        self.assertIn("function", scan("where lower  (name) = ?"))
+        self.assertNotIn("function", scan("where id = (1 + 2)"))
+        self.assertNotIn("function", scan("select * from t"))
+
+    def test_shared_features_drive_all_rules(self):
+        """测试安全问题、性能建议和风险评分来自同一次扫描"""
+        model = AdvancedModel(use_ast=False)
+        sql = "SELECT * FROM a JOIN b WHERE upper(a.x) = 'y' ORDER BY a.x -- note"
+        result = model.analyze(sql)
+        self.assertEqual(result["safety_issues"], model.get_safety_issues(sql))
+        self.assertEqual(result["performance_suggestions"], model.get_performance_suggestions(sql))
+        self.assertEqual(result["risk_score"], model.calculate_risk_score(sql))
+        # 15 (quote) + 10 (comment) + 5 (SELECT *) + 15 (join without ON) + 10 (function in WHERE)
+        self.assertEqual(result["risk_score"], 55)
+        self.assertEqual(
+            [s["suggestion"] for s in result["performance_suggestions"]],
+            ["Avoid using SELECT *", "Potential Cartesian product", "ORDER BY without LIMIT",
+             "Function applied to column in WHERE clause"]
+        )
+
+    def test_results_are_independent_copies(self):
+        """测试返回的结果可以安全修改"""
+        model = AdvancedModel()
+        first = model.analyze("DROP TABLE users")
+        first["safety_issues"][0]["issue"] = "changed"
+        second = model.analyze("DROP TABLE users")
+        self.assertEqual(second["safety_issues"][0]["issue"], "Dangerous operation: DROP")
+
+
+    def test_time_budget_returns_partial_result(self):
+        """测试超出时间预算时返回带partial标记的部分结果"""
+        sql = "SELECT * FROM t WHERE " + "f(x) OR " * 200000 + "1"
+        model = AdvancedModel(use_ast=False, time_budget=1e-9)
+        result = model.analyze(sql)
+        self.assertTrue(result["partial"])
+        self.assertIn("partial", result["details"])
+        # 预算耗尽前找到的特征仍然生效
+        self.assertEqual(result["safety_issues"][0]["issue"], "Use of SELECT *")
+
+        self.assertNotIn("partial", AdvancedModel(use_ast=False, time_budget=0).analyze(sql))
+        exhausted = RuleBudget(1e-9)
+        time.sleep(0.001)
+        self.assertTrue(exhausted.expired())
+        self.assertFalse(RuleBudget(0).expired())
+
+    def test_large_statement_is_bounded(self):
+        """测试数MB的粘贴文本不会长时间占用CPU"""
+        model = AdvancedModel(time_budget=0.05)
+        for sql in ("(" * 5000000, "SELECT * FROM t WHERE id IN (" + "1, " * 1000000 + "1)"):
+            started = time.perf_counter()
+            model.analyze(sql)
+            self.assertLess(time.perf_counter() - started, 2.0)
+
+    def test_partial_screen_escalates(self):
+        """测试规则预筛部分完成时升级到LLM"""
+        model = TieredModel(screen=AdvancedModel(), escalation=mock.Mock())
+        reasons = model.escalation_reasons("SELECT a FROM t WHERE id = 1", {"risk_score": 0, "partial": True})
+        self.assertIn("rule screen exhausted its time budget", reasons)
+        reasons = model.escalation_reasons("SELECT a FROM t WHERE id IN (" + "1, " * 20000 + "1)", {"risk_score": 0})
+        self.assertIn("statement too large to parse", reasons)
+
+
+if __name__ == '__main__':
+    unittest.main()
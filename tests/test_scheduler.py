@@ -0,0 +1,152 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from models import SimpleModel, BatchScheduler, ScheduledModel, SchedulerBusyError, ModelRegistry, OllamaModel
+
+
+class FakeBackend:
+    """记录批次大小和并发数的模拟LLM后端"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+
+    async def analyze_batch(self, sql_queries):
+        self.batches.append(len(sql_queries))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return [{"sql": sql_query, "risk_score": 0} for sql_query in sql_queries]
+
+
+class FakeLLMModel(SimpleModel):
+    """不缓存结果的模拟LLM模型"""
+    cache_results = False
+    micro_batch = True
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def test_concurrent_requests_are_coalesced(self):
+        """测试并发请求合并为批次并把结果分发给各自的调用方"""
+        backend = FakeBackend()
+        scheduler = BatchScheduler(backend.analyze_batch, max_batch_size=8, max_wait=0.05, max_concurrency=2, max_queue=100)
+
+        async def run():
+            return await asyncio.gather(*(scheduler.submit(f"SELECT {i}") for i in range(20)))
+
+        results = asyncio.run(run())
+        self.assertEqual([result["sql"] for result in results], [f"SELECT {i}" for i in range(20)])
+        self.assertEqual(sorted(backend.batches), [4, 8, 8])
+        self.assertLessEqual(backend.max_running, 2)
+
+    def test_lone_request_waits_at_most_max_wait(self):
+        """测试单个请求在等待窗口结束后发出"""
+        backend = FakeBackend(delay=0)
+        scheduler = BatchScheduler(backend.analyze_batch, max_batch_size=8, max_wait=0.01, max_concurrency=1, max_queue=10)
+        self.assertEqual(asyncio.run(scheduler.submit("SELECT 1"))["sql"], "SELECT 1")
+        self.assertEqual(backend.batches, [1])
+
+    def test_full_queue_is_rejected(self):
+        """测试队列已满时拒绝新请求"""
+        backend = FakeBackend(delay=0.1)
+        scheduler = BatchScheduler(backend.analyze_batch, max_batch_size=1, max_wait=0, max_concurrency=1, max_queue=2)
+
+        async def run():
+            return await asyncio.gather(*(scheduler.submit(f"SELECT {i}") for i in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertIsInstance(results[2], SchedulerBusyError)
+        self.assertGreaterEqual(results[2].retry_after, 1)
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+    def test_batches_count_against_the_queue(self):
+        """测试批量请求计入队列上限，队列已满时被拒绝"""
+        backend = FakeBackend(delay=0.1)
+        scheduler = BatchScheduler(backend.analyze_batch, max_batch_size=4, max_wait=0, max_concurrency=1, max_queue=6)
+
+        async def run():
+            first = asyncio.ensure_future(scheduler.submit_batch([f"SELECT {i}" for i in range(4)]))
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.stats()["queued"], 4)
+            with self.assertRaises(SchedulerBusyError):
+                await scheduler.submit_batch(["SELECT 4", "SELECT 5", "SELECT 6"])
+            await first
+            # A batch larger than the whole queue still runs once the queue is empty
+            return await scheduler.submit_batch([f"SELECT {i}" for i in range(8)])
+
+        self.assertEqual(len(asyncio.run(run())), 8)
+        self.assertEqual(scheduler.stats()["queued"], 0)
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+    def test_streams_hold_a_queue_slot(self):
+        """测试流式分析占用调度器队列名额，结束或被丢弃后归还"""
+        scheduler = BatchScheduler(FakeBackend().analyze_batch, max_batch_size=4, max_concurrency=1, max_queue=1)
+        model = ScheduledModel(FakeLLMModel(), scheduler)
+
+        async def run():
+            events = model.astream_analyze("SELECT 1")
+            self.assertEqual(scheduler.stats()["queued"], 1)
+            with self.assertRaises(SchedulerBusyError):
+                model.astream_analyze("SELECT 2")
+            received = [event async for event in events]
+            self.assertEqual(scheduler.stats()["queued"], 0)
+            # 从未开始迭代就被丢弃的流也归还名额
+            model.astream_analyze("SELECT 3")
+            self.assertEqual(scheduler.stats()["queued"], 0)
+            return received
+
+        self.assertEqual([event["event"] for event in asyncio.run(run())], ["result"])
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+    def test_backend_errors_reach_every_caller(self):
+        """测试后端异常传递给批次中的每个调用方"""
+        async def failing(sql_queries):
+            raise Exception("backend down")
+
+        scheduler = BatchScheduler(failing, max_batch_size=4, max_wait=0.01, max_concurrency=1, max_queue=10)
+
+        async def run():
+            return await asyncio.gather(*(scheduler.submit("SELECT 1") for _ in range(3)), return_exceptions=True)
+
+        self.assertTrue(all(str(result) == "backend down" for result in asyncio.run(run())))
+
+    def test_registry_schedules_llm_models(self):
+        """测试注册表为LLM模型加上调度器"""
+        registry = ModelRegistry({"simple": SimpleModel, "ollama": OllamaModel})
+        self.assertIsInstance(registry.get("ollama"), ScheduledModel)
+        self.assertEqual(registry.get("ollama").model_name, "deepseek-coder:6.7b")
+        self.assertNotIsInstance(registry.get("simple"), ScheduledModel)
+
+
+class TestBackPressure(unittest.TestCase):
+    def test_busy_backend_returns_429(self):
+        """测试后端繁忙时返回429和Retry-After"""
+        scheduler = BatchScheduler(FakeBackend().analyze_batch, max_queue=0)
+        model = ScheduledModel(FakeLLMModel(), scheduler)
+        with mock.patch.object(app_module, 'get_model', return_value=model), TestClient(app_module.app) as client:
+            response = client.post("/api/analyze", json={"sql": "SELECT 1", "model": "ollama"})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["Retry-After"], "1")
+
+            response = client.post("/api/analyze/batch", json={"queries": ["SELECT 1", "SELECT 2"], "model": "ollama"})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["Retry-After"], "1")
+
+            response = client.post("/api/analyze/script?model=ollama", content=b"SELECT 1; SELECT 2;")
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["Retry-After"], "1")
+
+            response = client.post("/api/analyze/stream", json={"sql": "SELECT 1", "model": "ollama"})
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["Retry-After"], "1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import random
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from utils.edit_session import EditSession, SessionStore, TextEdit, VersionConflict
+from utils.statement_splitter import iter_statements
+
+PIECES = ["SELECT 1", ";", "\n", " ", "'", "a;b", "--", "/*", "*/", "$$", "$x$", "DROP TABLE t", "\"", ";;", "-- c;\n"]
+
+
+class TestEditSession(unittest.TestCase):
+    def test_incremental_split_matches_full_split(self):
+        """测试随机编辑后增量切分的结果与整体重新切分一致"""
+        rnd = random.Random(7)
+        for _ in range(300):
+            session = EditSession("s", "simple", "".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 20))))
+            for _ in range(5):
+                before = list(session.statements)
+                edits, length = [], len(session.text)
+                for _ in range(rnd.randint(1, 3)):
+                    start = rnd.randint(0, length)
+                    end = rnd.randint(start, length)
+                    text = "".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 3)))
+                    edits.append(TextEdit(start, end, text))
+                    length += len(text) - (end - start)
+                start, deleted, inserted = session.apply(edits)
+                expected = list(iter_statements([session.text]))
+                self.assertEqual(session.statements, expected)
+                self.assertEqual(before[:start] + inserted, expected[:start + len(inserted)])
+                self.assertEqual([s.sql for s in before[start + deleted:]],
+                                 [s.sql for s in expected[start + len(inserted):]])
+
+    def test_edit_splices_only_the_changed_statement(self):
+        """测试在长脚本中修改一行只替换对应的语句"""
+        text = "".join(f"SELECT * FROM t WHERE id = {i};\n" for i in range(2000))
+        session = EditSession("s", "simple", text)
+        offset = session.statements[1000].offset
+        splice = session.apply([TextEdit(offset, offset, "\n")], version=0)
+        self.assertEqual((splice.start, splice.deleted), (1000, 1))
+        self.assertEqual([(s.index, s.line) for s in splice.inserted], [(1000, 1002)])
+        self.assertEqual(session.statements[1999].line, 2001)
+        self.assertEqual(session.version, 1)
+
+        with self.assertRaises(VersionConflict):
+            session.apply([TextEdit(0, 0, "x")], version=0)
+        with self.assertRaises(ValueError):
+            session.apply([TextEdit(0, len(session.text) + 1, "")])
+        self.assertEqual(session.version, 1)
+
+    def test_store_bounds_and_expiry(self):
+        """测试会话数量上限、空闲过期和文本长度上限"""
+        store = SessionStore(max_sessions=2, ttl=60, max_chars=100)
+        first = store.create("simple")
+        store.create("simple")
+        store.create("simple")
+        self.assertEqual(len(store), 2)
+        with self.assertRaises(KeyError):
+            store.get(first.id)
+        with self.assertRaises(ValueError):
+            store.create("simple", "x" * 101)
+
+        store = SessionStore(max_sessions=2, ttl=60)
+        session = store.create("simple")
+        session.touched -= 120
+        with self.assertRaises(KeyError):
+            store.get(session.id)
+
+
+class TestSessionEndpoints(unittest.TestCase):
+    def test_edits_reanalyze_changed_statements_only(self):
+        """测试编辑后只分析文本发生变化的语句，并返回结果增量"""
+        text = "SELECT * FROM a;\nSELECT * FROM b;\nSELECT * FROM c;\n"
+        with mock.patch.object(app_module, 'session_store', SessionStore()), \
+                TestClient(app_module.app) as client:
+            response = client.post("/api/sessions", json={"text": text, "model": "advanced"})
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertEqual([(r["index"], r["line"]) for r in body["results"]], [(0, 1), (1, 2), (2, 3)])
+            session_id = body["session_id"]
+
+            model = app_module.get_model("advanced")
+            with mock.patch.object(model, 'analyze_batch', wraps=model.analyze_batch) as analyze_batch:
+                offset = text.index("SELECT * FROM b")
+                edit = {"start": offset, "end": offset + len("SELECT * FROM b"), "text": "DROP TABLE session_b"}
+                response = client.post(f"/api/sessions/{session_id}/edits", json={"version": 0, "edits": [edit]})
+                self.assertEqual(response.status_code, 200)
+                body = response.json()
+                self.assertEqual((body["version"], body["statements"], body["start"], body["deleted"]), (1, 3, 1, 1))
+                self.assertEqual(body["results"][0]["issues"][0]["description"], "Dangerous operation: DROP")
+                self.assertEqual(analyze_batch.call_args.args[0], ["DROP TABLE session_b"])
+
+            response = client.post(f"/api/sessions/{session_id}/edits", json={"version": 0, "edits": [edit]})
+            self.assertEqual(response.status_code, 409)
+            response = client.get(f"/api/sessions/{session_id}")
+            self.assertEqual(len(response.json()["results"]), 3)
+            self.assertEqual(client.delete(f"/api/sessions/{session_id}").status_code, 200)
+            self.assertEqual(client.get(f"/api/sessions/{session_id}").status_code, 404)
+            self.assertEqual(client.post("/api/sessions", json={"model": "unknown"}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
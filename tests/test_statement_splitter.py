@@ -0,0 +1,91 @@
+import json
+import random
+import unittest
+
+from fastapi.testclient import TestClient
+
+import app as app_module
+from utils.statement_splitter import iter_statements, split_statements
+
+SCRIPT = """-- migration 42
+CREATE TABLE a (id INT, name VARCHAR(10) DEFAULT 'x;y');
+INSERT INTO a VALUES (1, 'it''s; fine'), (2, "q;\\"");
+/* block ; comment */ UPDATE a SET name = 'b\\'c;' WHERE id = 1;
+CREATE FUNCTION f() RETURNS int AS $body$ BEGIN; RETURN 1; END; $body$ LANGUAGE plpgsql;
+SELECT `we;ird` FROM a # mysql ; comment
+WHERE id = $1;
+;;
+-- trailing comment ;
+DROP TABLE a"""
+
+
+class TestStatementSplitter(unittest.TestCase):
+    def test_semicolons_in_strings_and_comments(self):
+        """测试字符串、注释和美元引号中的分号不拆分语句"""
+        statements = split_statements(SCRIPT)
+        self.assertEqual(len(statements), 6)
+        self.assertTrue(statements[0].startswith("-- migration 42\nCREATE TABLE a"))
+        self.assertIn("'it''s; fine'", statements[1])
+        self.assertTrue(statements[3].endswith("$body$ LANGUAGE plpgsql"))
+        self.assertEqual(statements[5], "-- trailing comment ;\nDROP TABLE a")
+
+    def test_chunk_boundaries_do_not_matter(self):
+        """测试任意分块方式得到相同结果"""
+        expected = list(iter_statements([SCRIPT]))
+        for size in (1, 2, 3, 7, 64):
+            chunks = [SCRIPT[i:i + size] for i in range(0, len(SCRIPT), size)]
+            self.assertEqual(list(iter_statements(chunks)), expected)
+
+    def test_statement_spread_over_many_chunks(self):
+        """测试跨越大量分块的长语句与整体切分结果一致"""
+        script = "SELECT 1;\nINSERT INTO t VALUES " + ",".join(f"({i}, 'v;{i}')" for i in range(5000)) + ";\n" + SCRIPT
+        expected = list(iter_statements([script]))
+        rnd = random.Random(3)
+        for _ in range(5):
+            chunks, position = [], 0
+            while position < len(script):
+                size = rnd.randint(1, 40)
+                chunks.append(script[position:position + size])
+                position += size
+            self.assertEqual(list(iter_statements(chunks)), expected)
+
+    def test_statement_positions(self):
+        """测试语句序号和起始行号"""
+        statements = list(iter_statements(["SELECT 1;\n\n  SELECT 2;", "\nSELECT\n3"]))
+        self.assertEqual([(s.index, s.line, s.sql) for s in statements],
+                         [(0, 1, "SELECT 1"), (1, 3, "SELECT 2"), (2, 4, "SELECT\n3")])
+
+    def test_results_arrive_before_input_ends(self):
+        """测试语句在读到结束分号后立即产出"""
+        def chunks():
+            yield "SELECT 1; SELECT"
+            self.assertEqual(len(seen), 1)
+            yield " 2;"
+
+        seen = []
+        for statement in iter_statements(chunks()):
+            seen.append(statement)
+        self.assertEqual(len(seen), 2)
+
+
+class TestScriptEndpoint(unittest.TestCase):
+    def test_ndjson_results_per_statement(self):
+        """测试脚本接口逐条返回NDJSON结果"""
+        def body():
+            yield b"SELECT * FROM a;\nDROP TA"
+            yield b"BLE b;\n-- done"
+
+        with TestClient(app_module.app) as client:
+            response = client.post("/api/analyze/script?model=advanced", content=body())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+            records = [json.loads(line) for line in response.text.splitlines()]
+            self.assertEqual([(r["index"], r["line"]) for r in records], [(0, 1), (1, 2)])
+            self.assertEqual(records[1]["issues"][0]["description"], "Dangerous operation: DROP")
+
+            response = client.post("/api/analyze/script?model=unknown", content=b"SELECT 1")
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
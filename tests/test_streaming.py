@@ -0,0 +1,81 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app as app_module
+from models import OllamaModel
+from models.llm_stream import AnalysisStreamParser
+
+ANALYSIS = {
+    "safety_issues": [{"issue": 'Dangerous "DROP" {}', "severity": "high", "recommendation": "Back up first"}],
+    "performance_suggestions": [{"suggestion": "Add index", "impact": "low", "recommendation": "CREATE INDEX"}],
+    "risk_score": 80
+}
+
+
+def streaming_handler(text: str, size: int = 5):
+    """构造逐段返回生成文本的模拟Ollama接口"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        lines = "\n".join(json.dumps({"response": text[i:i + size]}) for i in range(0, len(text), size))
+        return httpx.Response(200, text=lines)
+    return handler
+
+
+class TestAnalysisStreamParser(unittest.TestCase):
+    def test_elements_emitted_when_complete(self):
+        """测试问题对象闭合后立即产出"""
+        text = "```json\n" + json.dumps(ANALYSIS) + "\n```"
+        parser = AnalysisStreamParser()
+        split = text.index("performance_suggestions")
+        first = parser.feed(text[:split])
+        self.assertEqual(first, [("safety_issue", ANALYSIS["safety_issues"][0])])
+        rest = []
+        for char in text[split:]:
+            rest.extend(parser.feed(char))
+        self.assertEqual(rest, [("performance_suggestion", ANALYSIS["performance_suggestions"][0])])
+        self.assertEqual(parser.text(), text)
+
+
+class TestOllamaStreaming(unittest.TestCase):
+    def test_astream_analyze_events(self):
+        """测试Ollama流式分析依次产出令牌、问题和最终结果"""
+        model = OllamaModel()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(streaming_handler(json.dumps(ANALYSIS))))
+
+        async def run():
+            with mock.patch('models.ollama_model.get_async_client', return_value=client):
+                return [event async for event in model.astream_analyze("DROP TABLE t")]
+
+        events = asyncio.run(run())
+        names = [event["event"] for event in events]
+        self.assertEqual(names[-1], "result")
+        self.assertLess(names.index("safety_issue"), names.index("performance_suggestion"))
+        self.assertEqual(events[-1]["data"]["risk_score"], 80)
+        self.assertEqual("".join(e["data"] for e in events if e["event"] == "token"), json.dumps(ANALYSIS))
+
+    def test_sse_endpoint(self):
+        """测试SSE接口转发问题和最终结果"""
+        client = httpx.AsyncClient(transport=httpx.MockTransport(streaming_handler(json.dumps(ANALYSIS))))
+        with mock.patch('models.ollama_model.get_async_client', return_value=client), \
+                mock.patch.object(app_module.result_cache, 'enabled', False), \
+                TestClient(app_module.app) as test_client:
+            response = test_client.post("/api/analyze/stream", json={"sql": "DROP TABLE t", "model": "ollama"})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+            events = [block.split("\n", 1) for block in response.text.strip().split("\n\n")]
+            names = [name[len("event: "):] for name, _ in events]
+            self.assertEqual(names.count("issue"), 2)
+            self.assertEqual(names[-1], "result")
+            result = json.loads(events[-1][1][len("data: "):])
+            self.assertEqual(result["safety_score"], 20.0)
+
+            response = test_client.post("/api/analyze/stream", json={"sql": "SELECT 1", "model": "advanced"})
+            self.assertTrue(response.text.startswith("event: result\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
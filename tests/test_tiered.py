@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from models import AdvancedModel, SimpleModel, TieredModel, ModelRegistry
+from models.ollama_model import OllamaModel
+
+
+class FakeLLMModel(SimpleModel):
+    """记录调用情况的模拟LLM模型"""
+    cache_results = True
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def analyze(self, sql_query):
+        return self.analyze_batch([sql_query])[0]
+
+    def analyze_batch(self, sql_queries):
+        self.calls.append(list(sql_queries))
+        if self.fail:
+            raise Exception("LLM unavailable")
+        return [{"safety_issues": [], "performance_suggestions": [], "risk_score": 90,
+                 "risk_level": "high", "details": "llm"} for _ in sql_queries]
+
+
+class TestTieredModel(unittest.TestCase):
+    def setUp(self):
+        self.llm = FakeLLMModel()
+        self.model = TieredModel(AdvancedModel(), self.llm, risk_threshold=30,
+                                 severity_threshold="high", complexity_threshold=60)
+
+    def test_low_risk_stays_on_rules(self):
+        """测试低风险语句只由规则层回答"""
+        result = self.model.analyze("SELECT id FROM t WHERE id = ?")
+        self.assertEqual(result["tier"], "rules")
+        self.assertEqual(self.llm.calls, [])
+
+    def test_escalation_thresholds(self):
+        """测试风险、严重级别和复杂度阈值触发升级"""
+        result = self.model.analyze("DROP TABLE users")
+        self.assertEqual(result["tier"], "llm")
+        self.assertEqual(result["risk_score"], 90)
+        self.assertTrue(any("severity" in reason for reason in result["escalation_reasons"]))
+
+        complex_model = TieredModel(AdvancedModel(), self.llm, risk_threshold=100, complexity_threshold=5)
+        result = complex_model.analyze("SELECT a, b, c FROM t WHERE a = 1 AND b = 2")
+        self.assertEqual(result["tier"], "llm")
+        self.assertTrue(result["escalation_reasons"][0].startswith("complexity"))
+
+    def test_batch_escalates_only_flagged_statements(self):
+        """测试批量分析只把需要升级的语句合并发送给LLM"""
+        queries = ["SELECT id FROM t WHERE id = 1", "DROP TABLE a", "SELECT id FROM t WHERE id = 2", "TRUNCATE TABLE b"]
+        results = asyncio.run(self.model.aanalyze_batch(queries))
+        self.assertEqual([result["tier"] for result in results], ["rules", "llm", "rules", "llm"])
+        self.assertEqual(self.llm.calls, [["DROP TABLE a", "TRUNCATE TABLE b"]])
+        self.assertEqual(results, self.model.analyze_batch(queries))
+
+    def test_escalation_is_decided_off_the_event_loop(self):
+        """测试升级判断（需要解析语句）不在事件循环线程中执行"""
+        threads = []
+        escalation_reasons = self.model.escalation_reasons
+
+        def record(sql_query, screened):
+            threads.append(threading.current_thread())
+            return escalation_reasons(sql_query, screened)
+
+        with mock.patch.object(self.model, 'escalation_reasons', side_effect=record):
+            asyncio.run(self.model.aanalyze("SELECT id FROM t WHERE id = 1"))
+            asyncio.run(self.model.aanalyze_batch(["DROP TABLE a", "SELECT id FROM t WHERE id = 2"]))
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_failed_escalation_falls_back_to_rules(self):
+        """测试LLM失败时返回规则层结果并标记错误"""
+        model = TieredModel(AdvancedModel(), FakeLLMModel(fail=True))
+        result = asyncio.run(model.aanalyze("DROP TABLE users"))
+        self.assertEqual(result["tier"], "rules")
+        self.assertTrue(result["error"])
+        self.assertEqual(result["safety_issues"][0]["issue"], "Dangerous operation: DROP")
+
+    def test_registry_shares_instances(self):
+        """测试注册表构建的分层模型复用共享实例"""
+        registry = ModelRegistry({"advanced": AdvancedModel, "ollama": OllamaModel, "tiered": TieredModel})
+        tiered = registry.get("tiered")
+        self.assertIs(tiered.screen, registry.get("advanced"))
+        self.assertIs(tiered.escalation, registry.get("ollama"))
+
+
+if __name__ == '__main__':
+    unittest.main()
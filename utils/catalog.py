@@ -0,0 +1,473 @@
+"""
+In-memory schema catalog: tables, columns, indexes and row counts.
+
+The catalog is loaded from DDL files (SCHEMA_DDL_PATHS: files or directories
+of ``*.sql``, applied in path order, so a directory of migrations works) and
+from a database reflected with SQLAlchemy (SCHEMA_DATABASE_URL), whose tables
+override DDL definitions of the same name. Rules look tables and index
+prefixes up in plain dictionaries keyed by lowercase name, so a lookup during
+analysis is a single dictionary hit.
+
+Refreshes are incremental: a DDL file is only re-read and re-parsed when its
+modification time or size changes, and a database table is only re-reflected
+when its definition changes (SQLite: the DDL stored in sqlite_master; other
+databases: tables that appear or disappear, everything on a forced refresh).
+Row counts come from the database's statistics (sqlite_stat1 after ANALYZE,
+pg_class, information_schema) and are re-read on every refresh; the catalog
+version only records their order of magnitude, so ordinary table growth
+does not invalidate cached results. The lookup dictionaries are rebuilt off
+to the side and swapped in, so analyses running during a refresh see either
+the old or the new schema.
+
+Catalogs travel to rule-pool workers with the models that use them; each
+process refreshes its own copy every SCHEMA_REFRESH_SECONDS, in a background
+thread started by the first analysis after the interval has passed.
+"""
+
+import glob
+import hashlib
+import os
+import threading
+import time
+import warnings
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from utils.logger import logger
+
+
+class Index(NamedTuple):
+    """An index; columns are lowercase column names, or normalized SQL for expression parts"""
+    name: str
+    columns: Tuple[str, ...]
+    unique: bool = False
+
+
+class Table(NamedTuple):
+    name: str
+    columns: Tuple[str, ...]
+    indexes: Tuple[Index, ...] = ()
+    row_count: Optional[int] = None
+
+
+# Row-count statistics by SQLAlchemy dialect name: (table, rows) per row
+_ROW_COUNT_QUERIES = {
+    "sqlite": "SELECT tbl, stat FROM sqlite_stat1",
+    "postgresql": ("SELECT c.relname, c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                   "WHERE c.relkind = 'r' AND n.nspname = current_schema()"),
+    "mysql": "SELECT table_name, table_rows FROM information_schema.tables WHERE table_schema = DATABASE()",
+}
+
+# DDL of every table and its indexes, for detecting changed tables without reflecting them
+_SQLITE_SIGNATURES = ("SELECT tbl_name, group_concat(coalesce(sql, name), ';') FROM "
+                      "(SELECT tbl_name, sql, name FROM sqlite_master WHERE type IN ('table', 'index') "
+                      "ORDER BY type, name) GROUP BY tbl_name")
+
+
+def _row_magnitude(row_count: Optional[int]) -> Optional[int]:
+    """Number of digits of a row count, as recorded in the catalog version"""
+    return len(str(max(row_count, 0))) if row_count is not None else None
+
+
+def _name(identifier: Any) -> str:
+    return (identifier.name if isinstance(identifier, exp.Expression) else str(identifier)).lower()
+
+
+def normalize_expression(node: exp.Expression) -> str:
+    """SQL of an index or predicate expression with column qualifiers removed, for comparison"""
+    node = node.transform(lambda n: exp.column(n.name) if isinstance(n, exp.Column) else n)
+    return node.sql().lower()
+
+
+def _index_column(node: exp.Expression) -> str:
+    if isinstance(node, exp.Ordered):
+        node = node.this
+    if isinstance(node, (exp.Column, exp.Identifier)):
+        return node.name.lower()
+    return normalize_expression(node)
+
+
+class _TableBuilder:
+    """Mutable table definition while DDL operations are replayed"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.columns: List[str] = []
+        self.indexes: Dict[str, Index] = {}
+        self.row_count: Optional[int] = None
+
+    def add_index(self, index: Index) -> None:
+        if not index.name:
+            index = index._replace(name=f"{self.name}_{'_'.join(index.columns)}_idx")
+        self.indexes[index.name] = index
+
+    def build(self) -> Table:
+        return Table(self.name, tuple(self.columns), tuple(self.indexes.values()), self.row_count)
+
+
+def _parse_ddl(text: str, dialect: Optional[str]) -> List[Tuple[Any, ...]]:
+    """Turn DDL text into a list of catalog operations; statements other than DDL are ignored"""
+    operations: List[Tuple[Any, ...]] = []
+    for statement in sqlglot.parse(text, read=dialect):
+        if isinstance(statement, exp.Create):
+            kind = str(statement.args.get("kind") or "").upper()
+            if kind == "TABLE" and isinstance(statement.this, exp.Schema):
+                operations.append(("table", _table_from_ddl(statement.this)))
+            elif kind == "INDEX" and isinstance(statement.this, exp.Index):
+                index = statement.this
+                table = index.args.get("table")
+                if table is not None:
+                    columns = tuple(_index_column(column) for column in index.args.get("columns") or ())
+                    operations.append(("index", _name(table),
+                                       Index(_name(index.this), columns, bool(statement.args.get("unique")))))
+        elif isinstance(statement, exp.Drop):
+            kind = str(statement.args.get("kind") or "").upper()
+            if kind in ("TABLE", "INDEX"):
+                operations.append((f"drop_{kind.lower()}", _name(statement.this)))
+        elif isinstance(statement, exp.AlterTable):
+            for action in statement.args.get("actions") or ():
+                if isinstance(action, exp.ColumnDef):
+                    operations.append(("add_column", _name(statement.this), _name(action.this)))
+    return operations
+
+
+def _table_from_ddl(schema: exp.Schema) -> _TableBuilder:
+    table = _TableBuilder(_name(schema.this))
+    for element in schema.expressions:
+        if isinstance(element, exp.ColumnDef):
+            column = _name(element.this)
+            table.columns.append(column)
+            for constraint in element.args.get("constraints") or ():
+                if isinstance(constraint.kind, exp.PrimaryKeyColumnConstraint):
+                    table.add_index(Index(f"{table.name}_pkey", (column,), True))
+                elif isinstance(constraint.kind, exp.UniqueColumnConstraint):
+                    table.add_index(Index(f"{table.name}_{column}_key", (column,), True))
+        elif isinstance(element, exp.PrimaryKey):
+            table.add_index(Index(f"{table.name}_pkey", tuple(_index_column(c) for c in element.expressions), True))
+        elif isinstance(element, exp.UniqueColumnConstraint) and isinstance(element.this, exp.Schema):
+            columns = tuple(_index_column(c) for c in element.this.expressions)
+            name = _name(element.this.this) if element.this.this is not None else ""
+            table.add_index(Index(name, columns, True))
+        elif isinstance(element, exp.IndexColumnConstraint):
+            schema_columns = element.args.get("schema")
+            if schema_columns is not None:
+                table.add_index(Index(_name(element.this) if element.this is not None else "",
+                                      tuple(_index_column(c) for c in schema_columns.expressions)))
+    return table
+
+
+def _replay(operations: Iterable[Tuple[Any, ...]], tables: Dict[str, _TableBuilder]) -> None:
+    for operation in operations:
+        kind = operation[0]
+        if kind == "table":
+            builder = operation[1]
+            copy = _TableBuilder(builder.name)
+            copy.columns = list(builder.columns)
+            copy.indexes = dict(builder.indexes)
+            tables[copy.name] = copy
+        elif kind == "index":
+            table = tables.get(operation[1])
+            if table is not None:
+                table.add_index(operation[2])
+        elif kind == "add_column":
+            table = tables.get(operation[1])
+            if table is not None and operation[2] not in table.columns:
+                table.columns.append(operation[2])
+        elif kind == "drop_table":
+            tables.pop(operation[1], None)
+        elif kind == "drop_index":
+            for table in tables.values():
+                table.indexes.pop(operation[1], None)
+
+
+class Catalog:
+    """
+    Schema metadata with constant-time lookups for the rule models.
+
+    ddl_paths, database_url and refresh_interval default to the
+    SCHEMA_DDL_PATHS (comma-separated), SCHEMA_DATABASE_URL and
+    SCHEMA_REFRESH_SECONDS (default 300; 0 refreshes only on request)
+    environment variables. Sources are loaded on construction; a source that
+    fails to load is logged and keeps its previous contents.
+    """
+
+    def __init__(self, ddl_paths: Optional[List[str]] = None, database_url: Optional[str] = None,
+                 refresh_interval: Optional[float] = None, dialect: Optional[str] = None):
+        if ddl_paths is None:
+            ddl_paths = [path.strip() for path in os.getenv('SCHEMA_DDL_PATHS', '').split(',') if path.strip()]
+        self.ddl_paths = list(ddl_paths)
+        self.database_url = database_url if database_url is not None else os.getenv('SCHEMA_DATABASE_URL', '')
+        self.refresh_interval = refresh_interval if refresh_interval is not None else float(os.getenv('SCHEMA_REFRESH_SECONDS', '300'))
+        self.dialect = dialect if dialect is not None else (os.getenv('SQL_DIALECT', '') or None)
+
+        # path -> ((mtime, size), operations) of every DDL file read so far
+        self._files: Dict[str, Tuple[Tuple[int, int], List[Tuple[Any, ...]]]] = {}
+        # Text loaded with load_ddl, by source name
+        self._texts: Dict[str, List[Tuple[Any, ...]]] = {}
+        # table -> (definition signature, reflected table) of the database
+        self._reflected: Dict[str, Tuple[Optional[str], Table]] = {}
+        self._row_counts: Dict[str, int] = {}
+
+        self._init_locks()
+        self._tables: Dict[str, Table] = {}
+        self._columns: Dict[str, frozenset] = {}
+        self._leading: Dict[Tuple[str, str], Index] = {}
+        self.version = "empty"
+        self.refreshed_at: Optional[float] = None
+        if self.ddl_paths or self.database_url:
+            self.refresh()
+
+    def _init_locks(self) -> None:
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._next_refresh = time.monotonic() + self.refresh_interval if self.refresh_interval > 0 else None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        del state["_lock"]
+        del state["_refresher"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_locks()
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def table(self, name: str) -> Optional[Table]:
+        """The table of that (lowercase, optionally schema-qualified) name"""
+        table = self._tables.get(name)
+        if table is None and "." in name:
+            table = self._tables.get(name.rsplit(".", 1)[1])
+        return table
+
+    def has_column(self, table: str, column: str) -> bool:
+        columns = self._columns.get(table)
+        return columns is not None and column in columns
+
+    def leading_index(self, table: str, column: str) -> Optional[Index]:
+        """An index whose first part is that column (or normalized expression), preferring unique ones"""
+        return self._leading.get((table, column))
+
+    def tables(self) -> List[Table]:
+        return list(self._tables.values())
+
+    def load_ddl(self, text: str, source: str = "<ddl>") -> None:
+        """Add (or replace) DDL given as text under a source name, then rebuild the lookups"""
+        operations = _parse_ddl(text, self.dialect)
+        with self._lock:
+            self._texts[source] = operations
+            self._rebuild()
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Reload changed sources; returns how many files and tables were reloaded and the table count"""
+        with self._lock:
+            return self._refresh(force)
+
+    def refresh_if_due(self) -> None:
+        """Start a background refresh when the refresh interval has passed; never waits for it"""
+        if self._next_refresh is None or time.monotonic() < self._next_refresh:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._refresher = threading.Thread(target=self._background_refresh, name="catalog-refresh", daemon=True)
+            self._refresher.start()
+        except Exception:
+            self._lock.release()
+            raise
+
+    def _background_refresh(self) -> None:
+        # Runs with the lock acquired by refresh_if_due
+        try:
+            self._refresh(False)
+        except Exception as e:
+            logger.warning(f"Schema catalog refresh failed: {str(e)}")
+            if self.refresh_interval > 0:
+                self._next_refresh = time.monotonic() + self.refresh_interval
+        finally:
+            self._lock.release()
+
+    def _refresh(self, force: bool) -> Dict[str, int]:
+        stats = {"files": self._refresh_files(force), "tables": 0}
+        if self.database_url:
+            stats["tables"] = self._refresh_database(force)
+        # Row counts are re-read from the database on every refresh
+        if stats["files"] or self.database_url or self.refreshed_at is None:
+            self._rebuild()
+        self.refreshed_at = time.time()
+        if self.refresh_interval > 0:
+            self._next_refresh = time.monotonic() + self.refresh_interval
+        stats["table_count"] = len(self._tables)
+        return stats
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "tables": len(self._tables),
+            "indexes": sum(len(table.indexes) for table in self._tables.values()),
+            "version": self.version,
+            "refreshed_at": self.refreshed_at,
+            "refresh_interval": self.refresh_interval,
+            "ddl_paths": self.ddl_paths,
+            "database": bool(self.database_url),
+        }
+
+    def _ddl_files(self) -> List[str]:
+        files = []
+        for path in self.ddl_paths:
+            if os.path.isdir(path):
+                files.extend(sorted(glob.glob(os.path.join(path, "**", "*.sql"), recursive=True)))
+            else:
+                files.append(path)
+        return files
+
+    def _refresh_files(self, force: bool) -> int:
+        reloaded = 0
+        present = set()
+        for path in self._ddl_files():
+            present.add(path)
+            try:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                cached = self._files.get(path)
+                if not force and cached is not None and cached[0] == signature:
+                    continue
+                with open(path, "r", encoding="utf-8") as file:
+                    operations = _parse_ddl(file.read(), self.dialect)
+            except (OSError, SqlglotError) as e:
+                logger.warning(f"Failed to load schema file {path}: {str(e)}")
+                continue
+            self._files[path] = (signature, operations)
+            reloaded += 1
+        for path in set(self._files) - present:
+            del self._files[path]
+            reloaded += 1
+        return reloaded
+
+    def _refresh_database(self, force: bool) -> int:
+        from sqlalchemy import create_engine, inspect, text
+
+        reloaded = 0
+        engine = create_engine(self.database_url)
+        try:
+            dialect = engine.dialect.name
+            with engine.connect() as connection:
+                signatures: Dict[str, Optional[str]] = {}
+                if dialect == "sqlite":
+                    signatures = {str(name).lower(): sql for name, sql in connection.execute(text(_SQLITE_SIGNATURES))}
+                self._row_counts = self._read_row_counts(connection, dialect)
+
+            inspector = inspect(engine)
+            names = {name.lower(): name for name in inspector.get_table_names()}
+            for name in set(self._reflected) - set(names):
+                del self._reflected[name]
+                reloaded += 1
+            for name, original in names.items():
+                signature = signatures.get(name)
+                cached = self._reflected.get(name)
+                if not force and cached is not None and (signature is None or cached[0] == signature):
+                    continue
+                self._reflected[name] = (signature, self._reflect_table(inspector, original))
+                reloaded += 1
+        except Exception as e:
+            logger.warning(f"Failed to reflect schema database: {str(e)}")
+        finally:
+            engine.dispose()
+        return reloaded
+
+    @staticmethod
+    def _read_row_counts(connection, dialect: str) -> Dict[str, int]:
+        from sqlalchemy import text
+
+        query = _ROW_COUNT_QUERIES.get(dialect)
+        if query is None:
+            return {}
+        counts: Dict[str, int] = {}
+        try:
+            for name, rows in connection.execute(text(query)):
+                if isinstance(rows, str):
+                    # sqlite_stat1.stat: "<rows> <rows per key prefix> ..."
+                    rows = rows.split(" ", 1)[0]
+                try:
+                    rows = int(float(rows))
+                except (TypeError, ValueError):
+                    continue
+                name = str(name).lower()
+                counts[name] = max(rows, counts.get(name, 0))
+        except Exception:
+            # No statistics yet (e.g. ANALYZE never ran): row counts stay unknown
+            return {}
+        return counts
+
+    @staticmethod
+    def _reflect_table(inspector, name: str) -> Table:
+        table = _TableBuilder(name.lower())
+        table.columns = [column["name"].lower() for column in inspector.get_columns(name)]
+        primary_key = inspector.get_pk_constraint(name) or {}
+        if primary_key.get("constrained_columns"):
+            table.add_index(Index(primary_key.get("name") or f"{table.name}_pkey",
+                                  tuple(column.lower() for column in primary_key["constrained_columns"]), True))
+        for constraint in inspector.get_unique_constraints(name):
+            table.add_index(Index(constraint.get("name") or "",
+                                  tuple(column.lower() for column in constraint["column_names"]), True))
+        with warnings.catch_warnings():
+            # Expression indexes are skipped by reflection; they are only known from DDL
+            warnings.simplefilter("ignore")
+            indexes = inspector.get_indexes(name)
+        for index in indexes:
+            columns = tuple(column.lower() for column in index.get("column_names") or () if column)
+            if columns:
+                table.add_index(Index(index.get("name") or "", columns, bool(index.get("unique"))))
+        return table.build()
+
+    def _rebuild(self) -> None:
+        """Replay every source into new lookup dictionaries and swap them in (lock held)"""
+        builders: Dict[str, _TableBuilder] = {}
+        for path in self._ddl_files():
+            cached = self._files.get(path)
+            if cached is not None:
+                _replay(cached[1], builders)
+        for operations in self._texts.values():
+            _replay(operations, builders)
+
+        tables = {name: builder.build() for name, builder in builders.items()}
+        for name, (_, table) in self._reflected.items():
+            tables[name] = table
+        for name, rows in self._row_counts.items():
+            if name in tables:
+                tables[name] = tables[name]._replace(row_count=rows)
+
+        leading: Dict[Tuple[str, str], Index] = {}
+        for name, table in tables.items():
+            for index in table.indexes:
+                if not index.columns:
+                    continue
+                key = (name, index.columns[0])
+                if key not in leading or (index.unique and not leading[key].unique):
+                    leading[key] = index
+
+        self._tables = tables
+        self._columns = {name: frozenset(table.columns) for name, table in tables.items()}
+        self._leading = leading
+        digest = hashlib.sha1(repr(sorted(
+            (name, table._replace(row_count=_row_magnitude(table.row_count))) for name, table in tables.items()
+        )).encode("utf-8")).hexdigest()[:12]
+        self.version = digest if tables else "empty"
+
+
+_shared_catalog: Optional[Catalog] = None
+_shared_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """The process-wide catalog configured by the SCHEMA_* environment variables, loaded on first use"""
+    global _shared_catalog
+    if _shared_catalog is None:
+        with _shared_lock:
+            if _shared_catalog is None:
+                _shared_catalog = Catalog()
+    return _shared_catalog
@@ -0,0 +1,267 @@
+"""
+Incremental analysis sessions for editors.
+
+A session holds the current text of a script, split into statements with
+their offsets, and the analysis result of each distinct statement text. An
+edit replaces a character range of the text; only the statements it can
+affect are split again. Statement boundaries before the edit cannot move, so
+the rescan starts at the statement containing the edit's start and stops at
+the first statement that ends on an old boundary past the edit: from a
+boundary the splitter is in its initial state, so everything after it would
+split exactly as before and is only shifted.
+
+Each edit request therefore yields one splice of the statement list (start
+index, number of statements removed, statements inserted); statements whose
+text was already in the session keep their result and only new texts are
+sent to the model.
+
+Sessions live in the memory of one API process; with several workers, a
+client must be routed to the same worker for the lifetime of its session.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from .statement_splitter import ScriptStatement, StatementSplitter
+
+# Characters fed to the splitter at a time while looking for a boundary to resync on
+RESCAN_CHUNK = 4096
+
+
+class TextEdit(NamedTuple):
+    """Replace text[start:end] with text; end None means to the end of the script"""
+    start: int
+    end: Optional[int]
+    text: str
+
+
+class Splice(NamedTuple):
+    """Statements [start, start + deleted) of the previous version were replaced by inserted"""
+    start: int
+    deleted: int
+    inserted: List[ScriptStatement]
+
+
+class VersionConflict(Exception):
+    """The edits were made against another version of the session's text"""
+
+    def __init__(self, version: int):
+        super().__init__(f"Session is at version {version}")
+        self.version = version
+
+
+class EditSession:
+    """One script being edited: its text, statements and per-statement results"""
+
+    def __init__(self, session_id: str, model_name: str, text: str = "", max_chars: Optional[int] = None):
+        self.id = session_id
+        self.model_name = model_name
+        self.max_chars = max_chars
+        self.text = ""
+        self.version = 0
+        self.statements: List[ScriptStatement] = []
+        # Analysis results by statement text, and how many statements have each text
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.results_version: Optional[str] = None
+        self._counts: Dict[str, int] = {}
+        # Whether the last statement runs to the end of the text without a ";"
+        self._open_tail = False
+        self.touched = time.monotonic()
+        # Serializes the edits and analyses of this session
+        self.lock = asyncio.Lock()
+        if text:
+            self._replace(0, 0, text)
+
+    def apply(self, edits: Iterable[TextEdit], version: Optional[int] = None) -> Splice:
+        """Apply edits in order, each against the text left by the previous one
+
+        Raises VersionConflict if version is given and is not the current
+        one, and ValueError if an edit's range is outside the text or the
+        text would grow past max_chars; either way the session is left
+        unchanged.
+        """
+        if version is not None and version != self.version:
+            raise VersionConflict(self.version)
+        edits = list(edits)
+        length = len(self.text)
+        for edit in edits:
+            end = length if edit.end is None else edit.end
+            if not 0 <= edit.start <= end <= length:
+                raise ValueError(f"Edit range {edit.start}:{end} is outside the text (length {length})")
+            length += len(edit.text) - (end - edit.start)
+            if self.max_chars is not None and length > self.max_chars:
+                raise ValueError(f"Script too large: {length} characters (maximum {self.max_chars})")
+
+        # Merge the splice of each edit into one splice of the previous version
+        low = high = old_high = None
+        for edit in edits:
+            start, deleted, inserted = self._replace(edit.start, edit.end, edit.text)
+            if low is None:
+                low, old_high, high = start, start + deleted, start + inserted
+                continue
+            # high and anything past it are the previous version's statements, shifted
+            end = max(high, start + deleted)
+            old_high += end - high
+            high = end - deleted + inserted
+            low = min(low, start)
+        self.version += 1
+        self.touched = time.monotonic()
+        if low is None:
+            return Splice(0, 0, [])
+        return Splice(low, old_high - low, self.statements[low:high])
+
+    def reset_results(self, results_version: Optional[str]) -> bool:
+        """Drop every result if they were produced by another model version; True if they were dropped"""
+        if results_version == self.results_version:
+            return False
+        self.results.clear()
+        self.results_version = results_version
+        return True
+
+    def missing(self, statements: Iterable[ScriptStatement]) -> List[str]:
+        """Distinct statement texts without a result, in order"""
+        pending: Dict[str, None] = {}
+        for statement in statements:
+            if statement.sql not in self.results:
+                pending[statement.sql] = None
+        return list(pending)
+
+    def _replace(self, start: int, end: Optional[int], text: str):
+        """Replace one range of the text and split what it affects again
+
+        Returns the splice as (start index, statements deleted, statements inserted).
+        """
+        old = self.text
+        if end is None:
+            end = len(old)
+        new = old[:start] + text + old[end:]
+        shift = len(text) - (end - start)
+        statements = self.statements
+
+        # First statement the edit can change: the one whose end is past the
+        # edit's start, or an unterminated last statement ending there
+        first = self._first_ending_after(start)
+        if first == len(statements) and self._open_tail and statements and statements[-1].end == start:
+            first -= 1
+        resume = statements[first - 1].end if first else 0
+
+        # Last old statement that ends on a boundary; the unterminated tail is not one
+        terminated = len(statements) - (1 if self._open_tail else 0)
+        splitter = StatementSplitter(first, new.count("\n", 0, resume) + 1, resume)
+        edit_end = start + len(text)
+        scanned: List[ScriptStatement] = []
+        resync = None
+        position = resume
+        while resync is None and position < len(new):
+            chunk = new[position:position + RESCAN_CHUNK]
+            position += len(chunk)
+            for statement in splitter.feed(chunk):
+                scanned.append(statement)
+                if statement.end >= edit_end:
+                    match = self._first_ending_after(statement.end - shift - 1, first - 1)
+                    if match < terminated and statements[match].end == statement.end - shift:
+                        resync = match
+                        break
+
+        if resync is None:
+            tail = splitter.flush()
+            scanned.extend(tail)
+            self._open_tail = bool(tail)
+            removed = statements[first:]
+            kept: List[ScriptStatement] = []
+        else:
+            removed = statements[first:resync + 1]
+            kept = statements[resync + 1:]
+            index_shift = first + len(scanned) - (resync + 1)
+            line_shift = text.count("\n") - old.count("\n", start, end)
+            if kept and (index_shift or line_shift or shift):
+                make = ScriptStatement._make
+                kept = [make((statement.index + index_shift, statement.line + line_shift, statement.sql,
+                              statement.offset + shift, statement.end + shift)) for statement in kept]
+
+        for statement in removed:
+            self._release(statement.sql)
+        for statement in scanned:
+            self._counts[statement.sql] = self._counts.get(statement.sql, 0) + 1
+        self.statements = statements[:first] + scanned + kept
+        self.text = new
+        return first, len(removed), len(scanned)
+
+    def _first_ending_after(self, offset: int, low: int = 0) -> int:
+        """Index of the first statement whose end is past offset (binary search from low)"""
+        statements = self.statements
+        low = max(low, 0)
+        high = len(statements)
+        while low < high:
+            middle = (low + high) // 2
+            if statements[middle].end > offset:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _release(self, sql: str) -> None:
+        count = self._counts[sql] - 1
+        if count:
+            self._counts[sql] = count
+        else:
+            del self._counts[sql]
+            self.results.pop(sql, None)
+
+
+class SessionStore:
+    """Open sessions by ID, bounded in number and expired when idle"""
+
+    def __init__(self, max_sessions: Optional[int] = None, ttl: Optional[float] = None,
+                 max_chars: Optional[int] = None):
+        self.max_sessions = max_sessions if max_sessions is not None else int(os.getenv('SESSION_MAX_ACTIVE', '1000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SESSION_TTL', '1800'))
+        self.max_chars = max_chars if max_chars is not None else int(os.getenv('SESSION_MAX_CHARS', '5000000'))
+        self._sessions: "OrderedDict[str, EditSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, model_name: str, text: str = "") -> EditSession:
+        """Open a session on text, evicting the least recently used one when full"""
+        if len(text) > self.max_chars:
+            raise ValueError(f"Script too large: {len(text)} characters (maximum {self.max_chars})")
+        session = EditSession(uuid.uuid4().hex, model_name, text, self.max_chars)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> EditSession:
+        """The session with this ID; raises KeyError if there is none or it expired"""
+        with self._lock:
+            session = self._sessions[session_id]
+            if self.ttl > 0 and time.monotonic() - session.touched > self.ttl:
+                del self._sessions[session_id]
+                raise KeyError(session_id)
+            session.touched = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self) -> None:
+        # Least recently used first: stop at the first session still alive
+        if self.ttl <= 0:
+            return
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.touched > deadline:
+                break
+            self._sessions.popitem(last=False)
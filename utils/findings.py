@@ -0,0 +1,170 @@
+"""
+Compact safety issues and performance suggestions for the rule-based models.
+
+The texts of a rule-based finding never change between analyses: only a few
+values (table, column, index names) are filled into them. Each rule is
+defined once in a process-wide catalog under a stable ID, and a result holds
+Finding objects that reference their rule and carry just those values,
+instead of a fresh dict of long strings per finding.
+
+A Finding reads like the dict the models used to return ("issue" or
+"suggestion", "severity" or "impact", "recommendation", "explanation"), so
+code that formats results is unchanged; it can be modified like one too, the
+changes being kept on that finding alone. encode_result serializes a result
+with each finding written as its rule ID and values; decode_result restores
+the findings from the catalog, so cached and pickled results stay small too.
+API responses do not use this encoding: they are formatted into the API's
+own issue structure, validated and encoded as plain dicts (see app.py).
+"""
+
+import json
+import sys
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+# Dict keys of the title and level of each kind of finding
+KIND_KEYS = {
+    "safety": ("issue", "severity"),
+    "performance": ("suggestion", "impact"),
+}
+
+# Key of an encoded finding's rule ID; not a key any model result uses
+_RULE_KEY = "$rule"
+
+
+class _Deleted:
+    """Override marking a key of the rule as deleted; pickled by reference"""
+
+    def __reduce__(self):
+        return "_DELETED"
+
+
+_DELETED = _Deleted()
+
+
+class Rule(NamedTuple):
+    """One catalog entry; with values, its texts are str.format templates ({0}, {1}, ...)"""
+    id: str
+    kind: str
+    title: str
+    level: str
+    recommendation: str
+    explanation: str = ""
+
+
+# Every defined rule by ID
+RULES: Dict[str, Rule] = {}
+
+
+def define_rule(rule_id: str, kind: str, title: str, level: str, recommendation: str,
+                explanation: str = "") -> Rule:
+    """Add a rule to the catalog and return it"""
+    if kind not in KIND_KEYS:
+        raise ValueError(f"Unknown finding kind: {kind}")
+    rule = Rule(sys.intern(rule_id), kind, title, level, recommendation, explanation)
+    RULES[rule.id] = rule
+    return rule
+
+
+class Finding(MutableMapping):
+    """A rule that matched, with the values filled into its texts"""
+
+    __slots__ = ("rule", "args", "_overrides")
+
+    def __init__(self, rule: Rule, args: Tuple[str, ...] = ()):
+        self.rule = rule
+        self.args = args
+        # Keys set or deleted on this finding, created on the first change
+        self._overrides: Optional[Dict[str, Any]] = None
+
+    def _text(self, template: str) -> str:
+        return template.format(*self.args) if self.args else template
+
+    def _rule_keys(self) -> Tuple[str, ...]:
+        keys = KIND_KEYS[self.rule.kind] + ("recommendation",)
+        return keys + ("explanation",) if self.rule.explanation else keys
+
+    def __getitem__(self, key: str) -> Any:
+        if self._overrides is not None and key in self._overrides:
+            value = self._overrides[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+        rule = self.rule
+        title_key, level_key = KIND_KEYS[rule.kind]
+        if key == title_key:
+            return self._text(rule.title)
+        if key == level_key:
+            return rule.level
+        if key == "recommendation":
+            return self._text(rule.recommendation)
+        if key == "explanation" and rule.explanation:
+            return self._text(rule.explanation)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if self._overrides is None:
+            self._overrides = {}
+        self._overrides[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        self[key]
+        self[key] = _DELETED
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self._rule_keys()
+        if self._overrides is None:
+            return iter(keys)
+        extra = [key for key in self._overrides if key not in keys]
+        return (key for key in keys + tuple(extra) if self._overrides.get(key) is not _DELETED)
+
+    def __len__(self) -> int:
+        if self._overrides is None:
+            return 4 if self.rule.explanation else 3
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        if self._overrides is not None:
+            return f"Finding({self.rule.id!r}, {self.args!r}, {dict(self)!r})"
+        return f"Finding({self.rule.id!r}, {self.args!r})"
+
+    def __reduce__(self):
+        # Pickled as the rule ID, like the JSON encoding
+        return finding, (self.rule.id,) + self.args, self._overrides
+
+    def __setstate__(self, state: Optional[Dict[str, Any]]) -> None:
+        self._overrides = state
+
+
+def finding(rule_id: str, *args: str) -> Finding:
+    """The finding of a catalog rule by ID; raises KeyError for an unknown rule"""
+    return Finding(RULES[rule_id], args)
+
+
+def _encode_finding(value: Any) -> Any:
+    if isinstance(value, Finding):
+        if value._overrides is not None:
+            return dict(value)
+        if value.args:
+            return {_RULE_KEY: value.rule.id, "args": value.args}
+        return {_RULE_KEY: value.rule.id}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_finding(value: Dict[str, Any]) -> Any:
+    rule_id = value.get(_RULE_KEY)
+    if rule_id is None:
+        return value
+    args = value.get("args")
+    # Values such as table names repeat across many results
+    return Finding(RULES[rule_id], tuple(map(sys.intern, args)) if args else ())
+
+
+def encode_result(result: Dict[str, Any]) -> str:
+    """Compact JSON for a result; findings are written as their rule ID and values"""
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=_encode_finding)
+
+
+def decode_result(payload: str) -> Dict[str, Any]:
+    """The result encoded by encode_result; raises KeyError if it refers to a rule no longer defined"""
+    return json.loads(payload, object_hook=_decode_finding)
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HTTPPoolConfig:
+    """
+    Connection pool settings shared by the LLM backends.
+
+    Every value can be overridden through an environment variable:
+    - HTTP_POOL_CONNECTIONS: number of per-host pools kept alive
+    - HTTP_POOL_MAXSIZE: maximum keep-alive connections per host
+    - HTTP_POOL_BLOCK: wait for a free connection instead of opening extra sockets
+    - HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT: timeouts in seconds
+    - HTTP_MAX_RETRIES / HTTP_BACKOFF_FACTOR: retries with exponential backoff
+      on connection errors and 429/502/503/504 responses; POST requests (LLM
+      generations) are only retried on connection errors and 429/503
+    """
+
+    def __init__(self,
+                 pool_connections: Optional[int] = None,
+                 pool_maxsize: Optional[int] = None,
+                 pool_block: Optional[bool] = None,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None,
+                 backoff_factor: Optional[float] = None):
+        self.pool_connections = pool_connections if pool_connections is not None else int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+        self.pool_block = pool_block if pool_block is not None else os.getenv('HTTP_POOL_BLOCK', 'true').lower() == 'true'
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+        self.read_timeout = read_timeout if read_timeout is not None else float(os.getenv('HTTP_READ_TIMEOUT', '120'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('HTTP_MAX_RETRIES', '3'))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) timeout tuple accepted by requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+
+# Statuses worth retrying: rate limiting and transient gateway/server errors
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Statuses that mean a POST was refused before any work was done. A read
+# timeout or a 502/504 may come after the backend has started a generation
+# that runs for minutes, so resending would only pile up duplicate work.
+POST_RETRY_STATUSES = (429, 503)
+
+
+class GenerationRetry(Retry):
+    """Retry policy that resends a POST only when the backend refused it
+
+    POST is not an allowed method, so read errors are never retried for it;
+    connection errors are, since the request was never sent.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method and method.upper() == 'POST':
+            return status_code in POST_RETRY_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def create_session(config: Optional[HTTPPoolConfig] = None) -> requests.Session:
+    """Create a requests session with a keep-alive connection pool and retry policy"""
+    config = config or HTTPPoolConfig()
+    retry = GenerationRetry(
+        total=config.max_retries,
+        connect=config.max_retries,
+        read=config.max_retries,
+        status=config.max_retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.pool_connections,
+        pool_maxsize=config.pool_maxsize,
+        pool_block=config.pool_block,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(name: str = 'default') -> requests.Session:
+    """Return the process-wide pooled session registered under name, creating it on first use
+
+    requests sessions are safe to share between threads for issuing requests,
+    so every model instance using the same name shares one connection pool.
+    """
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = create_session()
+            _sessions[name] = session
+    return session
+
+
+def close_sessions() -> None:
+    """Close every shared session and its pooled connections"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def create_async_client(config: Optional[HTTPPoolConfig] = None) -> httpx.AsyncClient:
+    """Create a non-blocking HTTP client with the same pool limits and timeouts as create_session"""
+    config = config or HTTPPoolConfig()
+    limits = httpx.Limits(
+        max_connections=config.pool_connections * config.pool_maxsize,
+        max_keepalive_connections=config.pool_maxsize
+    )
+    # The transport retries failed connection attempts; status-based retries
+    # with backoff are handled by async_send
+    transport = httpx.AsyncHTTPTransport(retries=config.max_retries, limits=limits)
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout)
+    )
+
+
+# Async clients are bound to the event loop that created them, so they are
+# cached per loop and dropped together with it
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client(name: str = 'default') -> httpx.AsyncClient:
+    """Return the pooled async client registered under name for the running event loop"""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(name)
+    if client is None or client.is_closed:
+        client = create_async_client()
+        clients[name] = client
+    return client
+
+
+async def aclose_async_clients() -> None:
+    """Close every async client created on the running event loop"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+async def async_send(client: httpx.AsyncClient, request: httpx.Request,
+                     config: Optional[HTTPPoolConfig] = None) -> httpx.Response:
+    """Send a request with streaming enabled, retrying retryable statuses with exponential backoff
+
+    POST requests are retried only on POST_RETRY_STATUSES. The caller owns
+    the returned response and must close it (or read it fully).
+    """
+    config = config or HTTPPoolConfig()
+    statuses = POST_RETRY_STATUSES if request.method == 'POST' else RETRY_STATUSES
+    attempt = 0
+    while True:
+        response = await client.send(request, stream=True)
+        if response.status_code not in statuses or attempt >= config.max_retries:
+            return response
+        await response.aclose()
+
+        delay = config.backoff_factor * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        attempt += 1
+        await asyncio.sleep(delay)
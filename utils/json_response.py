@@ -0,0 +1,34 @@
+"""
+JSON encoding for API responses.
+
+Endpoints that have already validated their payload return it as a
+FastJSONResponse, which skips FastAPI's jsonable_encoder pass (a recursive,
+pure-Python walk over every value) and encodes the payload straight to
+bytes: with orjson when it is installed, with the standard library
+otherwise. Both write UTF-8 text without ASCII escapes and without
+whitespace, so the two produce the same bytes for API payloads.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Encode JSON-compatible content (dicts, lists, strings, numbers, booleans, None) as UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for content that is already JSON-compatible; encoded with dumps"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
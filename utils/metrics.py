@@ -0,0 +1,317 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are kept in memory and rendered on demand
+by ``REGISTRY.render()`` for the ``/metrics`` endpoint. Every metric has a
+fixed set of label names; ``metric.labels(...)`` returns the child for one
+combination of label values, and hot paths look their children up once and
+keep them, so recording a value costs a lock and a few additions.
+
+Values that already live elsewhere (cache counters, scheduler queues) are
+not duplicated: a collector registered with ``REGISTRY.add_collector`` is
+called at scrape time and returns samples read from their owners.
+
+Metrics are per process; analyses run in rule-pool workers are only
+visible through the timings recorded around them in the API process.
+"""
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the latency buckets: rule stages take microseconds, LLM calls seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collector returns (name, type, help, [(labels, value), ...]) families
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    """A named metric family with fixed label names; children are created on first use"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the child for these label values, in labelnames order"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self) -> None:
+        """Reset every child to zero, e.g. between tests; children held by callers stay registered"""
+        with self._lock:
+            children = list(self._children.values())
+        for child in children:
+            child.reset()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            children = sorted(self._children.items(), key=lambda item: item[0])
+        for key, child in children:
+            lines.extend(self._render_child(self._label_dict(key), child))
+        return lines
+
+    def _render_child(self, labels: Dict[str, str], child) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.value = 0.0
+
+
+class Counter(_Metric):
+    """Monotonically increasing count; the name should end in _total"""
+
+    type = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, such as requests in flight"""
+
+    type = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+
+class _Timer:
+    """Context manager observing the elapsed wall time into a histogram child"""
+
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One slot per bucket plus the +Inf overflow; made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def time(self) -> _Timer:
+        """Time a block: ``with histogram.labels(...).time(): ...``"""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets, with their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, labels: Dict[str, str], child: _HistogramChild) -> List[str]:
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            bucket_labels = dict(labels, le=_format_value(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process and the collectors read at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Register a function returning metric families computed at scrape time"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def clear(self) -> None:
+        """Reset every metric's values; registrations and collectors are kept"""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Whether the /metrics endpoint is served (env METRICS_ENABLED); recording is always on, it is cheap
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "sqlcheck_stage_duration_seconds",
+    "Time spent in each stage of an analysis, by model and stage",
+    ("model", "stage")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "sqlcheck_request_duration_seconds",
+    "Time to serve an API request, by endpoint and status code",
+    ("endpoint", "status")
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "sqlcheck_requests_in_flight",
+    "API requests being served, by endpoint",
+    ("endpoint",)
+)
+BACKEND_ERRORS = REGISTRY.counter(
+    "sqlcheck_backend_errors_total",
+    "Failed calls to an LLM backend or its token endpoint, by backend and operation",
+    ("backend", "operation")
+)
+TOKEN_REFRESHES = REGISTRY.counter(
+    "sqlcheck_token_refreshes_total",
+    "Access tokens fetched from a backend's token endpoint",
+    ("backend",)
+)
+RESPONSE_REPAIRS = REGISTRY.counter(
+    "sqlcheck_response_repairs_total",
+    "LLM responses that needed a repair generation",
+    ("backend",)
+)
+
+
+def stage_timer(model: str, stage: str) -> _HistogramChild:
+    """The latency histogram child for one stage of a model; call .time() on it around the stage"""
+    return STAGE_SECONDS.labels(model, stage)
@@ -0,0 +1,188 @@
+"""
+On-demand cProfile capture for individual analysis requests.
+
+A profiled request runs its analysis synchronously under cProfile on a
+worker thread, so the trace shows exactly where that statement's time goes
+(rule evaluation, parsing, prompt rendering, response parsing) without the
+event loop's unrelated work mixed in. Each trace is written to
+PROFILE_DIR as a ``.prof`` file (loadable with pstats or snakeviz) next to
+a small JSON record describing the request; the oldest traces are removed
+once PROFILE_MAX_STORED is exceeded.
+
+Only one request is profiled at a time: profilers cannot be nested, and a
+second concurrent capture would distort both. Requests that arrive while a
+capture is running are served normally without a trace.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Profile IDs are generated here; anything else is rejected before touching the filesystem
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$")
+
+REPORT_SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+class ProfileStore:
+    """Stored profiles on local disk, newest first, bounded in number"""
+
+    def __init__(self, directory: Optional[str] = None, max_profiles: Optional[int] = None):
+        self.directory = directory or os.getenv('PROFILE_DIR', 'profiles')
+        self.max_profiles = max_profiles if max_profiles is not None else int(os.getenv('PROFILE_MAX_STORED', '100'))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_id(profile_id: str) -> bool:
+        return bool(_PROFILE_ID.match(profile_id))
+
+    def path(self, profile_id: str, extension: str = "prof") -> str:
+        if not self.valid_id(profile_id):
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profiler: cProfile.Profile, info: Dict[str, Any]) -> str:
+        """Write the profile and its record; returns the new profile ID"""
+        now = time.time()
+        # UTC timestamp to the microsecond, so IDs sort by creation time
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:8]}"
+        record = dict(info, id=profile_id, created=now)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(self.path(profile_id))
+            with open(self.path(profile_id, "json"), "w", encoding="utf-8") as file:
+                json.dump(record, file, ensure_ascii=False)
+            self._prune()
+        return profile_id
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Records of every stored profile, newest first"""
+        records = []
+        for profile_id in self._ids():
+            try:
+                records.append(self.info(profile_id))
+            except KeyError:
+                continue
+        return records
+
+    def info(self, profile_id: str) -> Dict[str, Any]:
+        """The JSON record of a profile; raises KeyError if there is none"""
+        try:
+            with open(self.path(profile_id, "json"), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            raise KeyError(profile_id)
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 40) -> str:
+        """Human-readable pstats listing of the top functions of a profile"""
+        path = self.path(profile_id)
+        if not os.path.exists(path):
+            raise KeyError(profile_id)
+        if sort not in REPORT_SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort}. Available options: {', '.join(REPORT_SORT_KEYS)}")
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def delete(self, profile_id: str) -> bool:
+        removed = False
+        with self._lock:
+            for extension in ("prof", "json"):
+                try:
+                    os.remove(self.path(profile_id, extension))
+                    removed = True
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def _ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # IDs start with a UTC timestamp, so reverse name order is newest first
+        return sorted((name[:-len(".json")] for name in names
+                       if name.endswith(".json") and self.valid_id(name[:-len(".json")])), reverse=True)
+
+    def _prune(self) -> None:
+        for profile_id in self._ids()[self.max_profiles:]:
+            for extension in ("prof", "json"):
+                try:
+                    os.remove(self.path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and captures their traces.
+
+    A request is profiled when the caller asks for it (the API checks the
+    admin token) or, while the admin toggle is on, with probability
+    sample_rate. The toggle and rate start from PROFILING_ENABLED and
+    PROFILE_SAMPLE_RATE and can be changed at runtime.
+    """
+
+    def __init__(self, store: Optional[ProfileStore] = None, enabled: Optional[bool] = None,
+                 sample_rate: Optional[float] = None):
+        self.store = store or ProfileStore()
+        self.enabled = enabled if enabled is not None else os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILE_SAMPLE_RATE', '0.01'))
+        self._busy = threading.Lock()
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Update the admin toggle and sample rate; returns the current settings"""
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+        if enabled is not None:
+            self.enabled = enabled
+        return self.settings()
+
+    def settings(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate, "directory": self.store.directory,
+                "max_profiles": self.store.max_profiles}
+
+    def should_profile(self, requested: bool = False) -> bool:
+        """Whether to profile this request: explicitly requested, or sampled while the toggle is on"""
+        if requested:
+            return True
+        return self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, function: Callable[..., Any], *args: Any, info: Optional[Dict[str, Any]] = None) -> Tuple[Any, Optional[str]]:
+        """Call function(*args) under cProfile and store the trace
+
+        Returns the function's result and the profile ID, or None as the ID
+        when another capture is already running (the call is then made
+        without profiling). Exceptions propagate; their trace is still stored.
+        """
+        if not self._busy.acquire(blocking=False):
+            return function(*args), None
+        try:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            error = None
+            try:
+                result = profiler.runcall(function, *args)
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                record = dict(info or {})
+                record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                if error is not None:
+                    record["error"] = error
+                profile_id = self.store.save(profiler, record)
+            return result, profile_id
+        finally:
+            self._busy.release()
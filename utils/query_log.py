@@ -0,0 +1,183 @@
+"""
+Streaming readers for the SQL sources accepted by the command-line auditor.
+
+Plain SQL scripts are split with the incremental statement splitter; MySQL
+slow query logs and PostgreSQL server logs (log_min_duration_statement or
+log_statement) are parsed line by line. Every reader yields statements as it
+goes and holds at most one chunk or one log entry in memory, so a day of
+logs is read in constant memory. Files ending in .gz are decompressed on the
+fly.
+"""
+
+import fnmatch
+import gzip
+import os
+import re
+import sys
+from itertools import chain
+from typing import IO, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from .statement_splitter import iter_statements
+
+# Input formats; "auto" sniffs the start of each file
+FORMATS = ("auto", "sql", "mysql-slow", "postgres")
+
+# Files picked up when a directory is given
+DEFAULT_PATTERNS = ("*.sql", "*.log", "*.sql.gz", "*.log.gz")
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_MYSQL_QUERY_TIME = re.compile(r"#\s*Query_time:\s*([\d.]+)")
+# Lines of a slow log entry that are not part of the query
+_MYSQL_NOISE = re.compile(r"(?:SET timestamp\s*=\s*\d+;|use\s+[^;\s][^;]*;)\s*$", re.IGNORECASE)
+# Banner mysqld writes at the top of the file and after every restart
+_MYSQL_BANNER = re.compile(r"(?:(?<!\S)\S+, Version: .*started with:|Tcp port: |Time\s+Id\s+Command\s+Argument)")
+
+# "LOG:  duration: 12.3 ms  statement: ..." / "LOG:  execute <unnamed>: ..." / "LOG:  statement: ..."
+_POSTGRES_STATEMENT = re.compile(
+    r"\bLOG:\s+(?:duration:\s*(?P<ms>[\d.]+)\s*ms\s+)?(?:statement|execute\s+[^:\s][^:]*):\s?(?P<sql>.*)$"
+)
+
+
+class LoggedStatement(NamedTuple):
+    """One statement read from a source: where it came from and, for logs, how long it ran"""
+    source: str
+    line: int
+    sql: str
+    query_time: Optional[float]  # Seconds, when the log records it
+
+
+def detect_format(head: str) -> str:
+    """Guess the format of a source from its first few kilobytes"""
+    if _MYSQL_QUERY_TIME.search(head) or _MYSQL_BANNER.search(head):
+        return "mysql-slow"
+    if any(_POSTGRES_STATEMENT.search(line) for line in head.splitlines()[:200]):
+        return "postgres"
+    return "sql"
+
+
+def iter_sql_script(chunks: Iterable[str], source: str) -> Iterator[LoggedStatement]:
+    """Split a SQL script into statements as its chunks are read"""
+    for statement in iter_statements(chunks):
+        yield LoggedStatement(source, statement.line, statement.sql, None)
+
+
+def _entry(source: str, line: int, parts: List[str], query_time: Optional[float]) -> Optional[LoggedStatement]:
+    sql = "".join(parts).strip()
+    while sql.endswith(";"):
+        sql = sql[:-1].rstrip()
+    return LoggedStatement(source, line, sql, query_time) if sql else None
+
+
+def iter_mysql_slow_log(lines: Iterable[str], source: str) -> Iterator[LoggedStatement]:
+    """Parse a MySQL slow query log
+
+    Each entry is a block of "# ..." header lines (with Query_time) followed
+    by the statement, usually preceded by "SET timestamp=...;" and sometimes
+    "use <db>;", which are skipped.
+    """
+    parts: List[str] = []
+    start = 0
+    query_time: Optional[float] = None
+    for number, line in enumerate(lines, 1):
+        if line.startswith("#"):
+            if parts:
+                entry = _entry(source, start, parts, query_time)
+                if entry:
+                    yield entry
+                parts = []
+                query_time = None
+            match = _MYSQL_QUERY_TIME.match(line)
+            if match:
+                query_time = float(match.group(1))
+            continue
+        if not parts:
+            if not line.strip() or _MYSQL_NOISE.match(line) or _MYSQL_BANNER.match(line):
+                continue
+            start = number
+        parts.append(line)
+    if parts:
+        entry = _entry(source, start, parts, query_time)
+        if entry:
+            yield entry
+
+
+def iter_postgres_log(lines: Iterable[str], source: str) -> Iterator[LoggedStatement]:
+    """Parse a PostgreSQL server log for logged statements
+
+    Statements come from "statement:" and "execute ...:" LOG lines, with the
+    duration when log_min_duration_statement recorded one. A statement
+    spanning several lines continues on lines that start with whitespace.
+    """
+    parts: List[str] = []
+    start = 0
+    query_time: Optional[float] = None
+    for number, line in enumerate(lines, 1):
+        if parts and line[:1] in ("\t", " "):
+            parts.append(line[1:] if line[:1] == "\t" else line)
+            continue
+        if parts:
+            entry = _entry(source, start, parts, query_time)
+            if entry:
+                yield entry
+            parts = []
+        match = _POSTGRES_STATEMENT.search(line)
+        if match:
+            start = number
+            query_time = float(match.group("ms")) / 1000 if match.group("ms") else None
+            parts = [match.group("sql") + "\n"]
+    if parts:
+        entry = _entry(source, start, parts, query_time)
+        if entry:
+            yield entry
+
+
+def _read_chunks(file: IO[str]) -> Iterator[str]:
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_file(file: IO[str], source: str, input_format: str = "auto") -> Iterator[LoggedStatement]:
+    """Read statements from an open text file in the given (or detected) format"""
+    head = ""
+    if input_format == "auto":
+        # Sniff the first chunk, completed to a line boundary so log parsers see whole lines
+        head = file.read(READ_CHUNK_SIZE)
+        head += file.readline()
+        input_format = detect_format(head)
+
+    if input_format == "sql":
+        return iter_sql_script(chain([head], _read_chunks(file)), source)
+    lines = chain(head.splitlines(keepends=True), file)
+    if input_format == "mysql-slow":
+        return iter_mysql_slow_log(lines, source)
+    if input_format == "postgres":
+        return iter_postgres_log(lines, source)
+    raise ValueError(f"Unsupported input format: {input_format}. Available options: {', '.join(FORMATS)}")
+
+
+def expand_paths(paths: Sequence[str], patterns: Sequence[str] = DEFAULT_PATTERNS) -> Iterator[str]:
+    """Yield the files to read: "-" for stdin, files as given, directories walked in sorted order"""
+    for path in paths:
+        if path == "-" or not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    yield os.path.join(root, name)
+
+
+def iter_sources(paths: Sequence[str], input_format: str = "auto",
+                 patterns: Sequence[str] = DEFAULT_PATTERNS) -> Iterator[LoggedStatement]:
+    """Read statements from files, directories and stdin ("-"), one source after another"""
+    for path in expand_paths(paths, patterns):
+        if path == "-":
+            yield from iter_file(sys.stdin, "<stdin>", input_format)
+            continue
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as file:
+            yield from iter_file(file, path, input_format)
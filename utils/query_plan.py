@@ -0,0 +1,332 @@
+"""
+Query plan analysis against a live database.
+
+PlanAnalyzer asks the database configured by PLAN_DATABASE_URL how it would
+execute a statement (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN (FORMAT
+JSON)`` on PostgreSQL, ``EXPLAIN`` on MySQL) and reduces the plan to a few
+findings: full table scans, temporary sort/group structures (temp B-trees,
+automatic indexes, filesorts) and nested loops that scan the inner table
+once per outer row.
+
+Only a single SELECT is ever sent, with bind parameters replaced by NULL,
+over connections that are switched to read-only when they are opened. The
+connection pool is bounded (PLAN_POOL_SIZE connections, no overflow): a
+statement that cannot get a connection within PLAN_POOL_TIMEOUT seconds is
+analyzed without a plan rather than queued behind the others, so plan
+analysis never puts more than the pool's load on the target database. Each
+process that analyzes statements (the API and every rule-pool worker) opens
+its own pool.
+
+Plans are cached by query fingerprint for PLAN_CACHE_TTL seconds, so
+statements differing only in their constants share one EXPLAIN; statements
+the database rejects are cached too, as having no plan.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlglot import exp
+
+from utils.fingerprint import fingerprint_hash
+from utils.logger import logger
+from utils.metrics import BACKEND_ERRORS, stage_timer
+from utils.sql_parser import parse
+
+_EXPLAIN_SECONDS = stage_timer("plan", "explain")
+_EXPLAIN_ERRORS = BACKEND_ERRORS.labels("plan", "explain")
+_POOL_TIMEOUTS = BACKEND_ERRORS.labels("plan", "pool")
+
+# sqlglot dialect used to render the statement, by SQLAlchemy dialect name
+_SQLGLOT_DIALECTS = {"sqlite": "sqlite", "postgresql": "postgres", "mysql": "mysql"}
+
+_EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN (FORMAT JSON) ", "mysql": "EXPLAIN "}
+
+
+class PlanFinding(NamedTuple):
+    """One problem in a query plan
+
+    kind is "full_scan" (table), "temp_structure" (table or "", detail names
+    the clause or structure) or "nested_loop" (table is the inner table,
+    detail the outer one). rows is the planner's row estimate, when it gives one.
+    """
+    kind: str
+    table: str
+    detail: str = ""
+    rows: Optional[int] = None
+
+
+def _aliases(statement: exp.Expression) -> Dict[str, str]:
+    return {table.alias_or_name.lower(): table.name.lower() for table in statement.find_all(exp.Table)}
+
+
+def sqlite_findings(rows: Iterable[Tuple[Any, ...]], aliases: Dict[str, str]) -> List[PlanFinding]:
+    """Findings of an EXPLAIN QUERY PLAN result: (id, parent, notused, detail) rows"""
+    findings: List[PlanFinding] = []
+    # Full scans per loop level; a later scan under the same parent runs once per row of the earlier ones
+    scans: Dict[Any, List[str]] = {}
+    for row in rows:
+        parent, detail = row[1], str(row[3])
+        words = detail.split()
+        if len(words) >= 2 and words[0] in ("SCAN", "SEARCH"):
+            name = (words[2] if words[1] == "TABLE" and len(words) > 2 else words[1]).lower()
+            # Subqueries, CTEs and constant rows are not tables
+            if name not in aliases:
+                continue
+            table = aliases[name]
+            if words[0] == "SCAN" and "INDEX" not in words:
+                findings.append(PlanFinding("full_scan", table))
+                for outer in scans.get(parent, ()):
+                    findings.append(PlanFinding("nested_loop", table, outer))
+                scans.setdefault(parent, []).append(table)
+            elif "AUTOMATIC" in words:
+                findings.append(PlanFinding("temp_structure", table, "automatic index"))
+        elif detail.startswith("USE TEMP B-TREE FOR "):
+            findings.append(PlanFinding("temp_structure", "", detail[len("USE TEMP B-TREE FOR "):]))
+    return findings
+
+
+def _postgres_scans(node: Dict[str, Any]) -> List[Tuple[str, Optional[int]]]:
+    scans = []
+    if node.get("Node Type") == "Seq Scan":
+        scans.append((str(node.get("Relation Name", "")).lower(), node.get("Plan Rows")))
+    for child in node.get("Plans") or ():
+        scans.extend(_postgres_scans(child))
+    return scans
+
+
+def postgres_findings(plan: Any) -> List[PlanFinding]:
+    """Findings of an EXPLAIN (FORMAT JSON) document"""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    if isinstance(plan, list):
+        plan = plan[0] if plan else {}
+    findings: List[PlanFinding] = []
+
+    def visit(node: Dict[str, Any]) -> None:
+        node_type = node.get("Node Type", "")
+        children = node.get("Plans") or []
+        if node_type == "Seq Scan":
+            findings.append(PlanFinding("full_scan", str(node.get("Relation Name", "")).lower(), "",
+                                        node.get("Plan Rows")))
+        elif node_type in ("Sort", "Incremental Sort"):
+            findings.append(PlanFinding("temp_structure", "", "sort", node.get("Plan Rows")))
+        elif node_type == "Nested Loop" and len(children) == 2:
+            outer = _postgres_scans(children[0])
+            for inner, _ in _postgres_scans(children[1]):
+                findings.append(PlanFinding("nested_loop", inner, outer[0][0] if outer else "",
+                                            children[0].get("Plan Rows")))
+        for child in children:
+            visit(child)
+
+    visit(plan.get("Plan", plan))
+    return findings
+
+
+def mysql_findings(rows: Iterable[Dict[str, Any]]) -> List[PlanFinding]:
+    """Findings of a tabular EXPLAIN result"""
+    findings: List[PlanFinding] = []
+    previous = ""
+    for row in rows:
+        row = {str(key).lower(): value for key, value in row.items()}
+        table = str(row.get("table") or "").lower()
+        extra = str(row.get("extra") or "")
+        rows_estimate = int(row["rows"]) if row.get("rows") is not None else None
+        if str(row.get("type") or "").upper() == "ALL":
+            findings.append(PlanFinding("full_scan", table, "", rows_estimate))
+            if "join buffer" in extra.lower() and previous:
+                findings.append(PlanFinding("nested_loop", table, previous, rows_estimate))
+        if "Using temporary" in extra:
+            findings.append(PlanFinding("temp_structure", table, "temporary table", rows_estimate))
+        if "Using filesort" in extra:
+            findings.append(PlanFinding("temp_structure", table, "filesort", rows_estimate))
+        previous = table or previous
+    return findings
+
+
+def explainable(sql_query: str) -> Optional[exp.Expression]:
+    """The statement's syntax tree if it is a single plain SELECT that is safe to EXPLAIN, else None"""
+    statements = parse(sql_query)
+    if not statements or len(statements) != 1:
+        return None
+    statement = statements[0]
+    if not isinstance(statement, (exp.Select, exp.Union)):
+        return None
+    # SELECT ... INTO creates a table and FOR UPDATE takes locks on some databases
+    if statement.find(exp.Into) is not None or any(select.args.get("locks") for select in statement.find_all(exp.Select)):
+        return None
+    return statement
+
+
+class PlanAnalyzer:
+    """
+    EXPLAINs statements on a database through a small bounded connection pool.
+
+    Settings default to the PLAN_* environment variables; without a database
+    URL the analyzer is disabled and plan() always returns None.
+    """
+
+    def __init__(self, database_url: Optional[str] = None, pool_size: Optional[int] = None,
+                 pool_timeout: Optional[float] = None, statement_timeout_ms: Optional[int] = None,
+                 cache_size: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 small_table_rows: Optional[int] = None):
+        self.database_url = database_url if database_url is not None else os.getenv('PLAN_DATABASE_URL', '')
+        self.pool_size = max(1, pool_size or int(os.getenv('PLAN_POOL_SIZE', '2')))
+        self.pool_timeout = pool_timeout if pool_timeout is not None else float(os.getenv('PLAN_POOL_TIMEOUT', '0.5'))
+        self.statement_timeout_ms = statement_timeout_ms if statement_timeout_ms is not None else int(os.getenv('PLAN_TIMEOUT_MS', '1000'))
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv('PLAN_CACHE_SIZE', '4096'))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv('PLAN_CACHE_TTL', '600'))
+        # Estimated scans smaller than this are cheap and not reported
+        self.small_table_rows = small_table_rows if small_table_rows is not None else int(os.getenv('SCHEMA_SMALL_TABLE_ROWS', '1000'))
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._engine = None
+        self._lock = threading.Lock()
+        # fingerprint hash -> (expires_at, findings or None)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[Tuple[PlanFinding, ...]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Engines, pools and cached plans stay in the process that made them
+        return {key: value for key, value in self.__dict__.items()
+                if key not in ("_engine", "_lock", "_cache", "hits", "misses")}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.database_url)
+
+    def engine(self):
+        """The pooled engine, created on first use"""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+
+    def _create_engine(self):
+        from sqlalchemy import create_engine, event
+
+        engine = create_engine(self.database_url, pool_size=self.pool_size, max_overflow=0,
+                               pool_timeout=self.pool_timeout, pool_pre_ping=True)
+        dialect = engine.dialect.name
+        if dialect not in _EXPLAIN_PREFIXES:
+            engine.dispose()
+            raise ValueError(f"Unsupported database for plan analysis: {dialect}")
+        timeout = self.statement_timeout_ms
+
+        @event.listens_for(engine, "connect")
+        def read_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                if dialect == "sqlite":
+                    cursor.execute("PRAGMA query_only = ON")
+                elif dialect == "postgresql":
+                    cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+                    if timeout > 0:
+                        cursor.execute(f"SET statement_timeout = {int(timeout)}")
+                else:
+                    cursor.execute("SET SESSION TRANSACTION READ ONLY")
+                    if timeout > 0:
+                        cursor.execute(f"SET SESSION max_execution_time = {int(timeout)}")
+            finally:
+                cursor.close()
+
+        return engine
+
+    def plan(self, sql_query: str) -> Optional[Tuple[PlanFinding, ...]]:
+        """Plan findings of a statement, or None when it has no plan (disabled, not a SELECT, rejected, pool busy)"""
+        if not self.database_url:
+            return None
+        statement = explainable(sql_query)
+        if statement is None:
+            return None
+
+        key = fingerprint_hash(sql_query)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+        try:
+            with _EXPLAIN_SECONDS.time():
+                findings = self._explain(statement)
+        except PoolTimeout:
+            # Every connection is busy: skip the plan rather than queue up on the database
+            _POOL_TIMEOUTS.inc()
+            return None
+        except Exception as e:
+            _EXPLAIN_ERRORS.inc()
+            logger.warning(f"EXPLAIN failed: {str(e)}")
+            findings = None
+
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, findings)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return findings
+
+    def _explain(self, statement: exp.Expression) -> Tuple[PlanFinding, ...]:
+        from sqlalchemy import text
+
+        engine = self.engine()
+        dialect = engine.dialect.name
+        sql = statement.transform(lambda node: exp.null() if isinstance(node, exp.Placeholder) else node) \
+            .sql(dialect=_SQLGLOT_DIALECTS[dialect])
+        # Bind parameters are gone; escape what SQLAlchemy would read as one
+        sql = _EXPLAIN_PREFIXES[dialect] + sql.replace(":", "\\:")
+        with engine.connect() as connection:
+            result = connection.execute(text(sql))
+            if dialect == "sqlite":
+                findings = sqlite_findings(result.fetchall(), _aliases(statement))
+            elif dialect == "postgresql":
+                findings = postgres_findings(result.scalar())
+            else:
+                findings = mysql_findings(result.mappings().all())
+            connection.rollback()
+        return tuple(finding for finding in findings
+                     if finding.rows is None or finding.kind == "temp_structure" or finding.rows >= self.small_table_rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "entries": len(self._cache), "hits": self.hits, "misses": self.misses,
+                "pool_size": self.pool_size}
+
+    def close(self) -> None:
+        """Close the pooled connections; a later plan() opens a new pool"""
+        with self._lock:
+            engine, self._engine = self._engine, None
+        if engine is not None:
+            engine.dispose()
+
+
+_shared_analyzer: Optional[PlanAnalyzer] = None
+_shared_lock = threading.Lock()
+
+
+def get_plan_analyzer() -> PlanAnalyzer:
+    """The process-wide plan analyzer configured by the PLAN_* environment variables"""
+    global _shared_analyzer
+    if _shared_analyzer is None:
+        with _shared_lock:
+            if _shared_analyzer is None:
+                _shared_analyzer = PlanAnalyzer()
+    return _shared_analyzer
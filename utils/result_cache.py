@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .findings import decode_result, encode_result
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Collapse runs of whitespace and trim, so formatting-only differences share a cache entry"""
+    return _WHITESPACE.sub(" ", sql_query).strip()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of analysis results.
+
+    Entries are keyed on (model name, model version, normalized SQL) and kept
+    in memory with LRU eviction, a TTL, and limits on both the number of
+    entries and their total serialized size. When a path is given, entries are
+    also written through to a SQLite file so the cache survives restarts.
+
+    Results are stored as JSON text, so every hit returns an independent copy;
+    rule-based findings are stored as their catalog rule ID (see
+    utils.findings), and an entry whose rule is no longer defined is a miss.
+    """
+
+    def __init__(self,
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None,
+                 path: Optional[str] = None,
+                 enabled: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '10000'))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESULT_CACHE_TTL', '3600'))
+        self.path = path if path is not None else os.getenv('RESULT_CACHE_PATH', '')
+
+        # key -> (expires_at, size in bytes, JSON payload)
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        if self.enabled and self.path:
+            self._open_store()
+
+    @staticmethod
+    def make_key(model_name: str, model_version: str, sql_query: str) -> str:
+        """Build the cache key for a model and (unnormalized) SQL statement"""
+        material = "\0".join((model_name.lower(), model_version, normalize_sql(sql_query)))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result, or None on a miss or expired entry"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    result = self._decode(entry[2])
+                    if result is not None:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return result
+                self._remove(key)
+
+            stored = self._load(key, now)
+            result = self._decode(stored[1]) if stored is not None else None
+            if result is None:
+                self.misses += 1
+                return None
+            # Promote entries found on disk back into memory
+            expires_at, payload = stored
+            self._insert(key, expires_at, payload)
+            self.hits += 1
+            self.disk_hits += 1
+            return result
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result; entries larger than the whole byte budget are not cached"""
+        if not self.enabled:
+            return
+        payload = encode_result(result)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, expires_at, payload)
+            self._store(key, expires_at, payload)
+
+    def clear(self) -> None:
+        """Drop every entry, in memory and on disk"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM result_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size, for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "persistent": self._db is not None
+            }
+
+    def close(self) -> None:
+        """Close the persistent store, if any"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _insert(self, key: str, expires_at: float, payload: str) -> None:
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, size, payload)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    @staticmethod
+    def _decode(payload: str) -> Optional[Dict[str, Any]]:
+        try:
+            return decode_result(payload)
+        except KeyError:
+            # Written by a version that defined a rule this one does not
+            return None
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _open_store(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._db.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    def _load(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT expires_at, value FROM result_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _store(self, key: str, expires_at: float, payload: str) -> None:
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO result_cache (key, expires_at, value) VALUES (?, ?, ?)",
+            (key, expires_at, payload)
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._db.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
@@ -0,0 +1,65 @@
+"""
+Parse-once SQL front end.
+
+Statements are parsed into sqlglot syntax trees a single time and the trees
+are cached by statement text, so every analyzer that looks at the same
+statement shares one parse. Cached trees are shared between callers and
+threads and must be treated as read-only; use ``expression.copy()`` before
+transforming one.
+"""
+
+import os
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from utils.metrics import stage_timer
+
+# Dialect passed to sqlglot; empty means sqlglot's generic dialect
+SQL_DIALECT = os.getenv('SQL_DIALECT', '') or None
+
+PARSE_CACHE_SIZE = int(os.getenv('SQL_PARSE_CACHE_SIZE', '4096'))
+
+# Longer statements are not parsed: parsing costs several microseconds per
+# character and cannot be interrupted, so this bounds the time one statement
+# can spend in the parser (~0.2 s at the default)
+MAX_PARSE_CHARS = int(os.getenv('SQL_MAX_PARSE_CHARS', '32768'))
+
+# Only cache misses reach the parser, so this times actual parses
+_PARSE_SECONDS = stage_timer("sqlglot", "parse")
+
+
+def parse(sql_query: str) -> Optional[Tuple[exp.Expression, ...]]:
+    """Parse a SQL string into one syntax tree per statement
+
+    Empty statements (e.g. a trailing ";") are dropped. Returns None if the
+    text cannot be parsed, is nested too deeply to parse, or is longer than
+    MAX_PARSE_CHARS, so callers can fall back to lexical rules.
+    """
+    if len(sql_query) > MAX_PARSE_CHARS:
+        return None
+    return _parse(sql_query)
+
+
+def too_large_to_parse(sql_query: str) -> bool:
+    """True if parse skips the statement because of its length"""
+    return len(sql_query) > MAX_PARSE_CHARS
+
+
+def clear_cache() -> None:
+    """Drop every cached syntax tree"""
+    _parse.cache_clear()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(sql_query: str) -> Optional[Tuple[exp.Expression, ...]]:
+    try:
+        with _PARSE_SECONDS.time():
+            statements = sqlglot.parse(sql_query, read=SQL_DIALECT)
+    except (SqlglotError, RecursionError):
+        return None
+    return tuple(statement for statement in statements if statement is not None)
+
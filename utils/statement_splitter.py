@@ -0,0 +1,246 @@
+"""
+Incremental splitting of SQL scripts into statements.
+
+The splitter is fed the script in arbitrary chunks and returns each statement
+as soon as its terminating ";" has been read, so a large migration file can
+be analyzed statement by statement without ever being held in memory as a
+whole. Like sqlparse's splitter it ignores semicolons inside quoted strings,
+quoted identifiers, comments and PostgreSQL dollar-quoted bodies; state is
+carried across chunk boundaries, so a chunk may end anywhere.
+
+The scanner jumps between the characters that can change its state with
+compiled regexes instead of stepping through the text one character at a
+time. The scanned part of an unfinished statement is kept as a list of
+pieces and joined once, when the statement ends, so a statement spread over
+many chunks costs linear rather than quadratic time.
+"""
+
+import re
+from typing import AsyncIterable, Iterable, Iterator, AsyncIterator, List, NamedTuple, Optional
+
+# Characters that can start a string, identifier, comment or end a statement
+_CODE_SPECIAL = re.compile(r"[;'\"`\-/#$]")
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$")
+_PARTIAL_DOLLAR_TAG = re.compile(r"\$[A-Za-z_0-9]*\Z")
+_NON_SPACE = re.compile(r"\S")
+
+# Closing delimiters of each quoted state; as in sqlparse, a backslash escapes
+# the next character inside single- and double-quoted text
+_QUOTE_END = {
+    "'": re.compile(r"['\\]"),
+    '"': re.compile(r"[\"\\]"),
+    "`": re.compile(r"[`]"),
+}
+
+
+class ScriptStatement(NamedTuple):
+    """One statement of a script: its position and its text (without the trailing ";")
+
+    offset is where the statement's text starts in the script and end is
+    just past its terminating ";" (or the end of the script), both counted in
+    characters; a scan resumed from end is independent of what came before.
+    """
+    index: int
+    line: int
+    sql: str
+    offset: int = 0
+    end: int = 0
+
+
+class StatementSplitter:
+    """Stateful, chunk-at-a-time statement splitter
+
+    A splitter can start in the middle of a script, at the end of one of its
+    statements: index, line and offset are then those of the position where
+    the first chunk starts.
+    """
+
+    def __init__(self, index: int = 0, line: int = 1, offset: int = 0):
+        self._buffer = ""
+        # Scanned text of the current statement from earlier chunks, preceding the buffer
+        self._head: List[str] = []
+        self._head_length = 0
+        # Start of the current statement (when there is no head) and scan position, both offsets into the buffer
+        self._start = 0
+        self._pos = 0
+        # Offset of the buffer's first character in the script
+        self._base = offset
+        # Scanner state: None (code), a quote character, "--", "/*" or a dollar tag
+        self._state: Optional[str] = None
+        self._has_code = False
+        self._index = index
+        self._line = line
+
+    def feed(self, chunk: str) -> List[ScriptStatement]:
+        """Add the next chunk of the script and return the statements it completed"""
+        self._buffer += chunk
+        return self._scan(final=False)
+
+    def flush(self) -> List[ScriptStatement]:
+        """Signal the end of the script and return the last, unterminated statement if any"""
+        statements = self._scan(final=True)
+        if self._has_code:
+            statements.append(self._emit(len(self._buffer), len(self._buffer)))
+        self._base += len(self._buffer)
+        self._buffer, self._start, self._pos, self._state, self._has_code = "", 0, 0, None, False
+        self._head, self._head_length = [], 0
+        return statements
+
+    def _scan(self, final: bool) -> List[ScriptStatement]:
+        statements = []
+        buffer = self._buffer
+        length = len(buffer)
+        pos = self._pos
+
+        while pos < length:
+            state = self._state
+            if state is None:
+                match = _CODE_SPECIAL.search(buffer, pos)
+                end = match.start() if match else length
+                if not self._has_code and _NON_SPACE.search(buffer, pos, end):
+                    self._has_code = True
+                if match is None:
+                    pos = length
+                    break
+                pos = end
+                char = buffer[pos]
+                following = buffer[pos + 1:pos + 2]
+                if char in "-/$" and not following and not final:
+                    # Need the next character to tell "--", "/*" or "$tag$" apart
+                    break
+                if char == ";":
+                    if self._has_code:
+                        statements.append(self._emit(pos, pos + 1))
+                    else:
+                        # Nothing but whitespace and comments: drop it
+                        self._skip(pos + 1)
+                    pos += 1
+                elif char in _QUOTE_END:
+                    self._has_code = True
+                    self._state = char
+                    pos += 1
+                elif char == "#" or (char == "-" and following == "-"):
+                    self._state = "--"
+                    pos += 1 if char == "#" else 2
+                elif char == "/" and following == "*":
+                    self._state = "/*"
+                    pos += 2
+                elif char == "$":
+                    tag = _DOLLAR_TAG.match(buffer, pos)
+                    if tag is None and not final and _PARTIAL_DOLLAR_TAG.match(buffer, pos):
+                        # A tag such as "$bo" may still be completed by the next chunk
+                        break
+                    self._has_code = True
+                    if tag is None:
+                        pos += 1
+                    else:
+                        self._state = tag.group()
+                        pos = tag.end()
+                else:
+                    self._has_code = True
+                    pos += 1
+            elif state == "--":
+                newline = buffer.find("\n", pos)
+                if newline < 0:
+                    pos = length
+                    break
+                self._state = None
+                pos = newline + 1
+            elif state == "/*":
+                close = buffer.find("*/", pos)
+                if close < 0:
+                    # Keep a trailing "*" in case the chunk ends between "*" and "/"
+                    pos = max(pos, length - 1)
+                    break
+                self._state = None
+                pos = close + 2
+            elif state in _QUOTE_END:
+                match = _QUOTE_END[state].search(buffer, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.start()
+                if buffer[pos] == "\\":
+                    if pos + 1 >= length and not final:
+                        break
+                    pos += 2
+                elif buffer[pos + 1:pos + 2] == state:
+                    # Doubled quote is an escaped quote
+                    pos += 2
+                elif pos + 1 >= length and not final:
+                    # The next chunk may start with the second quote of a pair
+                    break
+                else:
+                    self._state = None
+                    pos += 1
+            else:
+                close = buffer.find(state, pos)
+                if close < 0:
+                    # Keep enough of the tail to find a tag split across chunks
+                    pos = max(pos, length - len(state) + 1)
+                    break
+                self._state = None
+                pos = close + len(state)
+
+        # Drop the consumed text once per chunk rather than once per statement,
+        # and set the scanned part of the current statement aside: only the
+        # unscanned tail is concatenated with the next chunk
+        if pos > self._start:
+            self._head.append(buffer[self._start:pos])
+            self._head_length += pos - self._start
+        self._buffer = buffer[pos:]
+        self._base += pos
+        self._start = self._pos = 0
+        return statements
+
+    def _emit(self, end: int, consumed: int) -> ScriptStatement:
+        """Return the statement ending at end; consumed includes the ";" """
+        text = self._buffer[self._start:end]
+        offset = self._base + self._start
+        if self._head:
+            text = "".join(self._head) + text
+            offset -= self._head_length
+        leading = len(text) - len(text.lstrip())
+        statement = ScriptStatement(self._index, self._line + text.count("\n", 0, leading), text.strip(),
+                                    offset + leading, self._base + consumed)
+        self._index += 1
+        self._skip(consumed)
+        return statement
+
+    def _skip(self, consumed: int) -> None:
+        """Start the next statement at offset consumed"""
+        if self._head:
+            self._line += sum(piece.count("\n") for piece in self._head)
+            self._head, self._head_length = [], 0
+        self._line += self._buffer.count("\n", self._start, consumed)
+        self._start = consumed
+        self._has_code = False
+
+
+def iter_statements(chunks: Iterable[str]) -> Iterator[ScriptStatement]:
+    """Yield the statements of a script read as an iterable of text chunks"""
+    splitter = StatementSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.flush()
+
+
+async def aiter_statements(chunks: AsyncIterable[str]) -> AsyncIterator[List[ScriptStatement]]:
+    """Yield, per chunk received, the statements that chunk completed
+
+    Grouping by chunk lets the caller analyze each group as one batch without
+    waiting for more input than has already arrived.
+    """
+    splitter = StatementSplitter()
+    async for chunk in chunks:
+        statements = splitter.feed(chunk)
+        if statements:
+            yield statements
+    statements = splitter.flush()
+    if statements:
+        yield statements
+
+
+def split_statements(sql_script: str) -> List[str]:
+    """Split a complete script into statement texts"""
+    return [statement.sql for statement in iter_statements([sql_script])]